@@ -0,0 +1,7 @@
+"""
+Shared building blocks for the flow scheduler scripts (flowsch*.py).
+
+The scripts in the top level directory import what they need from here, e.g.
+
+   from flowscheduler.restclient import ControllerClient
+"""
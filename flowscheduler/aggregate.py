@@ -0,0 +1,81 @@
+"""
+Batched group bandwidth aggregation over a FlowTable.
+
+group_usage() computes the group id of every flow at once and sums the byte
+rates per group. With NumPy installed this is a handful of vector operations
+over the table's columns (XOR and modulo on the port/address columns, then a
+single bincount); without it the same sums are built in one Python loop.
+
+Group ids match the scripts:
+   flowsch.py / flowsch-leaf*.py     (tcp_src ^ tcp_dst) % num_groups, per (ipv4_src, ipv4_dst) pair
+   flowsch-entire.py                 (ipv4_src ^ ipv4_dst ^ tcp_src ^ tcp_dst) % num_groups, per switch
+
+Example:
+   usage = group_usage(flow_stats, num_groups)
+   usage[pair_id * num_groups + group_id]
+   active_groups(usage)
+"""
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+def _column(column, count):
+	return numpy.frombuffer(column, dtype=numpy.dtype(column.typecode), count=count)
+
+
+def _group_usage_numpy(table, num_groups, with_addresses, by_pair):
+	count = len(table.keys)
+	live = _column(table.live, count).astype(bool)
+	pair = _column(table.pair, count)[live].astype(numpy.int64)
+	group_id = _column(table.tcp_src, count)[live].astype(numpy.int64) ^ _column(table.tcp_dst, count)[live]
+	if with_addresses:
+		npairs = len(table.pairs)
+		addresses = _column(table.src_ip, npairs).astype(numpy.int64) ^ _column(table.dst_ip, npairs).astype(numpy.int64)
+		group_id ^= addresses[pair]
+	group_id %= num_groups
+	rates = _column(table.byte_rate, count)[live]
+	if by_pair:
+		return numpy.bincount(pair * num_groups + group_id, weights=rates, minlength=len(table.pairs) * num_groups)
+	return numpy.bincount(group_id, weights=rates, minlength=num_groups)
+
+
+def _group_usage_python(table, num_groups, with_addresses, by_pair):
+	pair = table.pair
+	tcp_src = table.tcp_src
+	tcp_dst = table.tcp_dst
+	byte_rate = table.byte_rate
+	src_ip = table.src_ip
+	dst_ip = table.dst_ip
+	usage = [0.0] * (len(table.pairs) * num_groups if by_pair else num_groups)
+	for row in table.rows.values():
+		pair_id = pair[row]
+		group_id = tcp_src[row] ^ tcp_dst[row]
+		if with_addresses:
+			group_id ^= src_ip[pair_id] ^ dst_ip[pair_id]
+		group_id %= num_groups
+		if by_pair:
+			group_id += pair_id * num_groups
+		usage[group_id] += byte_rate[row]
+	return usage
+
+
+def group_usage(table, num_groups, with_addresses=False, by_pair=True):
+	"""
+	Sum the byte rates of the flows in `table` per group.
+	by_pair: index the result pair_id * num_groups + group_id (one set of groups
+	per (ipv4_src, ipv4_dst) pair), otherwise just group_id.
+	with_addresses: also XOR the addresses into the group id (flowsch-entire.py).
+	"""
+	if numpy is not None and len(table.keys):
+		return _group_usage_numpy(table, num_groups, with_addresses, by_pair)
+	return _group_usage_python(table, num_groups, with_addresses, by_pair)
+
+
+def active_groups(usage):
+	"""Number of groups in a group_usage() result that carry any traffic"""
+	if numpy is not None and isinstance(usage, numpy.ndarray):
+		return int(numpy.count_nonzero(usage))
+	return sum(1 for rate in usage if rate > 0)
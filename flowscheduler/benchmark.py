@@ -0,0 +1,314 @@
+"""
+Control-loop latency benchmark with a per-stage breakdown.
+
+Drives a SchedulerEngine (flowscheduler.engine) cycle by cycle, handing
+run_once() the replies it fetched, and reports the stages the engine times
+through its metrics:
+
+   fetch          GET /switch/all/flow and /switch/all/port
+   parse_flows    iter_flows() into the FlowTable of every leaf
+   group          group_usage() into per ip tuple groups
+   parse_ports    port tx/rx rates
+   schedule       begin_cycle() + place_all() over the managed leaves
+   push           DeltaPusher.push(), i.e. diff, encode and POST /wm/forwarding/json
+   evict          FlowTable.end_cycle()
+
+Inputs are either synthetic (a SyntheticFabric behind an in-process mock
+controller, over a grid of fabric sizes, flow counts and num_groups), a live
+controller (--controller, e.g. a separately started mockcontroller), or
+replies recorded earlier with --record and replayed with --recorded (with
+the --topology they were recorded on). The topology of the synthetic fabric
+and of a controller is discovered from it. The synthetic fabric runs on a
+virtual clock that advances one period per cycle, so counters and rates are
+the same from run to run.
+
+Every stage reports p50/p99 latency and, with --allocations (python 3,
+tracemalloc, in a separate pass so it does not skew the timings), the peak
+and retained memory it allocated. --save writes the results as a baseline;
+--compare reads one and exits 1 if any stage's p50 regressed by more than
+--tolerance.
+
+Example:
+   python -m flowscheduler.benchmark --leaves 2,8,32 --flows 1000,10000 --groups 2,10 --save baseline.json
+   python -m flowscheduler.benchmark --leaves 2,8,32 --flows 1000,10000 --groups 2,10 --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import threading
+
+try:
+	import tracemalloc
+except ImportError:								# python 2
+	tracemalloc = None
+
+from flowscheduler.discovery import discover
+from flowscheduler.engine import SchedulerEngine
+from flowscheduler.metrics import SchedulerMetrics
+from flowscheduler.mockcontroller import MockController, SyntheticFabric
+from flowscheduler.poller import monotonic
+from flowscheduler.restclient import ControllerClient
+from flowscheduler.topology import Topology
+
+STAGES = ('fetch', 'parse_flows', 'group', 'parse_ports', 'schedule', 'push', 'evict')
+
+
+def percentile(samples, fraction):
+	"""Nearest-rank percentile of a list of numbers"""
+	if not samples:
+		return 0.0
+	ordered = sorted(samples)
+	rank = int(round(fraction * (len(ordered) - 1)))
+	return ordered[rank]
+
+
+class NullForwarding(object):
+	"""Accepts every push, for replays without a controller"""
+
+	def set(self, data):
+		return True
+
+
+class StageTimer(SchedulerMetrics):
+	"""
+	The engine's metrics, also keeping the stage times of every recorded cycle
+	and, optionally, tracemalloc allocations
+	"""
+
+	def __init__(self, trace_allocations=False):
+		SchedulerMetrics.__init__(self)
+		self.trace_allocations = trace_allocations and tracemalloc is not None
+		self.recording = True						# False during the warmup
+		self.samples = dict((name, []) for name in STAGES)
+		self.allocations = dict((name, []) for name in STAGES)
+		self._cycle_allocations = {}
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		if self.trace_allocations:
+			before = tracemalloc.get_traced_memory()[0]
+			if hasattr(tracemalloc, 'reset_peak'):
+				tracemalloc.reset_peak()
+		with SchedulerMetrics.stage(self, name):
+			yield
+		if self.trace_allocations:
+			current, peak = tracemalloc.get_traced_memory()
+			allocated = self._cycle_allocations.get(name, (0, 0))
+			self._cycle_allocations[name] = (max(allocated[0], peak - before, 0), allocated[1] + current - before)
+
+	def end_cycle(self, seconds, *args):
+		if self.recording:
+			for name in self._stage_totals:
+				self.samples.setdefault(name, []).append(self._stage_totals[name])
+			for name in self._cycle_allocations:
+				self.allocations.setdefault(name, []).append(self._cycle_allocations[name])
+		self._cycle_allocations = {}
+		SchedulerMetrics.end_cycle(self, seconds, *args)
+
+	def summary(self):
+		result = {}
+		for name in self.samples:
+			samples = self.samples[name]
+			if not samples:
+				continue
+			stats = {'p50_ms' : percentile(samples, 0.5) * 1e3, 'p99_ms' : percentile(samples, 0.99) * 1e3,
+					'mean_ms' : sum(samples) / len(samples) * 1e3, 'cycles' : len(samples)}
+			allocations = self.allocations.get(name)
+			if allocations:
+				stats['peak_kb'] = percentile([peak for peak, net in allocations], 0.5) / 1024.0
+				stats['net_kb'] = percentile([net for peak, net in allocations], 0.5) / 1024.0
+			result[name] = stats
+		return result
+
+
+def make_engine(client, topology, num_groups, timer, placement_options=None):
+	"""A SchedulerEngine of every leaf of `topology` reporting to `timer`; pushes go nowhere without a client"""
+	engine = SchedulerEngine(client, topology, num_groups, placement_options=placement_options, metrics=timer)
+	if client is None:
+		engine.pusher.forwarding = NullForwarding()
+	return engine
+
+
+class VirtualClock(object):
+	def __init__(self, start=0.0):
+		self.now = start
+
+	def __call__(self):
+		return self.now
+
+
+def _run(client, topology, num_groups, placement_options, cycles, warmup, trace_allocations, clock=None, period=1.0,
+		replies=None, record=None):
+	trace_allocations = trace_allocations and tracemalloc is not None
+	timer = StageTimer(trace_allocations)
+	engine = make_engine(client, topology, num_groups, timer, placement_options)
+	if trace_allocations:
+		tracemalloc.start()
+	try:
+		for cycle in range(warmup + cycles):
+			timer.recording = cycle >= warmup
+			if clock is not None:
+				clock.now += period
+			if replies:
+				flows, ports, now = replies[cycle % len(replies)]
+			else:
+				now = clock.now if clock is not None else monotonic()
+				with timer.stage('fetch'):					# adds up with the engine's own fetch stage
+					flows, ports = engine.fetch()
+			engine.run_once(now, replies=(flows, ports))
+			if record is not None:
+				_save_reply(record, cycle, flows, ports, now)
+	finally:
+		if trace_allocations:
+			tracemalloc.stop()
+		engine.close()
+	return timer.summary()
+
+
+def _save_reply(directory, cycle, flows, ports, now):
+	for kind, body in (('flows', flows), ('ports', ports)):
+		with open(os.path.join(directory, '%05d-%s.json' % (cycle, kind)), 'wb') as f:
+			f.write(body if isinstance(body, bytes) else body.encode('utf-8'))
+	with open(os.path.join(directory, '%05d-time' % cycle), 'w') as f:
+		f.write(repr(now))
+
+
+def load_recorded(directory):
+	"""[(flows body, ports body, poll time)] saved by --record, in cycle order"""
+	replies = []
+	for name in sorted(os.listdir(directory)):
+		if not name.endswith('-flows.json'):
+			continue
+		prefix = os.path.join(directory, name[:-len('-flows.json')])
+		with open(prefix + '-flows.json', 'rb') as f:
+			flows = f.read()
+		with open(prefix + '-ports.json', 'rb') as f:
+			ports = f.read()
+		with open(prefix + '-time') as f:
+			now = float(f.read())
+		replies.append((flows, ports, now))
+	return replies
+
+
+def bench_synthetic(leaves, flows, num_groups, args, placement_options):
+	clock = VirtualClock()
+	fabric = SyntheticFabric(leaves, args.spines, args.hosts_per_leaf, flows, args.uplinks_per_spine,
+							churn=args.churn, seed=args.seed, clock=clock)
+	server = MockController(('127.0.0.1', 0), fabric)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	client = ControllerClient('127.0.0.1:%d' % server.server_address[1])
+	try:
+		topology = discover(client)
+		result = _run(client, topology, num_groups, placement_options, args.cycles, args.warmup, False, clock)
+		if args.allocations and tracemalloc is not None:
+			allocations = _run(client, topology, num_groups, placement_options, args.cycles, args.warmup, True, clock)
+			for name in result:
+				for field in ('peak_kb', 'net_kb'):
+					if field in allocations.get(name, {}):
+						result[name][field] = allocations[name][field]
+	finally:
+		client.close()
+		server.shutdown()
+		server.server_close()
+	return result
+
+
+def compare(results, baseline, tolerance, floor_ms=0.1):
+	"""[(config, stage, baseline p50, p50)] of the stages that got slower than the baseline allows"""
+	regressions = []
+	for config in sorted(results):
+		for stage in results[config]:
+			base = baseline.get(config, {}).get(stage)
+			if base is None:
+				continue
+			p50 = results[config][stage]['p50_ms']
+			if p50 > base['p50_ms'] * (1 + tolerance) and p50 - base['p50_ms'] > floor_ms:
+				regressions.append((config, stage, base['p50_ms'], p50))
+	return regressions
+
+
+def _ints(text):
+	return [int(x) for x in text.split(',') if x]
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Flow scheduler control-loop benchmark')
+	parser.add_argument("--leaves", action='store', type=_ints, default=[2, 8], help='comma separated leaf counts of the synthetic fabric')
+	parser.add_argument("--flows", action='store', type=_ints, default=[1000, 10000], help='comma separated flow counts')
+	parser.add_argument("--groups", action='store', type=_ints, default=[2, 10], help='comma separated num_groups values')
+	parser.add_argument("--spines", action='store', type=int, default=2, help='spine switches of the synthetic fabric')
+	parser.add_argument("--hosts-per-leaf", action='store', type=int, default=16, help='hosts per leaf of the synthetic fabric')
+	parser.add_argument("--uplinks-per-spine", action='store', type=int, default=3, help='links from every leaf to every spine')
+	parser.add_argument("--churn", action='store', type=float, default=0.01, help='fraction of flows replaced per (virtual) second')
+	parser.add_argument("--seed", action='store', type=int, default=1, help='random seed of the synthetic fabric')
+	parser.add_argument("--cycles", action='store', type=int, default=20, help='measured cycles per configuration')
+	parser.add_argument("--warmup", action='store', type=int, default=3, help='unmeasured cycles before them')
+	parser.add_argument("--solver", action='store', default='greedy', help='placement solver (greedy, kk, lpt-ls)')
+	parser.add_argument("--incremental", action='store_true', help='schedule with IncrementalScheduler')
+	parser.add_argument("--controller", action='store', default=None, help='benchmark against this controller IP:port instead of a synthetic fabric')
+	parser.add_argument("--topology", action='store', default=None, help='topology file of --recorded replies (and of --controller, instead of discovering it)')
+	parser.add_argument("--record", action='store', default=None, help='save the replies fetched from --controller into this directory')
+	parser.add_argument("--recorded", action='store', default=None, help='replay the replies saved in this directory (no fetch)')
+	parser.add_argument("--allocations", action='store_true', help='also measure allocations per stage (python 3, separate pass)')
+	parser.add_argument("--save", action='store', default=None, help='write the results to this baseline file')
+	parser.add_argument("--compare", action='store', default=None, help='compare against this baseline file, exit 1 on regressions')
+	parser.add_argument("--tolerance", action='store', type=float, default=0.25, help='allowed relative p50 slowdown against the baseline')
+	args = parser.parse_args(argv)
+
+	placement_options = {'solver' : args.solver, 'incremental' : args.incremental}
+	results = {}
+	if args.recorded is not None and args.topology is None:
+		parser.error("--recorded needs the --topology the replies were recorded on")
+	if args.controller is not None or args.recorded is not None:
+		for num_groups in args.groups:
+			client = ControllerClient(args.controller) if args.controller is not None else None
+			replies = load_recorded(args.recorded) if args.recorded is not None else None
+			topology = Topology.load(args.topology) if args.topology is not None else discover(client)
+			if args.record is not None and not os.path.isdir(args.record):
+				os.makedirs(args.record)
+			config = '%s groups=%d' % ('recorded' if replies else args.controller, num_groups)
+			results[config] = _run(client, topology, num_groups, placement_options, args.cycles, args.warmup, False,
+									replies=replies, record=args.record)
+			if client is not None:
+				client.close()
+	else:
+		for leaves in args.leaves:
+			for flows in args.flows:
+				for num_groups in args.groups:
+					config = 'leaves=%d flows=%d groups=%d' % (leaves, flows, num_groups)
+					results[config] = bench_synthetic(leaves, flows, num_groups, args, placement_options)
+
+	print("%-36s %-12s %10s %10s %10s %10s" % ('config', 'stage', 'p50 ms', 'p99 ms', 'peak KB', 'net KB'))
+	for config in sorted(results):
+		total = 0.0
+		for stage in STAGES:
+			stats = results[config].get(stage)
+			if stats is None:
+				continue
+			total += stats['p50_ms']
+			print("%-36s %-12s %10.3f %10.3f %10s %10s" % (config, stage, stats['p50_ms'], stats['p99_ms'],
+				'%.1f' % stats['peak_kb'] if 'peak_kb' in stats else '-', '%.1f' % stats['net_kb'] if 'net_kb' in stats else '-'))
+		print("%-36s %-12s %10.3f" % (config, 'total', total))
+
+	if args.save is not None:
+		with open(args.save, 'w') as f:
+			json.dump({'python' : platform.python_version(), 'results' : results}, f, indent=1, sort_keys=True)
+	if args.compare is not None:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		regressions = compare(results, baseline['results'], args.tolerance)
+		for config, stage, base, p50 in regressions:
+			print("REGRESSION %s %s: p50 %.3f ms -> %.3f ms" % (config, stage, base, p50))
+		if regressions:
+			return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Sanity checks for the cumulative counters read from the switches.
+
+The scheduler turns packet and byte counters into rates by subtracting the
+previous poll. That goes wrong when a counter wraps (32 bit counters on some
+switches and ports), when it restarts from zero (a switch that reconnected,
+a flow entry that was removed and reinstalled) or when it jumps (a port
+renumbered under a new counter): the difference comes out hugely negative or
+hugely positive and one port looks idle or saturated for a whole cycle.
+
+counter_delta() classifies one difference:
+
+   ok       new >= old and believable
+   wrap     new < old and the counter went past 2**32 (or 2**64): the delta is
+            repaired to width - old + new
+   reset    new < old otherwise: the counter restarted, the delta is unknown
+   jump     new >= old but more than `limit` (the most bytes the link could
+            have carried over the interval): the delta is unknown
+
+A decrease counts as a wrap of a counter `width` wide only when old was in
+the upper half of its range (old >= width / 2) and the repaired delta stays
+below width / 2, and with a limit it must fit within the limit as well;
+anything else is a reset, however large the limit. Port counters may be 32 or
+64 bits wide depending on the switch; OpenFlow 1.3 flow counters are always
+64 bits, so FlowTable passes widths=(WRAP64,). Callers drop unknown deltas:
+the counter is taken as the new baseline and the previous rate is held for
+the cycle, so the bogus value never reaches the port usages or the group
+sums. A switch most of whose ports reset in the same poll has reconnected
+(is_reconnect()), and all its ports are treated that way for the cycle.
+
+Example:
+   delta, kind = counter_delta(new_bytes, old_bytes, link_speed * interval * LIMIT_SLACK)
+   if delta is None:
+      rate = previous_rate
+"""
+
+WRAP32 = 1 << 32
+WRAP64 = 1 << 64
+LIMIT_SLACK = 1.5					# poll times are taken on the scheduler, not the switch
+KINDS = ('ok', 'wrap', 'reset', 'jump')
+WIDTHS = (WRAP32, WRAP64)
+
+
+def counter_delta(new, old, limit=None, widths=WIDTHS):
+	"""(delta, kind) of a counter going from old to new, delta None when it cannot be trusted"""
+	if new >= old:
+		delta = new - old
+		if limit is not None and delta > limit:
+			return None, 'jump'
+		return delta, 'ok'
+	for width in widths:
+		if width // 2 <= old < width:
+			delta = width - old + new
+			if delta < width // 2 and (limit is None or delta <= limit):
+				return delta, 'wrap'
+			break
+	return None, 'reset'
+
+
+def is_reconnect(resets, ports):
+	"""True when `resets` of a switch's `ports` counters restarted in one poll"""
+	return resets > 0 and resets * 2 >= ports
@@ -0,0 +1,320 @@
+"""
+Topology discovery from the controller.
+
+discover() builds a Topology from the switch list
+(/wm/core/controller/switches/json), the inter-switch links Floodlight
+found with LLDP (/wm/topology/links/json) and the hosts its device manager
+tracks (/wm/device/). Leaves and spines are told apart by two-colouring the
+link graph: a component takes its roles from any switch the seed topology
+(e.g. topologies/testbed.json) already names as a leaf or spine, or that has
+hosts attached; a component without one makes its larger side the leaves (on
+a tie the side holding the lowest dpid). A switch without links is a leaf.
+Uplinks are a leaf's ports linked to a spine; a leaf without discovered links
+keeps the uplinks of the seed. Names come from the seed, unknown leaves are
+named by dpid.
+
+Port speeds come from the switches' port descriptions
+(/wm/core/switch/all/port-desc/json, currSpeed in kbit/s); a speed the seed
+configures wins over the reported one, and a controller without the endpoint
+leaves the seed's speeds alone.
+
+A leaf's hosts are the seed's plus the attachments the controller reports
+on that leaf's non-uplink ports; a reported attachment wins over the seed
+when a host moved. HostCache keeps the attachments indexed by switch and
+updates them in place, so new racks and hosts reach the ip tuple -> port
+candidates (Topology.tuple_ports(), the old create_iptuple_outputport_comb())
+without a restart.
+
+TopologyWatcher repeats the discovery every `interval` seconds on a daemon
+thread. When the switches, links or port speeds changed it builds the new Topology from
+the previous one, so only the path index entries of the leaves whose spine
+links changed are recomputed, and publishes it in `topology` with a single
+assignment; the control loop picks it up between cycles and never waits on
+discovery.
+
+Run on its own it prints (or --save's) the discovered topology as a
+topology file:
+
+   python -m flowscheduler.discovery localhost:8080 --seed topologies/testbed.json --save topology.json
+
+Example:
+   watcher = TopologyWatcher(client, seed=Topology.load('topologies/testbed.json'), interval=5.0)
+   watcher.refresh()
+   watcher.start()
+   engine = SchedulerEngine(client, watcher.topology, 4, watcher=watcher)
+"""
+
+import argparse
+import sys
+import threading
+
+from flowscheduler.restclient import ControllerClient
+from flowscheduler.topology import Leaf, Topology, link_key
+
+DEVICE_PATH = '/wm/device/'
+PORT_DESC_PATH = '/wm/core/switch/all/port-desc/json'
+
+
+def switch_dpids(switches):
+	"""dpids of a /wm/core/controller/switches/json reply (switchDPID, or dpid on older controllers)"""
+	return sorted(str(switch.get('switchDPID', switch.get('dpid'))) for switch in switches)
+
+
+def parse_links(links):
+	"""Set of link_key() tuples of a /wm/topology/links/json reply, each link once"""
+	parsed = set()
+	for link in links:
+		parsed.add(link_key(str(link['src-switch']), int(link['src-port']), str(link['dst-switch']), int(link['dst-port'])))
+	return parsed
+
+
+def parse_devices(devices):
+	"""
+	{ip: (dpid, port)} of a /wm/device/ reply, a list of devices or
+	{"devices": [...]} on newer controllers. Devices without an IPv4
+	address or a numbered attachment point are left out.
+	"""
+	if isinstance(devices, dict):
+		devices = devices.get('devices', [])
+	attachments = {}
+	for device in devices:
+		points = device.get('attachmentPoint') or []
+		if not points:
+			continue
+		try:
+			attachment = (str(points[0]['switch']), int(points[0]['port']))
+		except (KeyError, ValueError, TypeError):
+			continue
+		for ip in device.get('ipv4') or []:
+			attachments[str(ip)] = attachment
+	return attachments
+
+
+def parse_port_speeds(reply):
+	"""
+	{dpid: {port: Mbit/s}} of a /wm/core/switch/all/port-desc/json reply.
+	Ports without a number (local) or a current speed are left out.
+	"""
+	speeds = {}
+	for dpid, desc in reply.items():
+		if not isinstance(desc, dict):
+			continue
+		for entry in desc.get('portDesc', desc.get('port_desc')) or []:
+			try:
+				port = int(entry.get('portNumber', entry.get('port_number')))
+				kbps = int(entry.get('currSpeed', entry.get('curr_speed', 0)))
+			except (ValueError, TypeError):
+				continue
+			if kbps > 0:
+				speeds.setdefault(str(dpid), {})[port] = kbps // 1000 if kbps % 1000 == 0 else kbps / 1000.0
+	return speeds
+
+
+def port_speeds(client):
+	"""parse_port_speeds() of the controller's port descriptions, {} when it does not serve them"""
+	try:
+		return parse_port_speeds(client.get_json(PORT_DESC_PATH))
+	except Exception:								# an older controller, speeds stay as configured
+		return {}
+
+
+class HostCache(object):
+	"""Host attachments {ip: (dpid, port)}, also indexed {dpid: {ip: port}}"""
+
+	def __init__(self):
+		self.attachments = {}
+		self.by_switch = {}
+
+	def update(self, attachments):
+		"""Apply a full set of reported attachments; returns the dpids whose hosts changed"""
+		changed = set()
+		for ip in list(self.attachments):
+			if ip not in attachments:
+				dpid, port = self.attachments.pop(ip)
+				del self.by_switch[dpid][ip]
+				changed.add(dpid)
+		for ip, attachment in attachments.items():
+			old = self.attachments.get(ip)
+			if old == attachment:
+				continue
+			if old is not None:
+				del self.by_switch[old[0]][ip]
+				changed.add(old[0])
+			self.attachments[ip] = attachment
+			self.by_switch.setdefault(attachment[0], {})[ip] = attachment[1]
+			changed.add(attachment[0])
+		for dpid in changed:
+			if dpid in self.by_switch and not self.by_switch[dpid]:
+				del self.by_switch[dpid]
+		return changed
+
+
+def classify(dpids, links, seed=None, host_switches=()):
+	"""(leaf dpids, spine dpids), see the module docstring"""
+	neighbours = dict((dpid, set()) for dpid in dpids)
+	for dpid_a, port_a, dpid_b, port_b in links:
+		if dpid_a in neighbours and dpid_b in neighbours and dpid_a != dpid_b:
+			neighbours[dpid_a].add(dpid_b)
+			neighbours[dpid_b].add(dpid_a)
+	known = {}
+	if seed is not None:
+		for leaf in seed.leaves:
+			known[leaf.dpid] = 'leaf'
+		for name, dpid in seed.spines:
+			known[dpid] = 'spine'
+	for dpid in host_switches:
+		known.setdefault(dpid, 'leaf')
+	leaves = set()
+	spines = set()
+	seen = set()
+	for start in sorted(dpids):
+		if start in seen:
+			continue
+		side = {start : 0}
+		queue = [start]
+		for dpid in queue:
+			for neighbour in sorted(neighbours[dpid]):
+				if neighbour not in side:
+					side[neighbour] = 1 - side[dpid]
+					queue.append(neighbour)
+		seen.update(side)
+		if len(side) == 1:
+			(leaves if known.get(start) != 'spine' else spines).add(start)
+			continue
+		sides = ([dpid for dpid in side if side[dpid] == 0], [dpid for dpid in side if side[dpid] == 1])
+		leaf_side = None
+		for dpid in sorted(side):
+			if dpid in known:
+				leaf_side = side[dpid] if known[dpid] == 'leaf' else 1 - side[dpid]
+				break
+		if leaf_side is None:
+			leaf_side = 0 if len(sides[0]) >= len(sides[1]) else 1		# side 0 holds the lowest dpid
+		leaves.update(sides[leaf_side])
+		spines.update(sides[1 - leaf_side])
+	return leaves, spines
+
+
+def build_topology(dpids, links, seed=None, previous=None, hosts=None, speeds=None):
+	"""
+	Topology of the discovered switches and links, named from `seed`, with
+	the seed's hosts and those of `hosts` (a HostCache), and the port speeds
+	of `speeds` ({dpid: {port: Mbit/s}}) under the seed's
+	"""
+	host_switches = hosts.by_switch if hosts is not None else {}
+	leaf_dpids, spine_dpids = classify(dpids, links, seed, [dpid for dpid in host_switches if dpid in dpids])
+	seed_leaves = seed.by_dpid if seed is not None else {}
+	seed_spines = dict((dpid, name) for name, dpid in seed.spines) if seed is not None else {}
+	uplinks = {}
+	for dpid_a, port_a, dpid_b, port_b in links:
+		if dpid_a in leaf_dpids and dpid_b in spine_dpids:
+			uplinks.setdefault(dpid_a, set()).add(port_a)
+		if dpid_b in leaf_dpids and dpid_a in spine_dpids:
+			uplinks.setdefault(dpid_b, set()).add(port_b)
+	# the seed's order first, then new switches by dpid
+	order = [leaf.dpid for leaf in seed.leaves] if seed is not None else []
+	order = [dpid for dpid in order if dpid in leaf_dpids] + sorted(leaf_dpids.difference(order))
+	attachments = hosts.attachments if hosts is not None else {}
+	leaves = []
+	for dpid in order:
+		known = seed_leaves.get(dpid)
+		if dpid in uplinks:
+			leaf_uplinks = sorted(uplinks[dpid])
+		else:
+			leaf_uplinks = known.uplinks if known is not None else []
+		leaf_hosts = {}
+		if known is not None:
+			for ip, port in known.hosts.items():
+				if ip not in attachments:				# a reported attachment wins, the host may have moved
+					leaf_hosts[ip] = port
+		for ip, port in host_switches.get(dpid, {}).items():
+			if port not in leaf_uplinks:				# seen through an uplink is not an attachment
+				leaf_hosts[ip] = port
+		leaf_speeds = dict((speeds or {}).get(dpid, {}))
+		if known is not None:
+			leaf_speeds.update(known.speeds)			# configured speeds win
+		leaves.append(Leaf(known.name if known is not None else dpid, dpid, leaf_uplinks, leaf_hosts, leaf_speeds))
+	spines = [(seed_spines.get(dpid, dpid), dpid) for dpid in sorted(spine_dpids)]
+	return Topology(leaves, spines, links, previous)
+
+
+def discover(client, seed=None, previous=None):
+	"""Topology of the fabric as the controller sees it now"""
+	dpids = switch_dpids(client.switches())
+	links = parse_links(client.get_json('/wm/topology/links/json'))
+	hosts = HostCache()
+	hosts.update(parse_devices(client.get_json(DEVICE_PATH)))
+	return build_topology(dpids, links, seed, previous, hosts, port_speeds(client))
+
+
+class TopologyWatcher(object):
+	"""Keeps `topology` up to date from the controller, see the module docstring"""
+
+	def __init__(self, client, seed=None, interval=5.0):
+		self.client = client
+		self.seed = seed
+		self.interval = interval
+		self.topology = seed if seed is not None else Topology()
+		self.hosts = HostCache()
+		self.version = 0							# bumped whenever `topology` is replaced
+		self.refreshes = 0
+		self.errors = 0
+		self.last_error = None
+		self._signature = None
+		self._stop = threading.Event()
+		self._thread = None
+
+	def refresh(self):
+		"""Discover once; returns True when the topology changed"""
+		dpids = switch_dpids(self.client.switches())
+		links = parse_links(self.client.get_json('/wm/topology/links/json'))
+		hosts_changed = self.hosts.update(parse_devices(self.client.get_json(DEVICE_PATH)))
+		speeds = port_speeds(self.client)
+		self.refreshes += 1
+		signature = (tuple(dpids), frozenset(links), frozenset((dpid, port, speed) for dpid in speeds
+																for port, speed in speeds[dpid].items()))
+		if signature == self._signature and not hosts_changed:
+			return False
+		self.topology = build_topology(dpids, links, self.seed, self.topology, self.hosts, speeds)
+		self._signature = signature
+		self.version += 1
+		return True
+
+	def _run(self):
+		while not self._stop.wait(self.interval):
+			try:
+				self.refresh()
+			except Exception as e:					# keep the last topology until the controller answers again
+				self.errors += 1
+				self.last_error = e
+
+	def start(self):
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._run, name='topology-watcher')
+			self._thread.daemon = True
+			self._thread.start()
+		return self
+
+	def stop(self):
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join(self.interval + 1.0)
+			self._thread = None
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Discover the fabric topology from the controller')
+	parser.add_argument("controllerRestIP", action='store', help='controller IP:RESTport, e.g., localhost:8080')
+	parser.add_argument("--seed", action='store', default=None, help='topology file whose names, roles and hosts are kept')
+	parser.add_argument("--save", action='store', default=None, help='write the topology file here instead of printing it')
+	args = parser.parse_args(argv)
+	client = ControllerClient(args.controllerRestIP)
+	topology = discover(client, Topology.load(args.seed) if args.seed else None)
+	client.close()
+	if args.save:
+		topology.save(args.save)
+	else:
+		sys.stdout.write(topology.dumps())
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,713 @@
+"""
+The flow scheduler: one engine for any number of leaves.
+
+SchedulerEngine runs the control loop that flowsch.py, flowsch-leaf0.py,
+flowsch-leaf1.py and flowsch-entire.py used to carry a copy of each, driven
+by a Topology instead of hard coded tables. Every cycle it fetches the flow
+and port stats of the whole fabric with one /wm/core/switch/all/ request
+each, so the leaves no longer poll the controller one process apiece, and:
+
+   parse_flows    table 200 entries of the managed leaves into a FlowTable per leaf
+   group          group byte rates per ip tuple (or per leaf in 'switch' mode)
+   parse_ports    port tx/rx rates
+   schedule       one place_all() over the tuples of every managed leaf
+   push           the changed part of the path assignment to /wm/forwarding/json
+   evict          flows idle for idle_cycles cycles
+
+Two modes:
+   tuple     (flowsch-leaf*.py) groups are (tcp_src ^ tcp_dst) % num_groups per
+             (ipv4_src, ipv4_dst), scheduled on the source host's leaf: on the
+             destination's host port within a rack, on the uplinks otherwise
+   switch    (flowsch-entire.py) groups are
+             (ipv4_src ^ ipv4_dst ^ tcp_src ^ tcp_dst) % num_groups per leaf,
+             scheduled on the leaf's uplinks
+
+The placement sees every port as (dpid, port), so the ports of all leaves
+share one congestion baseline and one place_all() (and one ShardedScheduler);
+ports with a known capacity (the topology's port speeds, --link-speed for
+the rest) are balanced by utilization rather than bytes, so a 10G uplink is
+not loaded like a 40G one, and headroom() reports what each uplink has left;
+the path assignment sent to the controller carries plain port numbers as
+before. The candidate ports of an ip tuple are looked up every cycle from the
+hosts' racks (Topology.rack()) and the (leaf, dst leaf) path index, so the
+engine keeps per rack and per host entries only, never one per ip tuple. With a
+TopologyWatcher (--discover) the engine switches to the newest discovered
+topology between cycles, keeping the flow and port state of the switches
+that stay.
+
+With an elephant threshold the flows of a leaf at or above it (at most
+elephant_limit per leaf, see flowscheduler.heavyhitters) are taken out of
+their hash group and placed on their own (one group per flow in a unit per
+leaf and candidate ports), ahead of the groups, and each gets
+an exact-match rule on its leaf through a RuleCache (flowscheduler.staticflows)
+that keeps every switch within rule_options' table budget; the rest, and
+the elephants the cache has no room for, keep using the groups.
+
+With a Snapshot (--snapshot, see flowscheduler.snapshot) the counter
+baselines of the ports and flows and the path assignment are written to a
+memory-mapped file at the end of every cycle, and restore() loads them at
+startup, so the first poll after a restart already yields rates and the
+groups stay where they were.
+
+Example:
+   engine = SchedulerEngine(ControllerClient('localhost:8080'), Topology.load('topologies/testbed.json'), 4)
+   engine.run_once()
+   engine.run_forever(PollScheduler(1.0))
+
+   python -m flowscheduler.engine localhost:8080 4 --topology topologies/testbed.json --leaf leaf0
+"""
+
+import argparse
+import json
+
+from flowscheduler.aggregate import active_groups, group_usage
+from flowscheduler.collector import StatsCollector
+from flowscheduler.counters import LIMIT_SLACK, counter_delta, is_reconnect
+from flowscheduler.discovery import TopologyWatcher
+from flowscheduler.estimators import ESTIMATORS, KeyedEstimator, make_estimator
+from flowscheduler.flowtable import FlowTable
+from flowscheduler.heavyhitters import HeavyHitters
+from flowscheduler.metrics import MetricsServer, SchedulerMetrics
+from flowscheduler.placement import make_placement
+from flowscheduler.poller import PollScheduler, monotonic, per_second
+from flowscheduler.pusher import DeltaPusher
+from flowscheduler.restclient import REQUEST_ERRORS, ControllerClient
+from flowscheduler.sharding import ShardedScheduler
+from flowscheduler.snapshot import Snapshot
+from flowscheduler.solvers import SOLVERS
+from flowscheduler.staticflows import POLICIES, RuleCache
+from flowscheduler.statsparser import iter_flows, iter_ports, text_type
+from flowscheduler.topology import Topology
+
+MODES = ('tuple', 'switch')
+
+
+def convert_to_json(path_assignment):
+	# convert keys in path_assignment to strings
+	str_path_assignment = {}
+	for item in path_assignment:
+		str_path_assignment[str(item)] = path_assignment[item]
+	return json.dumps(str_path_assignment)
+
+
+class Forwarding(object):
+	"""The controller's forwarding module, which takes the path assignment"""
+
+	def __init__(self, client):
+		self.client = client
+
+	def get(self, data):
+		ret = self.rest_call({}, 'GET')
+		return json.loads(ret[2])
+
+	def set(self, data):
+		try:
+			ret = self.rest_call(data, 'POST')
+		except REQUEST_ERRORS:					# not retried, the pusher sends the delta again next cycle
+			return False
+		return ret[0] == 204
+
+	def rest_call(self, data, action):
+		path = '/wm/forwarding/json'
+		body = data if isinstance(data, (str, text_type)) else json.dumps(data)		# convert_to_json() output goes as is
+		ret = self.client.request(action, path, body)
+		return ret
+
+
+def _port_numbers(groups_path):
+	# {group_id: (dpid, port)} from the placement -> {group_id: port} for the controller
+	return dict((group_id, port[1] if port != -1 else -1) for group_id, port in groups_path.items())
+
+
+class SchedulerEngine(object):
+	"""The scheduler's control loop over the leaves of a topology, see the module docstring"""
+
+	def __init__(self, client, topology, num_groups, leaves=None, mode='tuple', placement_options=None, shards=1,
+				estimator='raw', estimator_tau=3.0, estimator_window=5, estimate_levels=('group', 'port'),
+				idle_cycles=30, full_push_every=0, collector=None, metrics=None, watcher=None,
+				elephant_threshold=0, elephant_limit=64, rule_options=None, link_speed=None,
+				snapshot=None):
+		if mode not in MODES:
+			raise ValueError("unknown mode %r, expected one of %s" % (mode, ', '.join(MODES)))
+		self.client = client
+		self.num_groups = num_groups
+		self.mode = mode
+		self.idle_cycles = idle_cycles
+		self.estimator = (estimator, estimator_tau, estimator_window)
+		self.estimate_levels = tuple(estimate_levels)
+		self.collector = collector					# fetches the flows and ports replies in parallel when set
+		self.watcher = watcher						# TopologyWatcher, the topology is followed when set
+		self.leaf_names = leaves
+		self.snapshot = snapshot					# Snapshot the state is checkpointed to every cycle
+		self.metrics = metrics if metrics is not None else SchedulerMetrics()
+		self.flow_stats = {}						# leaf dpid -> FlowTable
+		self.port_stats = {}						# dpid -> port -> stats dict
+		self.flow_groups = {}						# ip tuple (or leaf dpid) -> {group_id: rate}
+		self.link_speed = link_speed				# bytes/sec of a port without a known speed
+		self.counter_anomalies = {}					# (level, kind) -> count, see flowscheduler.counters
+		self._cycle_anomalies = {}
+		self.elephant_threshold = elephant_threshold	# bytes/sec, 0 keeps every flow in its group
+		self.rules = RuleCache(client, **(rule_options or {})) if elephant_threshold else None
+		self.elephant_limit = elephant_limit
+		if self.rules is not None and self.rules.budget:
+			self.elephant_limit = min(elephant_limit, self.rules.budget) if elephant_limit else self.rules.budget
+		self.heavy_hitters = {}						# leaf dpid -> HeavyHitters
+		self.elephants = {}							# (dpid, ipv4_src, ipv4_dst, tcp_src, tcp_dst) -> rate, this cycle
+		self.elephant_ports = {}					# the same keys -> port
+		self._elephant_units = set()				# placement keys of the elephants, see schedule()
+		self.path_assignment = {}
+		self.group_rates = self._level_estimator('group', keyed=True)
+		self.port_rates = self._level_estimator('port', keyed=True)
+		if shards > 1:
+			self.placement = ShardedScheduler(shards, placement_options)
+		else:
+			self.placement = make_placement(**(placement_options or {}))
+		self.pusher = DeltaPusher(Forwarding(client), convert_to_json, full_push_every)
+		self.set_topology(topology, leaves)
+
+	def _level_estimator(self, level, keyed=False):
+		# rate estimator for one level (flow, group or port), None where the raw rate is kept
+		estimator = None
+		if level in self.estimate_levels:
+			estimator = make_estimator(*self.estimator)
+		if estimator is not None and keyed:
+			return KeyedEstimator(estimator)
+		return estimator
+
+	def set_topology(self, topology, leaves=None):
+		"""
+		Schedule the leaves named in `leaves` (all of them by default) of
+		`topology`; named leaves it does not have are skipped. Flow state of
+		leaves that stay is kept, the ip tuples (or leaf, in 'switch' mode) of
+		a leaf that goes are forgotten as evict() forgets idle ones.
+		"""
+		self.topology = topology
+		if leaves:
+			self.leaves = [topology.leaf(name) for name in leaves if name in topology.by_name or name in topology.by_dpid]
+		else:
+			self.leaves = list(topology.leaves)
+		for leaf in self.leaves:
+			if leaf.dpid not in self.flow_stats:
+				self.flow_stats[leaf.dpid] = FlowTable(self._level_estimator('flow'), self.link_speed)
+				if self.elephant_threshold:
+					self.heavy_hitters[leaf.dpid] = HeavyHitters(self.elephant_threshold, self.elephant_limit)
+		for dpid in list(self.flow_stats):
+			if dpid not in topology.by_dpid or topology.by_dpid[dpid] not in self.leaves:
+				table = self.flow_stats.pop(dpid)
+				if self.mode == 'switch':
+					self._forget(dpid)
+				else:
+					for ip_tuple in table.pairs:
+						if ip_tuple is not None and not any(ip_tuple in other.pair_ids for other in self.flow_stats.values()):
+							self._forget(ip_tuple)
+				self.heavy_hitters.pop(dpid, None)
+		self.managed = set(leaf.dpid for leaf in self.leaves)
+		self.capacities = {}						# (dpid, port) -> bytes/sec, ports of known speed
+		for leaf in topology.leaves:
+			for port in set(leaf.ports()) | set(leaf.speeds):
+				capacity = leaf.capacity(port, self.link_speed)
+				if capacity:
+					self.capacities[(leaf.dpid, port)] = capacity
+		for dpid in self.flow_stats:
+			leaf = topology.by_dpid[dpid]
+			self.flow_stats[dpid].max_rate = max([leaf.capacity(port, 0) for port in leaf.speeds] + [self.link_speed or 0]) or None
+		self._racks = {}							# host ip -> leaf, memo of topology.rack() for the hosts it knows
+		self._path_ports = {}						# (leaf dpid, dst leaf dpid) -> [(dpid, port)]
+		self._host_ports = {}						# host ip -> [(dpid, host port)]
+
+	def _rack(self, ip):
+		leaf = self._racks.get(ip)
+		if leaf is None:
+			leaf = self.topology.rack(ip)
+			if leaf is not None:					# misses are not kept, so the memo stays within the topology's hosts
+				self._racks[ip] = leaf
+		return leaf
+
+	def _candidates(self, key):
+		# ports a key's groups may take: the destination's host port within a rack, the path index otherwise
+		topology = self.topology
+		if self.mode == 'switch':
+			leaf = topology.by_dpid.get(key)
+			return [(leaf.dpid, port) for port in leaf.uplinks] if leaf is not None and leaf.uplinks else None
+		leaf = self._rack(key[0])
+		dst_leaf = self._rack(key[1])
+		if leaf is None or dst_leaf is None or leaf.dpid not in self.managed or key[0] == key[1]:
+			return None
+		if dst_leaf is leaf:
+			ports = self._host_ports.get(key[1])
+			if ports is None:
+				ports = self._host_ports[key[1]] = [(leaf.dpid, leaf.hosts[key[1]])]
+			return ports
+		path = (leaf.dpid, dst_leaf.dpid)
+		ports = self._path_ports.get(path)
+		if ports is None:
+			ports = self._path_ports[path] = [(leaf.dpid, port) for port in topology.paths(leaf, dst_leaf)]
+		return ports or None
+
+	def parse_flows(self, flows, now):
+		"""
+		flow_stats data structure (FlowTable per leaf):
+		one row per (ipv4_src, ipv4_dst, tcp_src, tcp_dst), updated in place, with the columns
+		pkt_count, pkt_diff, byte_count, byte_diff, time and byte_rate (byte_diff in bytes/sec
+		over the time between the two polls). Returns the number of flows parsed.
+		"""
+		# flows is the reply text or a streamed response; only table 200 TCP/IP entries come through
+		tables = self.flow_stats
+		racks = self._racks if self.mode == 'tuple' else None
+		parsed = 0
+		for (dpid, ipv4_src, ipv4_dst, tcp_src, tcp_dst, packet_count, byte_count) in iter_flows(flows):
+			table = tables.get(dpid)
+			if table is None:
+				continue
+			if racks is not None:
+				leaf = racks[ipv4_src] if ipv4_src in racks else self._rack(ipv4_src)
+				if leaf is None or leaf.dpid != dpid:		# counted on the source host's leaf only
+					continue
+			table.update(ipv4_src, ipv4_dst, tcp_src, tcp_dst, packet_count, byte_count, now)
+			parsed += 1
+		for table in tables.values():
+			for kind in table.anomalies:
+				if table.anomalies[kind]:
+					self._count_anomaly('flow', kind, table.anomalies[kind])
+					table.anomalies[kind] = 0
+		return parsed
+
+	def group(self, now):
+		"""Group bandwidth usage of every ip tuple (or leaf); returns the number of active groups"""
+		num_groups = self.num_groups
+		group_rates = self.group_rates
+		active = 0
+		self.elephants = {}
+		for dpid in self.flow_stats:
+			table = self.flow_stats[dpid]
+			if self.mode == 'switch':
+				usage = group_usage(table, num_groups, with_addresses=True, by_pair=False)
+				keys = [(dpid, 0)]
+			else:
+				usage = group_usage(table, num_groups)
+				keys = [(ip_tuple, pair_id * num_groups) for pair_id, ip_tuple in enumerate(table.pairs)
+						if ip_tuple is not None]			# pair ids released by eviction are None
+			if dpid in self.heavy_hitters:
+				self._split_elephants(dpid, table, usage)
+			for key, base in keys:
+				groups = {}
+				for i in range(0,num_groups):
+					groups[i] = float(usage[base + i])
+					if group_rates is not None:
+						groups[i] = group_rates.update((key, i), groups[i], now)
+				self.flow_groups[key] = groups
+			active += active_groups(usage)
+		return active
+
+	def _split_elephants(self, dpid, table, usage):
+		# take the leaf's elephants out of their group's usage, schedule() places them on their own
+		num_groups = self.num_groups
+		rows = {}
+		for row in self.heavy_hitters[dpid].update(table):
+			ipv4_src, ipv4_dst, tcp_src, tcp_dst = table.flow(row)
+			ports = self._candidates((ipv4_src, ipv4_dst) if self.mode == 'tuple' else dpid)
+			# an elephant with a single way to go stays in its group, a rule would not move it
+			if ports is not None and len(ports) > 1:
+				rows[(dpid, ipv4_src, ipv4_dst, tcp_src, tcp_dst)] = row
+		# so does one the rule cache could not give a rule (switch at its budget, post failed)
+		admitted = self.rules.admit(rows, dict((key, table.byte_rate[row]) for key, row in rows.items()))
+		for key in admitted:
+			row = rows[key]
+			tcp_src, tcp_dst = key[3:]
+			pair_id = table.pair[row]
+			if self.mode == 'switch':
+				index = (table.src_ip[pair_id] ^ table.dst_ip[pair_id] ^ tcp_src ^ tcp_dst) % num_groups
+			else:
+				index = pair_id * num_groups + (tcp_src ^ tcp_dst) % num_groups
+			rate = table.byte_rate[row]
+			usage[index] = max(usage[index] - rate, 0.0)
+			self.elephants[key] = rate
+
+	def parse_ports(self, ports, now):
+		"""
+		Port counters and rates. Differences go through counter_delta(): a
+		wrapped counter is repaired, a port whose counters reset or jumped keeps
+		its previous rates for the cycle, and so does every port of a switch
+		that reconnected (most of its ports reset at once).
+		"""
+		port_stats = self.port_stats
+		by_switch = {}
+		for port in iter_ports(ports):
+			by_switch.setdefault(port[0], []).append(port)
+		for dpid in by_switch:
+			if dpid not in port_stats:										# add entry for new switch
+				port_stats[dpid] = {}
+			deltas = []
+			resets = 0
+			for (dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes) in by_switch[dpid]:
+				stat = port_stats[dpid].get(port_number)
+				if stat is None:
+					deltas.append(None)
+					continue
+				interval = now - stat['time']
+				speed = self.capacities.get((dpid, port_number), self.link_speed)
+				limit = speed * interval * LIMIT_SLACK if speed and interval > 0 else None
+				counted = (counter_delta(rx_packets, stat['rx_packets']), counter_delta(rx_bytes, stat['rx_bytes'], limit),
+							counter_delta(tx_packets, stat['tx_packets']), counter_delta(tx_bytes, stat['tx_bytes'], limit))
+				if any(kind == 'reset' for delta, kind in counted):
+					resets += 1
+				deltas.append(counted)
+			reconnect = is_reconnect(resets, len(deltas))
+			if reconnect:
+				self._count_anomaly('switch', 'reconnect')
+			for port, counted in zip(by_switch[dpid], deltas):
+				dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes = port
+				if counted is None:
+					self._add_port_stat(dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes,		# add entry for new port number
+										0, 0, 0, 0, now, 0)
+					continue
+				stat = port_stats[dpid][port_number]
+				kinds = [kind for delta, kind in counted if kind != 'ok']
+				for kind in set(kinds):
+					self._count_anomaly('port', kind)
+				if reconnect or any(delta is None for delta, kind in counted):
+					self._add_port_stat(dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes,		# keep the rates, re-anchor
+										0, 0, 0, 0, now, now - stat['time'], stat['rx_bytes_rate'], stat['tx_bytes_rate'])
+					continue
+				self._add_port_stat(dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes,		# update entry
+									counted[0][0], counted[1][0], counted[2][0], counted[3][0], now, now - stat['time'])
+
+	def _count_anomaly(self, level, kind, count=1):
+		key = (level, kind)
+		self.counter_anomalies[key] = self.counter_anomalies.get(key, 0) + count
+		self._cycle_anomalies[key] = self._cycle_anomalies.get(key, 0) + count
+
+	def _add_port_stat(self, dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes, rx_packets_diff, rx_bytes_diff, tx_packets_diff, tx_bytes_diff, now, interval,
+					rx_bytes_rate=None, tx_bytes_rate=None):
+		if rx_bytes_rate is None:
+			rx_bytes_rate = self._port_rate(dpid, port_number, 'rx', rx_bytes_diff, now, interval)
+		if tx_bytes_rate is None:
+			tx_bytes_rate = self._port_rate(dpid, port_number, 'tx', tx_bytes_diff, now, interval)
+		self.port_stats[dpid][port_number] = {'rx_packets' : rx_packets, 'rx_bytes' : rx_bytes,
+											'tx_packets' : tx_packets, 'tx_bytes' : tx_bytes,
+											'rx_packets_diff': rx_packets_diff, 'rx_bytes_diff' : rx_bytes_diff,
+											'tx_packets_diff': tx_packets_diff, 'tx_bytes_diff' : tx_bytes_diff,
+											'rx_bytes_rate' : rx_bytes_rate, 'tx_bytes_rate' : tx_bytes_rate, 'time' : now}
+
+	def _port_rate(self, dpid, port_number, direction, bytes_diff, now, interval):
+		rate = per_second(bytes_diff, interval)
+		if self.port_rates is None or interval <= 0:					# nothing measured yet for a new port
+			return rate
+		return self.port_rates.update((dpid, port_number, direction), rate, now)
+
+	def _tx_rate(self, dpid, port):
+		stat = self.port_stats.get(dpid, {}).get(port)
+		return stat['tx_bytes_rate'] if stat is not None else 0.0
+
+	def port_usages(self):
+		"""Congestion baseline: tx rate of every port of the managed leaves, keyed (dpid, port)"""
+		return dict(((leaf.dpid, port), self._tx_rate(leaf.dpid, port)) for leaf in self.leaves for port in leaf.ports())
+
+	def uplink_loads(self):
+		return [self._tx_rate(leaf.dpid, port) for leaf in self.leaves for port in leaf.uplinks]
+
+	def headroom(self):
+		"""[(dpid, port, tx rate, capacity)] of the managed leaves' uplinks of known capacity, bytes/sec"""
+		return [(leaf.dpid, port, self._tx_rate(leaf.dpid, port), self.capacities[(leaf.dpid, port)])
+				for leaf in self.leaves for port in leaf.uplinks if (leaf.dpid, port) in self.capacities]
+
+	def fabric_load(self):
+		"""Transmit rate of every known port in a stable order, fed to the adaptive poller"""
+		return [self.port_stats[dpid][port]['tx_bytes_rate'] for dpid in sorted(self.port_stats) for port in sorted(self.port_stats[dpid])]
+
+	def schedule(self):
+		"""
+		For each src-dst ip tuple (or leaf), there is a set of paths.
+		Assign paths to each of the groups based on path utilization.
+		"""
+		self.placement.begin_cycle(self.port_usages(), self.capacities or None)		# one congestion baseline for the whole cycle
+		candidates = self._candidates
+		tuples = []
+		# the elephants of a leaf sharing candidate ports are placed as one unit, one group per flow,
+		# so they spread over the ports instead of each taking the least loaded one
+		units = {}
+		for key, rate in self.elephants.items():
+			ports = candidates(key[1:3] if self.mode == 'tuple' else key[0])		# more than one, see _split_elephants()
+			unit = units.get(('elephants', key[0], tuple(ports)))
+			if unit is None:
+				unit = units[('elephants', key[0], tuple(ports))] = ({}, ports)
+			unit[0][key] = rate
+		for unit in sorted(units):
+			tuples.append((unit, units[unit][0], units[unit][1]))
+		for key in self.flow_groups:
+			ports = candidates(key)
+			# tuples without candidate ports (e.g. to hosts outside the topology) are left to the controller
+			if ports is not None:
+				tuples.append((key, self.flow_groups[key], ports))
+		assignment = self.placement.place_all(tuples)
+		elephant_ports = {}
+		for key in assignment:
+			if key in units:
+				for flow_key, port in assignment[key].items():
+					if port != -1:
+						elephant_ports[flow_key] = port[1]
+			else:
+				self.path_assignment[key] = _port_numbers(assignment[key])
+		for unit in self._elephant_units:
+			if unit not in units:
+				self.placement.forget(unit)
+		self._elephant_units = set(units)
+		self.elephant_ports = elephant_ports
+		return self.path_assignment
+
+	def push(self):
+		"""Send what changed since the last push; returns the payload or None"""
+		if self.rules is not None:
+			self.rules.sync(self.elephant_ports, self.elephants)
+		if not self.path_assignment:
+			return None
+		return self.pusher.push(self.path_assignment)
+
+	def evict(self):
+		"""Forget flows idle for idle_cycles cycles, and the ip tuples left without any flow"""
+		for dpid in self.flow_stats:
+			for ip_tuple in self.flow_stats[dpid].end_cycle(self.idle_cycles):
+				if self.mode != 'switch':
+					self._forget(ip_tuple)
+
+	def _forget(self, key):
+		# drop an ip tuple (or leaf, in 'switch' mode) that left the schedule
+		self.flow_groups.pop(key, None)
+		self.path_assignment.pop(key, None)
+		self.pusher.forget(key)
+		self.placement.forget(key)
+		if self.group_rates is not None:
+			for i in range(0,self.num_groups):
+				self.group_rates.forget((key, i))
+
+	def checkpoint(self):
+		"""Write the counter baselines and the path assignment to the snapshot"""
+		return self.snapshot.save(self.port_stats, self.flow_stats, self.path_assignment, self.mode, self.num_groups)
+
+	def restore(self):
+		"""
+		Load the snapshot of a previous process: the port and flow counters
+		become the baselines of the first poll, and the path assignment of the
+		tuples whose ports are still candidates is taken over (and handed to
+		the placement). Returns the snapshot's age in seconds, None when there
+		was none to trust.
+		"""
+		state = self.snapshot.load() if self.snapshot is not None else None
+		if state is None:
+			return None
+		for dpid in state['ports']:
+			self.port_stats.setdefault(dpid, {}).update(state['ports'][dpid])
+		for dpid in state['flows']:
+			table = self.flow_stats.get(dpid)
+			if table is not None:								# a leaf this engine schedules
+				for flow in state['flows'][dpid]:
+					table.restore(*flow)
+		if state['mode'] != self.mode or state['num_groups'] != self.num_groups:
+			return state['age']
+		for key, groups_path in state['assignment'].items():
+			ports = dict((port[1], port) for port in self._candidates(key) or ())
+			if any(port not in ports for port in groups_path.values()):
+				continue												# the topology changed under it
+			self.path_assignment[key] = groups_path
+			self.placement.restore(key, dict((group_id, ports[port]) for group_id, port in groups_path.items()))
+		return state['age']
+
+	def fetch(self):
+		"""(flows, ports) replies of the whole fabric"""
+		if self.collector is not None:
+			return self.collector.collect(['all'])['all']
+		return self.client.flows('all'), self.client.ports('all')
+
+	def run_once(self, now=None, replies=None):
+		"""
+		One poll cycle. replies = (flows, ports) reply bodies replaces the fetch.
+		Returns the payload pushed to the controller, None when nothing changed.
+		"""
+		metrics = self.metrics
+		cycle_start = monotonic()
+		if self.watcher is not None and self.watcher.topology is not self.topology:
+			self.set_topology(self.watcher.topology, self.leaf_names)
+		reassigned = self.pusher.reassigned
+		self._cycle_anomalies = {}
+		if now is None:
+			now = cycle_start
+		if replies is None and self.collector is None:
+			with metrics.stage('parse_flows'):						# includes the streamed fetch
+				with self.client.stream_flows('all') as flows:		# decoded while it is read
+					flows_parsed = self.parse_flows(flows, now)
+			with metrics.stage('fetch'):
+				ports = self.client.ports('all')
+		else:
+			with metrics.stage('fetch'):
+				flows, ports = replies if replies is not None else self.fetch()
+			with metrics.stage('parse_flows'):
+				flows_parsed = self.parse_flows(flows, now)
+		with metrics.stage('group'):
+			groups_active = self.group(now)
+		with metrics.stage('parse_ports'):
+			self.parse_ports(ports, now)
+		with metrics.stage('schedule'):
+			self.schedule()
+		with metrics.stage('push'):
+			payload = self.push()
+		with metrics.stage('evict'):
+			self.evict()
+		if self.snapshot is not None:
+			with metrics.stage('checkpoint'):
+				self.checkpoint()
+		metrics.end_cycle(monotonic() - cycle_start, flows_parsed, groups_active, self.pusher.reassigned - reassigned, self.uplink_loads(),
+						len(self.elephant_ports) if self.rules is not None else None, self._cycle_anomalies, self.headroom())
+		return payload
+
+	def run_forever(self, poller=None, on_cycle=None):
+		"""Poll at the poller's period; on_cycle(payload, seconds) after every cycle"""
+		if poller is None:
+			poller = PollScheduler()
+		while True:
+			poller.wait()
+			start = monotonic()
+			payload = self.run_once()
+			poller.observe(self.fabric_load())
+			if on_cycle is not None:
+				on_cycle(payload, monotonic() - start)
+
+	def state_summary(self):
+		gauges = {'flows' : 0, 'ip_tuples' : 0, 'evicted' : 0, 'memory' : 0}
+		for table in self.flow_stats.values():
+			table_gauges = table.gauges()
+			for name in gauges:
+				gauges[name] += table_gauges[name]
+		summary = "%(flows)d flows, %(ip_tuples)d ip tuples, %(evicted)d evicted, %(memory)d bytes" % gauges
+		if self.rules is not None:
+			summary += ", %d elephants (%s)" % (len(self.elephants), self.rules.summary())
+		uplinks = self.headroom()
+		if uplinks:
+			summary += ", uplink utilization max %.2f, headroom min %.0f Mbit/s" % (
+				max(load / capacity for dpid, port, load, capacity in uplinks),
+				min(max(capacity - load, 0.0) for dpid, port, load, capacity in uplinks) * 8 / 1e6)
+		return summary
+
+	def close(self):
+		if self.watcher is not None:
+			self.watcher.stop()
+		if self.rules is not None:
+			try:
+				self.rules.clear()				# elephants go back to their groups
+			except Exception:							# best effort, the controller may be gone
+				pass
+		if hasattr(self.placement, 'close'):
+			self.placement.close()
+		if self.snapshot is not None:
+			self.snapshot.close()
+
+
+def build_parser():
+	parser = argparse.ArgumentParser(description='Flow Scheduler')
+	parser.add_argument("controllerRestIP", action='store', default='localhost:8080', help='controller IP:RESTport, e.g., localhost:8080 or A.B.C.D:8080')
+	parser.add_argument("num_groups", action='store', default='2', help='number of groups, e.g., 2 or 10')
+	parser.add_argument("--topology", action='store', default=None, help='JSON file with the leaves, their uplinks and hosts, and the spines')
+	parser.add_argument("--discover", action='store_true', help='discover switches and links from the controller and follow changes, --topology then only seeds names, roles and hosts')
+	parser.add_argument("--discover-interval", action='store', type=float, default=5.0, help='seconds between topology discoveries with --discover')
+	parser.add_argument("--leaf", action='append', dest='leaves', default=None, help='schedule only this leaf (name or dpid), may be repeated; default all leaves')
+	parser.add_argument("--mode", action='store', choices=MODES, default='tuple', help='tuple: groups per ip tuple on the source leaf, switch: groups per leaf')
+	parser.add_argument("--full-push-every", action='store', type=int, default=0, help='resend the whole path assignment every N pushes, 0 only sends changes')
+	parser.add_argument("--idle-cycles", action='store', type=int, default=30, help='forget flows that moved no bytes for this many cycles, 0 keeps them forever')
+	parser.add_argument("--carry-load", action='store_true', help='let the groups placed for one ip tuple count as load for the tuples scheduled after it')
+	parser.add_argument("--solver", action='store', choices=sorted(SOLVERS), default='greedy', help='how groups are split across ports: greedy (LPT), kk (Karmarkar-Karp differencing) or lpt-ls (LPT + local search)')
+	parser.add_argument("--solver-budget", action='store', type=float, default=None, help='milliseconds per cycle the solver may spend, later tuples fall back to greedy (default unlimited)')
+	parser.add_argument("--incremental", action='store_true', help='keep the previous placement of a tuple unless its group loads moved and a new plan is clearly better')
+	parser.add_argument("--replan-threshold", action='store', type=float, default=0.1, help='relative change of a tuple\'s group loads that makes --incremental plan it again')
+	parser.add_argument("--hysteresis", action='store', type=float, default=0.05, help='relative drop of the most loaded port a new plan must reach before groups move')
+	parser.add_argument("--max-moves", action='store', type=int, default=0, help='most group moves per cycle in --incremental mode, shared by all --shards, 0 is unlimited')
+	parser.add_argument("--estimator", action='store', choices=['raw'] + sorted(ESTIMATORS), default='raw', help='smooth the measured rates: raw (single poll), ewma, window (sliding window mean) or peak (peak hold)')
+	parser.add_argument("--estimator-tau", action='store', type=float, default=3.0, help='time constant in seconds of the ewma and peak estimators')
+	parser.add_argument("--estimator-window", action='store', type=int, default=5, help='number of polls averaged by the window estimator')
+	parser.add_argument("--estimate-levels", action='store', default='group,port', help='comma separated levels the estimator applies to: flow, group, port')
+	parser.add_argument("--elephant-threshold", action='store', type=float, default=0, help='Mbit/s at which a flow is scheduled on its own with an exact-match entry instead of in its group, 0 disables')
+	parser.add_argument("--elephant-limit", action='store', type=int, default=64, help='most flows per leaf scheduled on their own, the fastest first, 0 is unlimited')
+	parser.add_argument("--rule-budget", action='store', type=int, default=0, help='most exact-match rules the scheduler keeps on a switch, 0 is unlimited')
+	parser.add_argument("--rule-eviction", action='store', choices=POLICIES, default='lru', help='which unused rule gives way when a switch is at its budget: lru (least recently used) or lfu (least often used)')
+	parser.add_argument("--rule-idle-timeout", action='store', type=int, default=30, help='seconds a rule may go unused before the switch, or the scheduler, removes it; 0 keeps rules until room is needed')
+	parser.add_argument("--rule-max-changes", action='store', type=int, default=0, help='most rules installed or deleted per cycle, 0 is unlimited')
+	parser.add_argument("--shards", action='store', type=int, default=1, help='schedule the ip tuples in this many worker processes, 1 schedules in-process')
+	parser.add_argument("--period", action='store', type=float, default=1.0, help='seconds between polls of the controller, 0 polls back to back')
+	parser.add_argument("--adaptive", action='store_true', help='shorten the poll period while link load is volatile, stretch it while quiet')
+	parser.add_argument("--min-period", action='store', type=float, default=None, help='lower bound of the adaptive period (default period/4)')
+	parser.add_argument("--max-period", action='store', type=float, default=None, help='upper bound of the adaptive period (default period*4)')
+	parser.add_argument("--concurrent", action='store_true', help='fetch the flows and ports replies in parallel instead of decoding the flows while they stream in')
+	parser.add_argument("--workers", action='store', type=int, default=2, help='number of fetch threads in --concurrent mode')
+	parser.add_argument("--metrics-port", action='store', type=int, default=0, help='serve Prometheus metrics on http://METRICS_HOST:PORT/metrics, 0 disables the endpoint')
+	parser.add_argument("--metrics-host", action='store', default='127.0.0.1', help='address the metrics endpoint listens on')
+	parser.add_argument("--link-speed", action='store', type=float, default=None, help='speed in Mbit/s of the ports the topology gives no speed; ports are then balanced by utilization, the exported metrics include it, and counter differences beyond a port\'s speed are dropped')
+	parser.add_argument("--snapshot", action='store', default=None, help='file the counter baselines and path assignment are checkpointed to every cycle and restored from at startup')
+	parser.add_argument("--snapshot-max-age", action='store', type=float, default=60.0, help='seconds after which a snapshot is too old to restore, 0 restores any')
+	return parser
+
+
+def parse_args(parser, argv=None, **defaults):
+	"""
+	parser.parse_args() under the caller's defaults. --leaf appends to its
+	default list, so the default leaves are only filled in when none is given.
+	"""
+	leaves = defaults.pop('leaves', None)
+	parser.set_defaults(**defaults)
+	args = parser.parse_args(argv)
+	if args.leaves is None and leaves is not None:
+		args.leaves = list(leaves)
+	return args
+
+
+def main(argv=None, **defaults):
+	"""Command line entry point; the flowsch*.py scripts pass their topology and leaves as defaults"""
+	parser = build_parser()
+	args = parse_args(parser, argv, **defaults)
+	if args.topology is None and not args.discover:
+		parser.error("--topology or --discover is required")
+	topology = Topology.load(args.topology) if args.topology is not None else None
+
+	link_speed = args.link_speed * 1e6 / 8 if args.link_speed else None		# bytes/sec
+	metrics = SchedulerMetrics(link_speed)
+	if args.metrics_port:
+		MetricsServer(metrics.registry, args.metrics_port, args.metrics_host).start()
+	client = ControllerClient(args.controllerRestIP, pool_size=max(args.workers, 1),			# shared keep-alive connection pool
+							observer=metrics.observe_request if args.metrics_port else None)
+	watcher = None
+	if args.discover:
+		watcher = TopologyWatcher(client, topology, args.discover_interval)
+		watcher.refresh()
+		topology = watcher.topology
+	for name in args.leaves or []:
+		if name not in topology.by_name and name not in topology.by_dpid:
+			parser.error("no leaf %r in the topology" % name)
+	placement_options = {'carry_load' : args.carry_load, 'solver' : args.solver,
+						'budget' : args.solver_budget / 1000.0 if args.solver_budget is not None else None,
+						'incremental' : args.incremental, 'threshold' : args.replan_threshold,
+						'hysteresis' : args.hysteresis, 'max_moves' : args.max_moves}
+	rule_options = {'budget' : args.rule_budget, 'policy' : args.rule_eviction, 'idle_timeout' : args.rule_idle_timeout,
+					'workers' : args.workers, 'max_changes' : args.rule_max_changes, 'full_every' : args.full_push_every}
+	engine = SchedulerEngine(client, topology, int(args.num_groups), args.leaves, args.mode, placement_options, args.shards,
+							args.estimator, args.estimator_tau, args.estimator_window, args.estimate_levels.split(','),
+							args.idle_cycles, args.full_push_every,
+							StatsCollector(client, args.workers) if args.concurrent else None, metrics, watcher,
+							args.elephant_threshold * 1e6 / 8, args.elephant_limit, rule_options, link_speed,		# threshold in bytes/sec
+							Snapshot(args.snapshot, args.snapshot_max_age) if args.snapshot else None)
+	age = engine.restore()
+	if age is not None:
+		print("--- restored %s, %s seconds old --- state: %s ---" % (args.snapshot, age, engine.state_summary()))
+	if watcher is not None:
+		watcher.start()
+
+	def on_cycle(payload, seconds):
+		if payload is not None:
+			print(payload)
+		print("--- %s seconds --- push: %s --- state: %s ---" % (seconds, engine.pusher.summary(), engine.state_summary()))
+
+	try:
+		engine.run_forever(PollScheduler(args.period, args.adaptive, args.min_period, args.max_period), on_cycle)
+	finally:
+		engine.close()
+		client.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,187 @@
+"""
+Rate estimators for flow, group and port load.
+
+A single poll's counter difference is a noisy measure of a flow's or a
+link's load; feeding it straight into scheduler() lets one odd poll reshuffle
+the fabric. An estimator turns the stream of per-poll rates of a slot into a
+smoothed estimate, in O(1) time per update:
+
+   ewma       exponentially weighted moving average with time constant `tau`
+              seconds, weighted by the time since the slot's previous sample
+              so an irregular (or adaptive) poll period does not bias it
+   window     average rate over the last `window` samples, each weighted by
+              the time it covers (running sums over a ring buffer)
+   peak       peak hold: the highest rate seen, decaying with time constant
+              `tau` once the rate drops
+
+Estimators keep array columns indexed by an integer slot, like FlowTable
+rows; KeyedEstimator maps arbitrary keys such as (dpid, port) to slots.
+
+Example:
+   port_rates = KeyedEstimator(make_estimator('ewma', tau=3.0))
+   rate = port_rates.update((dpid, port_number), per_second(tx_bytes_diff, interval), now)
+"""
+
+import math
+from array import array
+
+
+class RateEstimator(object):
+	"""Base class: per-slot estimate, time of the last sample and whether the slot has one"""
+
+	name = None
+
+	def __init__(self):
+		self.value = array('d')
+		self.last = array('d')
+		self.seen = array('B')
+
+	def _grow(self, slot):
+		while len(self.value) <= slot:
+			self.value.append(0.0)
+			self.last.append(0.0)
+			self.seen.append(0)
+
+	def reset(self, slot):
+		"""Forget a slot's history, its next sample starts the estimate over"""
+		if slot < len(self.value):
+			self.value[slot] = 0.0
+			self.seen[slot] = 0
+
+	def estimate(self, slot):
+		return self.value[slot] if slot < len(self.value) else 0.0
+
+	def update(self, slot, sample, now):
+		"""Feed the rate measured up to `now` and return the new estimate"""
+		self._grow(slot)
+		if not self.seen[slot]:
+			self._first(slot, sample)
+			self.seen[slot] = 1
+		else:
+			self._next(slot, sample, max(now - self.last[slot], 0.0))
+		self.last[slot] = now
+		return self.value[slot]
+
+	def _first(self, slot, sample):
+		self.value[slot] = sample
+
+
+class EwmaEstimator(RateEstimator):
+	"""value += (1 - exp(-dt / tau)) * (sample - value)"""
+
+	name = 'ewma'
+
+	def __init__(self, tau=3.0):
+		RateEstimator.__init__(self)
+		self.tau = tau
+
+	def _next(self, slot, sample, dt):
+		alpha = 1.0 - math.exp(-dt / self.tau) if self.tau > 0 else 1.0
+		self.value[slot] += alpha * (sample - self.value[slot])
+
+
+class WindowEstimator(RateEstimator):
+	"""Time weighted mean of the last `window` samples"""
+
+	name = 'window'
+
+	def __init__(self, window=5):
+		RateEstimator.__init__(self)
+		self.window = window
+		self.weighted = array('d')					# slot * window + i -> sample * dt
+		self.spans = array('d')						# slot * window + i -> dt
+		self.position = array('L')
+		self.sum_weighted = array('d')
+		self.sum_spans = array('d')
+
+	def _grow(self, slot):
+		while len(self.value) <= slot:
+			RateEstimator._grow(self, len(self.value))
+			self.weighted.extend([0.0] * self.window)
+			self.spans.extend([0.0] * self.window)
+			self.position.append(0)
+			self.sum_weighted.append(0.0)
+			self.sum_spans.append(0.0)
+
+	def _first(self, slot, sample):
+		base = slot * self.window
+		for i in range(self.window):
+			self.weighted[base + i] = 0.0
+			self.spans[base + i] = 0.0
+		self.position[slot] = 0
+		self.sum_weighted[slot] = 0.0
+		self.sum_spans[slot] = 0.0
+		self.value[slot] = sample
+
+	def _next(self, slot, sample, dt):
+		i = slot * self.window + self.position[slot]
+		self.position[slot] = (self.position[slot] + 1) % self.window
+		self.sum_weighted[slot] += sample * dt - self.weighted[i]
+		self.sum_spans[slot] += dt - self.spans[i]
+		self.weighted[i] = sample * dt
+		self.spans[i] = dt
+		if self.sum_spans[slot] > 0:
+			self.value[slot] = self.sum_weighted[slot] / self.sum_spans[slot]
+		else:
+			self.value[slot] = sample
+
+
+class PeakHoldEstimator(RateEstimator):
+	"""value = max(sample, value * exp(-dt / tau))"""
+
+	name = 'peak'
+
+	def __init__(self, tau=3.0):
+		RateEstimator.__init__(self)
+		self.tau = tau
+
+	def _next(self, slot, sample, dt):
+		decay = math.exp(-dt / self.tau) if self.tau > 0 else 0.0
+		self.value[slot] = max(sample, self.value[slot] * decay)
+
+
+ESTIMATORS = {
+	EwmaEstimator.name : EwmaEstimator,
+	WindowEstimator.name : WindowEstimator,
+	PeakHoldEstimator.name : PeakHoldEstimator,
+	}
+
+
+def make_estimator(name, tau=3.0, window=5):
+	"""Build an estimator by name; 'raw' (no smoothing) returns None"""
+	if name == 'raw':
+		return None
+	if name not in ESTIMATORS:
+		raise ValueError("unknown estimator %r, expected raw or one of %s" % (name, ', '.join(sorted(ESTIMATORS))))
+	if name == WindowEstimator.name:
+		return WindowEstimator(window)
+	return ESTIMATORS[name](tau)
+
+
+class KeyedEstimator(object):
+	"""An estimator addressed by hashable keys instead of slots"""
+
+	def __init__(self, estimator):
+		self.estimator = estimator
+		self.slots = {}
+		self.free = []
+
+	def __len__(self):
+		return len(self.slots)
+
+	def update(self, key, sample, now):
+		slot = self.slots.get(key)
+		if slot is None:
+			slot = self.free.pop() if self.free else len(self.slots)
+			self.slots[key] = slot
+		return self.estimator.update(slot, sample, now)
+
+	def estimate(self, key):
+		slot = self.slots.get(key)
+		return self.estimator.estimate(slot) if slot is not None else 0.0
+
+	def forget(self, key):
+		slot = self.slots.pop(key, None)
+		if slot is not None:
+			self.estimator.reset(slot)
+			self.free.append(slot)
@@ -0,0 +1,290 @@
+"""
+Compact, array-backed flow statistics table.
+
+Instead of one dict of counters per flow keyed by a 4-tuple of strings,
+FlowTable keeps one array column per counter and maps an interned integer
+flow key to a row of those columns. (ipv4_src, ipv4_dst) pairs are interned
+once, with their integer addresses, and a flow key packs the pair id with the
+two TCP ports. Updates overwrite the row in place, so a steady poll allocates
+nothing per flow.
+
+Columns (one entry per row):
+   pair                      interned (ipv4_src, ipv4_dst) id, see pairs / src_ip / dst_ip
+   tcp_src, tcp_dst          TCP ports
+   pkt_count, byte_count     last counters read from the switch
+   pkt_diff, byte_diff       difference to the previous poll
+   byte_rate                 byte_diff in bytes/sec, or its estimate when the
+                             table has a rate estimator (flowscheduler.estimators)
+   time                      poll time of the last update
+   live                      1 for a row holding a flow, 0 for a free row
+   last_seen, last_active    cycle the flow was last polled / last moved bytes
+
+A counter that went down or jumped beyond what max_rate allows over the
+interval goes through flowscheduler.counters: a wrap is repaired, a reset or
+jump (an entry reinstalled, a switch reconnected) keeps the flow's previous
+rate for the cycle and only re-anchors the counters; anomalies counts them by
+kind until the owner clears it.
+
+restore() seeds a flow from a snapshot of a previous process (see
+flowscheduler.snapshot): its counters become the baseline of the next poll.
+
+Flows that moved no bytes (or were not in any dump) for max_idle cycles are
+evicted by end_cycle(), and (ipv4_src, ipv4_dst) pairs left without flows are
+released with them, so the table tracks live traffic rather than every flow
+ever seen. Rows touched in a cycle are queued on a wheel, which keeps the cost
+of aging proportional to the active flows.
+
+Example:
+   flow_stats = FlowTable()
+   row = flow_stats.update('10.10.1.1', '10.10.2.1', '5001', '80', 10, 15000, now)
+   flow_stats.byte_rate[row]
+   dead_ip_tuples = flow_stats.end_cycle(max_idle=30)
+"""
+
+import sys
+from array import array
+from collections import deque
+
+from flowscheduler.counters import LIMIT_SLACK, WRAP64, counter_delta
+
+
+def _typecode(preferred, fallback):
+	try:
+		array(preferred)
+		return preferred
+	except ValueError:								# no 'q'/'Q' on python 2
+		return fallback
+
+COUNTER = _typecode('Q', 'L')
+SIGNED = _typecode('q', 'l')
+
+
+def ip_to_int(ip):
+	o = [int(x) for x in ip.split('.')]
+	if len(o) != 4 or min(o) < 0 or max(o) > 255:
+		raise ValueError("not a dotted quad: %r" % (ip,))
+	return (16777216 * o[0]) + (65536 * o[1]) + (256 * o[2]) + o[3]
+
+
+def int_to_ip(value):
+	return '%d.%d.%d.%d' % (value >> 24 & 255, value >> 16 & 255, value >> 8 & 255, value & 255)
+
+
+class FlowTable(object):
+	"""Column store of per-flow counters, see the module docstring"""
+
+	def __init__(self, estimator=None, max_rate=None):
+		self.estimator = estimator					# smooths byte_rate per row, None keeps the raw rate
+		self.max_rate = max_rate					# bytes/sec no flow can exceed, None skips the jump check
+		self.anomalies = {'wrap' : 0, 'reset' : 0, 'jump' : 0}
+		self.rows = {}								# flow key -> row
+		self.keys = []								# row -> flow key, None for a free row
+		self.free = []
+		self.pair_ids = {}							# (ipv4_src, ipv4_dst) -> pair id
+		self.pairs = []								# pair id -> (ipv4_src, ipv4_dst), None once released
+		self.pair_flows = []						# pair id -> number of live flows
+		self.free_pairs = []
+		self.src_ip = array('L')					# pair id -> integer addresses
+		self.dst_ip = array('L')
+		self.pair = array('L')
+		self.tcp_src = array('H')
+		self.tcp_dst = array('H')
+		self.pkt_count = array(COUNTER)
+		self.byte_count = array(COUNTER)
+		self.pkt_diff = array(SIGNED)
+		self.byte_diff = array(SIGNED)
+		self.byte_rate = array('d')
+		self.time = array('d')
+		self.live = array('B')
+		self.last_seen = array('L')
+		self.last_active = array('L')
+		self.cycle = 1								# 0 in last_seen/last_active means never
+		self.evicted = 0
+		self._active = []							# rows that moved bytes this cycle
+		self._last_active = []
+		self._wheel = deque()						# (cycle, rows active in that cycle)
+
+	def __len__(self):
+		return len(self.rows)
+
+	def intern_pair(self, ipv4_src, ipv4_dst):
+		pair_id = self.pair_ids.get((ipv4_src, ipv4_dst))
+		if pair_id is None:
+			if self.free_pairs:
+				pair_id = self.free_pairs.pop()
+				self.pairs[pair_id] = (ipv4_src, ipv4_dst)
+				self.src_ip[pair_id] = ip_to_int(ipv4_src)
+				self.dst_ip[pair_id] = ip_to_int(ipv4_dst)
+			else:
+				pair_id = len(self.pairs)
+				self.pairs.append((ipv4_src, ipv4_dst))
+				self.pair_flows.append(0)
+				self.src_ip.append(ip_to_int(ipv4_src))
+				self.dst_ip.append(ip_to_int(ipv4_dst))
+			self.pair_ids[(ipv4_src, ipv4_dst)] = pair_id
+		return pair_id
+
+	def _new_row(self, key, pair_id, tcp_src, tcp_dst):
+		if self.free:
+			row = self.free.pop()
+			self.keys[row] = key
+			self.pair[row] = pair_id
+			self.tcp_src[row] = tcp_src
+			self.tcp_dst[row] = tcp_dst
+			self.live[row] = 1
+		else:
+			row = len(self.keys)
+			self.keys.append(key)
+			self.pair.append(pair_id)
+			self.tcp_src.append(tcp_src)
+			self.tcp_dst.append(tcp_dst)
+			for column in (self.pkt_count, self.byte_count, self.pkt_diff, self.byte_diff):
+				column.append(0)
+			self.byte_rate.append(0.0)
+			self.time.append(0.0)
+			self.live.append(1)
+			self.last_seen.append(0)
+			self.last_active.append(0)
+		self.rows[key] = row
+		self.pair_flows[pair_id] += 1
+		if self.estimator is not None:
+			self.estimator.reset(row)
+		return row
+
+	def _mark_active(self, row):
+		if self.last_active[row] != self.cycle:
+			self.last_active[row] = self.cycle
+			self._active.append(row)
+
+	def update(self, ipv4_src, ipv4_dst, tcp_src, tcp_dst, packet_count, byte_count, now):
+		"""Record one poll of a flow's counters and return its row"""
+		pair_id = self.intern_pair(ipv4_src, ipv4_dst)
+		tcp_src = int(tcp_src)
+		tcp_dst = int(tcp_dst)
+		key = (pair_id << 32) | (tcp_src << 16) | tcp_dst
+		row = self.rows.get(key)
+		if row is None:								# first poll of this flow: no diff yet
+			row = self._new_row(key, pair_id, tcp_src, tcp_dst)
+			self.pkt_diff[row] = 0
+			self.byte_diff[row] = 0
+			self.byte_rate[row] = 0.0
+			self._mark_active(row)					# idle time starts now
+		else:
+			interval = now - self.time[row]
+			pkt_diff = packet_count - self.pkt_count[row]
+			byte_diff = byte_count - self.byte_count[row]
+			if pkt_diff < 0 or byte_diff < 0 or (self.max_rate and byte_diff > self.max_rate * interval * LIMIT_SLACK):
+				pkt_diff, byte_diff = self._repair(row, packet_count, byte_count, interval)
+			if byte_diff is None:					# reset or jump: keep the rate, re-anchor the counters
+				self.pkt_diff[row] = 0
+				self.byte_diff[row] = 0
+				self._mark_active(row)
+			else:
+				self.pkt_diff[row] = pkt_diff
+				self.byte_diff[row] = byte_diff
+				self.byte_rate[row] = byte_diff / interval if interval > 0 else 0.0
+				if self.estimator is not None:
+					self.byte_rate[row] = self.estimator.update(row, self.byte_rate[row], now)
+				if byte_diff != 0:
+					self._mark_active(row)
+		self.pkt_count[row] = packet_count
+		self.byte_count[row] = byte_count
+		self.time[row] = now
+		self.last_seen[row] = self.cycle
+		return row
+
+	def restore(self, ipv4_src, ipv4_dst, tcp_src, tcp_dst, packet_count, byte_count, byte_rate, now):
+		"""Take a flow's counters and rate from a snapshot, so its next update() yields a diff; returns its row"""
+		row = self.update(ipv4_src, ipv4_dst, tcp_src, tcp_dst, packet_count, byte_count, now)
+		self.byte_rate[row] = byte_rate
+		return row
+
+	def _repair(self, row, packet_count, byte_count, interval):
+		# (pkt_diff, byte_diff) of a suspicious poll, both None when it cannot be trusted
+		limit = self.max_rate * interval * LIMIT_SLACK if self.max_rate and interval > 0 else None
+		pkt_diff, pkt_kind = counter_delta(packet_count, self.pkt_count[row], widths=(WRAP64,))		# OpenFlow 1.3 flow counters are 64 bits
+		byte_diff, byte_kind = counter_delta(byte_count, self.byte_count[row], limit, (WRAP64,))
+		kind = byte_kind if byte_kind != 'ok' else pkt_kind
+		if kind != 'ok':
+			self.anomalies[kind] += 1
+		if pkt_diff is None or byte_diff is None:
+			return None, None
+		return pkt_diff, byte_diff
+
+	def evict(self, row):
+		"""Free a row; returns the (ipv4_src, ipv4_dst) pair if it has no flows left"""
+		key = self.keys[row]
+		del self.rows[key]
+		self.keys[row] = None
+		self.live[row] = 0
+		self.byte_diff[row] = 0
+		self.byte_rate[row] = 0.0
+		self.free.append(row)
+		self.evicted += 1
+		pair_id = self.pair[row]
+		self.pair_flows[pair_id] -= 1
+		if self.pair_flows[pair_id] > 0:
+			return None
+		ip_tuple = self.pairs[pair_id]
+		del self.pair_ids[ip_tuple]
+		self.pairs[pair_id] = None
+		self.free_pairs.append(pair_id)
+		return ip_tuple
+
+	def end_cycle(self, max_idle=0):
+		"""
+		Close a poll cycle: zero the rate of flows that were active last cycle but
+		missing from this cycle's dumps, and evict the flows that have been idle
+		for max_idle cycles (0 keeps everything).
+		Returns the ip tuples that no longer have any flow.
+		"""
+		for row in self._last_active:
+			if self.live[row] and self.last_seen[row] != self.cycle:
+				self.pkt_diff[row] = 0
+				self.byte_diff[row] = 0
+				self.byte_rate[row] = 0.0
+				if self.estimator is not None:
+					self.estimator.reset(row)
+		dead = []
+		if max_idle > 0:
+			self._wheel.append((self.cycle, self._active))
+			while self._wheel and self._wheel[0][0] <= self.cycle - max_idle:
+				cycle, rows = self._wheel.popleft()
+				for row in rows:
+					# skip rows that were active again later, or freed and reused since
+					if self.live[row] and self.last_active[row] == cycle:
+						ip_tuple = self.evict(row)
+						if ip_tuple is not None:
+							dead.append(ip_tuple)
+		self._last_active = self._active
+		self._active = []
+		self.cycle += 1
+		return dead
+
+	def gauges(self):
+		"""Entry counts and an estimate of the memory held by the table, in bytes"""
+		columns = (self.src_ip, self.dst_ip, self.pair, self.tcp_src, self.tcp_dst, self.pkt_count,
+					self.byte_count, self.pkt_diff, self.byte_diff, self.byte_rate, self.time,
+					self.live, self.last_seen, self.last_active)
+		memory = sum(column.buffer_info()[1] * column.itemsize for column in columns)
+		memory += sys.getsizeof(self.rows) + sys.getsizeof(self.keys) + sys.getsizeof(self.pair_ids) + sys.getsizeof(self.pairs)
+		memory += sum(sys.getsizeof(rows) for cycle, rows in self._wheel)
+		return {'flows' : len(self.rows), 'free_rows' : len(self.free),
+				'ip_tuples' : len(self.pair_ids), 'evicted' : self.evicted, 'memory' : memory}
+
+	def live_rows(self):
+		return list(self.rows.values())
+
+	def ip_tuple(self, row):
+		return self.pairs[self.pair[row]]
+
+	def flow(self, row):
+		"""(ipv4_src, ipv4_dst, tcp_src, tcp_dst) of a row"""
+		ipv4_src, ipv4_dst = self.pairs[self.pair[row]]
+		return (ipv4_src, ipv4_dst, self.tcp_src[row], self.tcp_dst[row])
+
+	def stat(self, row):
+		"""The counters of a row as the dict the scripts used to keep per flow"""
+		return {'pkt_count' : self.pkt_count[row], 'pkt_diff' : self.pkt_diff[row],
+				'byte_count' : self.byte_count[row], 'byte_diff' : self.byte_diff[row],
+				'byte_rate' : self.byte_rate[row], 'time' : self.time[row]}
@@ -0,0 +1,67 @@
+"""
+Heavy hitter (elephant flow) detection over a FlowTable.
+
+Hash groups put every flow of an ip tuple with the same (tcp_src ^ tcp_dst) %
+num_groups on one port, so a single elephant drags the mice of its group
+along wherever the group goes. HeavyHitters picks out the flows whose byte
+rate reaches `threshold` so the scheduler can place them on their own (as
+exact-match static entries, see flowscheduler.staticflows) and leave the rest
+to the groups.
+
+The FlowTable already holds the exact rate of every live flow, so instead of
+a sketch the tracker makes one pass over the byte_rate column per cycle, O(1)
+per flow (a single vector compare with NumPy). A flow stays an elephant until
+its rate falls below threshold * release, so flows hovering around the
+threshold do not flap between their group and their own entry, and at most
+`limit` elephants are kept per table, the fastest first, which bounds the
+switch rules they take.
+
+Example:
+   heavy_hitters = HeavyHitters(threshold=10e6, limit=64)
+   for row in heavy_hitters.update(flow_stats):
+      flow_stats.flow(row), flow_stats.byte_rate[row]
+"""
+
+import heapq
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+class HeavyHitters(object):
+	"""Elephant flows of one FlowTable, see the module docstring"""
+
+	def __init__(self, threshold, limit=64, release=0.5):
+		self.threshold = threshold					# bytes/sec a flow needs to become an elephant
+		self.limit = limit							# most elephants kept, 0 is unlimited
+		self.release = release						# an elephant stays one down to threshold * release
+		self.keys = set()							# flow keys of the current elephants
+
+	def __len__(self):
+		return len(self.keys)
+
+	def _candidates(self, table, floor):
+		# rows whose rate reaches floor; free rows have a rate of 0
+		count = len(table.keys)
+		if numpy is not None and count:
+			rates = numpy.frombuffer(table.byte_rate, dtype=numpy.float64, count=count)
+			return [int(row) for row in numpy.flatnonzero(rates >= floor)]
+		byte_rate = table.byte_rate
+		return [row for row in table.rows.values() if byte_rate[row] >= floor]
+
+	def update(self, table):
+		"""Rows of the table's elephants this cycle, fastest first"""
+		byte_rate = table.byte_rate
+		keys = table.keys
+		threshold = self.threshold
+		current = self.keys
+		rows = [row for row in self._candidates(table, threshold * self.release)
+				if byte_rate[row] >= threshold or keys[row] in current]
+		if self.limit and len(rows) > self.limit:
+			rows = heapq.nlargest(self.limit, rows, key=lambda row: byte_rate[row])
+		else:
+			rows.sort(key=lambda row: byte_rate[row], reverse=True)
+		self.keys = set(keys[row] for row in rows)
+		return rows
@@ -0,0 +1,223 @@
+"""
+Incremental scheduling with hysteresis and a per-cycle migration budget.
+
+Planning every ip tuple from scratch each cycle lets small fluctuations of the
+group byte rates flip groups between uplinks, reordering TCP segments and
+churning the controller's rules. IncrementalScheduler wraps a HeapScheduler
+and keeps each tuple's previous group->port map unless
+
+   1. the tuple's group loads moved by more than `threshold` (relative L1
+      change) from the loads it was last evaluated at, and
+   2. the new plan lowers the tuple's most loaded port by more than
+      `hysteresis` (relative) compared to keeping the old placement.
+
+An evaluated tuple takes its current loads as the reference whether the new
+plan is adopted or the old placement kept, so steady traffic is not planned
+again every cycle. A tuple first seen without traffic has no reference yet
+and is evaluated once its groups carry bytes.
+
+"Most loaded" is the highest utilization when the placement has port
+capacities, see flowscheduler.placement.
+
+A new plan is relabelled to overlap the old placement as much as possible,
+so equivalent bins do not trade ports. At most `max_moves` groups change port
+per cycle (0 = no limit); when a plan needs more, the budget goes to single
+moves off the most loaded port, each lowering it, and the tuple is planned
+again next cycle. Groups seen for the first time are placed on the least
+loaded port and do not count as moves.
+
+Example:
+   placement = IncrementalScheduler(HeapScheduler(), threshold=0.1, hysteresis=0.05, max_moves=16)
+   placement.begin_cycle(get_port_usages())
+   for ip_tuple in flow_groups:
+      path_assignment[ip_tuple] = placement.place(flow_groups[ip_tuple], iptuple_port_dict[ip_tuple], ip_tuple)
+"""
+
+
+def relative_change(groups, planned):
+	"""Sum of |new - old| over all groups divided by the old total"""
+	change = 0.0
+	for group_id in groups:
+		change += abs(groups[group_id] - planned.get(group_id, 0))
+	for group_id in planned:
+		if group_id not in groups:
+			change += abs(planned[group_id])
+	total = sum(planned.values())
+	if total <= 0:
+		return 1.0 if change > 0 else 0.0
+	return change / float(total)
+
+
+class IncrementalScheduler(object):
+	"""Keeps placements across cycles, see the module docstring"""
+
+	def __init__(self, placement, threshold=0.1, hysteresis=0.05, max_moves=0):
+		self.placement = placement
+		self.threshold = threshold
+		self.hysteresis = hysteresis
+		self.max_moves = max_moves
+		self.assigned = {}							# key -> {group_id: port} in force
+		self.planned = {}							# key -> group loads when it was last evaluated, {} for none
+		self.moves = 0
+		self.replans = 0
+		self.kept = 0
+		self.deferred = 0
+		self._moves_left = None
+		self._speed = {}							# port -> capacity of the tuple being placed
+
+	def begin_cycle(self, baseline, capacity=None, moves=None):
+		"""moves, when given, is this cycle's budget instead of max_moves (0 allows none)"""
+		self.placement.begin_cycle(baseline, capacity)
+		if moves is not None:
+			self._moves_left = moves
+		else:
+			self._moves_left = self.max_moves if self.max_moves > 0 else None
+
+	def forget(self, key):
+		"""Drop a tuple that left the schedule"""
+		self.assigned.pop(key, None)
+		self.planned.pop(key, None)
+		self.placement.forget(key)
+
+	def restore(self, key, groups_path):
+		"""
+		Take the placement a previous process left for `key` (see
+		flowscheduler.snapshot) as the one in force; with no loads to compare
+		against, its next place() weighs it against a new plan.
+		"""
+		self.assigned[key] = dict(groups_path)
+		self.planned[key] = {}
+
+	def _evaluated(self, key, groups):
+		# the loads the next relative_change() is measured from, none while the tuple carries no bytes
+		self.planned[key] = dict(groups) if any(groups.values()) else {}
+
+	def _peak(self, loads, groups, groups_path):
+		# highest utilization, load over the port's capacity (1.0 without capacities)
+		loads = dict(loads)
+		for group_id in groups_path:
+			loads[groups_path[group_id]] += groups[group_id]
+		speed = self._speed
+		return max(loads[port] / speed[port] for port in loads)
+
+	def _keep(self, loads, groups, previous):
+		# previous placement of the groups still present, new groups onto the port least utilized with them
+		speed = self._speed
+		groups_path = {}
+		loads = dict(loads)
+		new_groups = []
+		for group_id in groups:
+			port = previous.get(group_id)
+			if port in loads:
+				groups_path[group_id] = port
+				loads[port] += groups[group_id]
+			else:
+				new_groups.append(group_id)
+		new_groups.sort(key=lambda group_id: groups[group_id], reverse=True)
+		for group_id in new_groups:
+			port = min(loads, key=lambda port: (loads[port] + groups[group_id]) / speed[port])
+			groups_path[group_id] = port
+			loads[port] += groups[group_id]
+		return groups_path
+
+	def _relabel(self, loads, groups, kept, candidate):
+		# give each bin of the candidate the port it shares the most bytes with in kept
+		overlap = {}
+		for group_id in candidate:
+			pair = (candidate[group_id], kept[group_id])
+			overlap[pair] = overlap.get(pair, 0) + groups[group_id]
+		label = {}
+		used = set()
+		for (port, old_port), byte_count in sorted(overlap.items(), key=lambda x: x[1], reverse=True):
+			if port not in label and old_port not in used:
+				label[port] = old_port
+				used.add(old_port)
+		spare = [port for port in loads if port not in used]
+		for port in set(candidate.values()):
+			if port not in label:
+				label[port] = spare.pop(0)
+		relabelled = dict((group_id, label[candidate[group_id]]) for group_id in candidate)
+		if self._peak(loads, groups, relabelled) <= self._peak(loads, groups, candidate):
+			return relabelled
+		return candidate
+
+	def _improve(self, loads, groups, groups_path, budget):
+		# spend the budget on moves off the most utilized port that lower it
+		speed = self._speed
+		port_load = dict(loads)
+		for group_id in groups_path:
+			port_load[groups_path[group_id]] += groups[group_id]
+		moves = 0
+		while moves < budget:
+			top = max(port_load, key=lambda port: port_load[port] / speed[port])
+			best = None
+			for group_id in groups_path:
+				if groups_path[group_id] != top:
+					continue
+				for port in port_load:
+					if port == top:
+						continue
+					peak = max((port_load[top] - groups[group_id]) / speed[top], (port_load[port] + groups[group_id]) / speed[port])
+					if peak < port_load[top] / speed[top] and (best is None or peak < best[0]):
+						best = (peak, group_id, port)
+			if best is None:
+				break
+			peak, group_id, port = best
+			groups_path[group_id] = port
+			port_load[top] -= groups[group_id]
+			port_load[port] += groups[group_id]
+			moves += 1
+		return moves
+
+	def _migrate(self, loads, groups, kept, candidate):
+		candidate = self._relabel(loads, groups, kept, candidate)
+		moves = [group_id for group_id in candidate if candidate[group_id] != kept[group_id]]
+		if self._moves_left is None or len(moves) <= self._moves_left:
+			groups_path = candidate
+			complete = True
+		else:
+			groups_path = dict(kept)
+			moves = range(self._improve(loads, groups, groups_path, self._moves_left))
+			complete = False
+		self.moves += len(moves)
+		if self._moves_left is not None:
+			self._moves_left -= len(moves)
+		return groups_path, complete
+
+	def place(self, groups, ports, key=None):
+		"""Place the groups of tuple `key`, keeping its previous placement where possible"""
+		previous = self.assigned.get(key) if key is not None else None
+		if previous is None or not ports:
+			groups_path = self.placement.place(groups, ports)
+			if key is not None:
+				self.assigned[key] = groups_path
+				self._evaluated(key, groups)
+			return dict(groups_path)
+		loads = self.placement.port_loads(ports)
+		self._speed = self.placement.port_capacities(ports)
+		groups_path = self._keep(loads, groups, previous)
+		if relative_change(groups, self.planned[key]) > self.threshold:
+			candidate = self.placement.plan(groups, ports)
+			if self._peak(loads, groups, candidate) < self._peak(loads, groups, groups_path) * (1 - self.hysteresis):
+				groups_path, complete = self._migrate(loads, groups, groups_path, candidate)
+				if complete:
+					self.replans += 1
+					self._evaluated(key, groups)
+				else:
+					self.deferred += 1				# planned stays stale, so the tuple is planned again
+			else:
+				self.kept += 1
+				self._evaluated(key, groups)
+		self.placement.commit(groups, ports, groups_path)
+		self.assigned[key] = groups_path
+		return dict(groups_path)
+
+	def place_all(self, tuples):
+		"""place() every (key, groups, ports) of `tuples`; returns {key: {group_id: port}}"""
+		path_assignment = {}
+		for key, groups, ports in tuples:
+			path_assignment[key] = self.place(groups, ports, key)
+		return path_assignment
+
+	def summary(self):
+		return "%d moves, %d replans, %d kept, %d deferred" % (self.moves, self.replans, self.kept, self.deferred)
@@ -0,0 +1,286 @@
+"""
+Prometheus metrics for the running scheduler.
+
+A MetricsRegistry holds counters, gauges and histograms and renders them in
+the Prometheus text exposition format; MetricsServer serves that on
+http://host:port/metrics from a daemon thread. SchedulerMetrics defines the
+scheduler's own metrics on top:
+
+   flowsch_cycle_seconds                       histogram, one observation per poll cycle
+   flowsch_stage_seconds{stage}                histogram, time per stage summed over a cycle
+   flowsch_rest_requests_total{method,endpoint,status}
+   flowsch_rest_seconds{method,endpoint}       histogram, per controller call
+   flowsch_rest_received_bytes_total{method,endpoint}
+   flowsch_rest_sent_bytes_total{method,endpoint}
+   flowsch_flows_parsed                        flow entries parsed in the last cycle
+   flowsch_groups_active                       groups carrying traffic in the last cycle
+   flowsch_reassignments                       groups moved to another port in the last cycle
+   flowsch_reassignments_total
+   flowsch_elephants                           flows scheduled on their own in the last cycle
+   flowsch_counter_anomalies_total{level,kind} counter wraps, resets, jumps and switch reconnects
+   flowsch_uplink_bytes_per_second{stat}       max / mean uplink tx rate (get_port_usages)
+   flowsch_uplink_utilization{stat}            max / mean of tx rate over each uplink's capacity
+                                               (its port speed, or the link speed)
+   flowsch_port_utilization{switch,port}       tx rate over capacity of every uplink of known capacity
+   flowsch_port_headroom_bytes_per_second{switch,port}
+                                               capacity left on it
+
+Recording costs a monotonic() read per stage and a few dict updates per
+cycle and per REST call; nothing is formatted until a scrape.
+
+Example:
+   metrics = SchedulerMetrics(link_speed=10e9 / 8)
+   MetricsServer(metrics.registry, 9108).start()
+   with metrics.stage('parse_flows'):
+      ...
+   metrics.end_cycle(seconds, flows_parsed, groups_active, reassignments, uplink_loads)
+"""
+
+import bisect
+import contextlib
+import re
+import threading
+
+try:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+except ImportError:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+
+from flowscheduler.poller import monotonic
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_DPID = re.compile(r'/([0-9a-fA-F]{2}(:[0-9a-fA-F]{2}){7})/')
+
+
+def endpoint_label(path):
+	"""A REST path with the dpid taken out, so every switch shares one label"""
+	return _DPID.sub('/{dpid}/', path.split('?', 1)[0])
+
+
+def _format_value(value):
+	if value == float('inf'):
+		return '+Inf'
+	if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+		return str(int(value))
+	return repr(value)
+
+
+def _format_labels(names, values, extra=None):
+	pairs = list(zip(names, values))
+	if extra is not None:
+		pairs.append(extra)
+	if not pairs:
+		return ''
+	return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs) + '}'
+
+
+class _Metric(object):
+	kind = None
+
+	def __init__(self, name, help, labels=()):
+		self.name = name
+		self.help = help
+		self.labels = tuple(labels)
+		self.values = {}							# label values tuple -> value
+
+	def render(self):
+		lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.kind)]
+		for key in sorted(self.values):
+			lines.append('%s%s %s' % (self.name, _format_labels(self.labels, key), _format_value(self.values[key])))
+		return lines
+
+
+class Counter(_Metric):
+	kind = 'counter'
+
+	def inc(self, amount=1, *labels):
+		self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+	kind = 'gauge'
+
+	def set(self, value, *labels):
+		self.values[labels] = value
+
+
+class Histogram(_Metric):
+	kind = 'histogram'
+
+	def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+		_Metric.__init__(self, name, help, labels)
+		self.buckets = tuple(buckets)
+
+	def observe(self, value, *labels):
+		state = self.values.get(labels)
+		if state is None:
+			state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+		state[0][bisect.bisect_left(self.buckets, value)] += 1
+		state[1] += value
+		state[2] += 1
+
+	def render(self):
+		lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.kind)]
+		for key in sorted(self.values):
+			counts, total, count = self.values[key]
+			cumulative = 0
+			for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+				cumulative += bucket_count
+				lines.append('%s_bucket%s %d' % (self.name, _format_labels(self.labels, key, ('le', _format_value(bound))), cumulative))
+			lines.append('%s_sum%s %s' % (self.name, _format_labels(self.labels, key), repr(total)))
+			lines.append('%s_count%s %d' % (self.name, _format_labels(self.labels, key), count))
+		return lines
+
+
+class MetricsRegistry(object):
+	"""Named metrics plus callbacks that refresh gauges right before a scrape"""
+
+	def __init__(self):
+		self.metrics = []
+		self.callbacks = []
+		self.lock = threading.Lock()
+
+	def _add(self, metric):
+		self.metrics.append(metric)
+		return metric
+
+	def counter(self, name, help, labels=()):
+		return self._add(Counter(name, help, labels))
+
+	def gauge(self, name, help, labels=()):
+		return self._add(Gauge(name, help, labels))
+
+	def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+		return self._add(Histogram(name, help, labels, buckets))
+
+	def on_scrape(self, callback):
+		self.callbacks.append(callback)
+
+	def render(self):
+		with self.lock:
+			for callback in self.callbacks:
+				callback()
+			lines = []
+			for metric in self.metrics:
+				lines.extend(metric.render())
+		return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+	def log_message(self, format, *args):
+		pass
+
+	def do_GET(self):
+		if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+			self.send_error(404)
+			return
+		data = self.server.registry.render().encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', CONTENT_TYPE)
+		self.send_header('Content-Length', str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+	"""Serves a registry on /metrics from a daemon thread"""
+
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, registry, port, host='127.0.0.1'):
+		HTTPServer.__init__(self, (host, port), _MetricsHandler)
+		self.registry = registry
+
+	def start(self):
+		thread = threading.Thread(target=self.serve_forever)
+		thread.daemon = True
+		thread.start()
+		return self
+
+
+class SchedulerMetrics(object):
+	"""The scheduler's metrics, see the module docstring"""
+
+	def __init__(self, link_speed=None, registry=None):
+		self.registry = registry if registry is not None else MetricsRegistry()
+		self.link_speed = link_speed					# bytes/sec of an uplink, None skips utilization
+		registry = self.registry
+		self.cycle_seconds = registry.histogram('flowsch_cycle_seconds', 'Duration of a poll cycle.')
+		self.stage_seconds = registry.histogram('flowsch_stage_seconds', 'Time spent in a stage of a poll cycle.', ('stage',))
+		self.rest_requests = registry.counter('flowsch_rest_requests_total', 'Controller REST calls.', ('method', 'endpoint', 'status'))
+		self.rest_seconds = registry.histogram('flowsch_rest_seconds', 'Latency of a controller REST call.', ('method', 'endpoint'))
+		self.rest_received = registry.counter('flowsch_rest_received_bytes_total', 'Bytes received from the controller.', ('method', 'endpoint'))
+		self.rest_sent = registry.counter('flowsch_rest_sent_bytes_total', 'Bytes sent to the controller.', ('method', 'endpoint'))
+		self.flows_parsed = registry.gauge('flowsch_flows_parsed', 'Flow entries parsed in the last cycle.')
+		self.groups_active = registry.gauge('flowsch_groups_active', 'Groups carrying traffic in the last cycle.')
+		self.reassignments = registry.gauge('flowsch_reassignments', 'Groups moved to another port in the last cycle.')
+		self.reassignments_total = registry.counter('flowsch_reassignments_total', 'Groups moved to another port.')
+		self.elephants = registry.gauge('flowsch_elephants', 'Flows scheduled on their own in the last cycle.')
+		self.counter_anomalies = registry.counter('flowsch_counter_anomalies_total', 'Counter wraps, resets, jumps and switch reconnects.', ('level', 'kind'))
+		self.uplink_rate = registry.gauge('flowsch_uplink_bytes_per_second', 'Uplink transmit rate across uplinks.', ('stat',))
+		self.uplink_utilization = registry.gauge('flowsch_uplink_utilization', 'Uplink transmit rate over capacity across uplinks.', ('stat',))
+		self.port_utilization = registry.gauge('flowsch_port_utilization', 'Uplink transmit rate over its capacity.', ('switch', 'port'))
+		self.port_headroom = registry.gauge('flowsch_port_headroom_bytes_per_second', 'Uplink capacity not used by its transmit rate.', ('switch', 'port'))
+		self._stage_totals = {}
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		"""Time a stage; repeated entries within a cycle add up"""
+		start = monotonic()
+		try:
+			yield
+		finally:
+			self._stage_totals[name] = self._stage_totals.get(name, 0.0) + monotonic() - start
+
+	def observe_request(self, method, path, status, sent, received, seconds):
+		"""ControllerClient observer: one REST call"""
+		endpoint = endpoint_label(path)
+		with self.registry.lock:
+			self.rest_requests.inc(1, method, endpoint, status)
+			self.rest_seconds.observe(seconds, method, endpoint)
+			self.rest_sent.inc(sent, method, endpoint)
+			self.rest_received.inc(received, method, endpoint)
+
+	def end_cycle(self, seconds, flows_parsed=None, groups_active=None, reassignments=None, uplink_loads=None, elephants=None,
+				anomalies=None, headroom=None):
+		"""headroom is [(dpid, port, tx rate, capacity)] of the uplinks of known capacity"""
+		with self.registry.lock:
+			self.cycle_seconds.observe(seconds)
+			for name in self._stage_totals:
+				self.stage_seconds.observe(self._stage_totals[name], name)
+			self._stage_totals = {}
+			if flows_parsed is not None:
+				self.flows_parsed.set(flows_parsed)
+			if groups_active is not None:
+				self.groups_active.set(groups_active)
+			if reassignments is not None:
+				self.reassignments.set(reassignments)
+				self.reassignments_total.inc(reassignments)
+			if elephants is not None:
+				self.elephants.set(elephants)
+			for (level, kind), count in (anomalies or {}).items():
+				self.counter_anomalies.inc(count, level, kind)
+			if uplink_loads:
+				peak = max(uplink_loads)
+				mean = sum(uplink_loads) / float(len(uplink_loads))
+				self.uplink_rate.set(peak, 'max')
+				self.uplink_rate.set(mean, 'mean')
+				if self.link_speed and not headroom:
+					self.uplink_utilization.set(peak / self.link_speed, 'max')
+					self.uplink_utilization.set(mean / self.link_speed, 'mean')
+			if headroom:
+				self.port_utilization.values = {}			# uplinks that left the topology go away
+				self.port_headroom.values = {}
+				utilizations = []
+				for dpid, port, load, capacity in headroom:
+					utilizations.append(load / capacity)
+					self.port_utilization.set(load / capacity, dpid, port)
+					self.port_headroom.set(max(capacity - load, 0.0), dpid, port)
+				self.uplink_utilization.set(max(utilizations), 'max')
+				self.uplink_utilization.set(sum(utilizations) / len(utilizations), 'mean')
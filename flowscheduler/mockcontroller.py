@@ -0,0 +1,592 @@
+"""
+Stand-in for the Floodlight REST API, for load testing the scheduler without
+a controller or switches.
+
+SyntheticFabric models a leaf-spine fabric: `leaves` leaf switches with
+`hosts_per_leaf` hosts each, `spines` spine switches and `uplinks_per_spine`
+links from every leaf to every spine, carrying `flows` TCP flows between
+random hosts. Every flow has a heavy tailed rate that drifts as a random walk;
+with churn, flows finish and are replaced by new ones. Counters are advanced
+lazily to the time of each request, so they grow like a real switch's would
+between polls whatever the poll period. Flows leave their leaf on the uplink
+the last /wm/forwarding/json assignment picks for their group (or by ECMP
+hash before there is one, or the output of an exact-match static entry), so
+the port counters show the effect of scheduling. A static entry with an
+idle_timeout goes away once its flow has been missing from the flow replies
+for that long.
+
+Every port reports a link speed in its port description: the uplinks take
+`uplink_speeds` (Mbit/s) in turn, so a fabric can mix 10G and 40G uplinks,
+and host ports run at 10G. Speeds are only reported, traffic is not capped.
+
+The first two leaves and spines carry the testbed's dpids, uplink ports and
+host addresses (10.10.1.x on leaf 0, 10.10.2.x on leaf 1), so flowsch*.py run
+against it unchanged.
+
+Endpoints:
+   GET    /wm/core/controller/switches/json
+   GET    /wm/core/switch/{dpid|all}/flow/json
+   GET    /wm/core/switch/{dpid|all}/port/json
+   GET    /wm/core/switch/{dpid|all}/port-desc/json
+   GET    /wm/topology/links/json
+   GET    /wm/device/
+   GET    /wm/forwarding/json
+   POST   /wm/forwarding/json                  (the scheduler's path assignment)
+   POST   /wm/staticflowpusher/json
+   DELETE /wm/staticflowpusher/json            ({"name": ...})
+   GET    /wm/staticflowpusher/list/{dpid|all}/json
+   GET    /wm/staticflowpusher/clear/{dpid|all}/json
+   GET    /mock/stats/json                     (requests and bytes served)
+   POST   /mock/leaf/json                      (connect another leaf)
+   POST   /mock/link/json                      ({"switch": dpid, "port": uplink, "up": false})
+
+Syntax:
+   python -m flowscheduler.mockcontroller --port 8080 --leaves 20 --flows 100000
+"""
+
+import argparse
+import ast
+import json
+import math
+import random
+import sys
+import threading
+
+try:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+except ImportError:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+
+from flowscheduler.flowtable import ip_to_int
+from flowscheduler.poller import monotonic
+from flowscheduler.statsparser import MATCH_FIELDS, SCHEDULER_TABLE
+
+LEAF_DPIDS = ['00:65:5c:8a:38:3e:cd:28', '00:65:2c:23:3a:3e:ed:a9']
+SPINE_DPIDS = ['00:65:bc:ea:fa:b3:5e:32', '00:65:bc:ea:fa:6c:69:1d']
+UPLINK_PORTS = [1, 5, 33, 37, 65, 69]
+FIRST_HOST_PORT = 9
+HOST_SPEED = 10000									# Mbit/s
+PACKET_SIZE = 1500
+DRIFT_TICK = 1.0									# seconds between flow rate changes
+
+# flow entries are written straight as JSON text, json.dumps of 10^5 dicts per poll is slower than the scheduler
+_DEFAULT_ENTRY = json.dumps({'version' : 'OF_13', 'cookie' : '0', 'table_id' : '0x0', 'packet_count' : '0',
+							'byte_count' : '0', 'priority' : '0', 'match' : {},
+							'instructions' : {'instruction_goto_table' : {'table_id' : SCHEDULER_TABLE}}})
+_FLOW_PREFIX = ('{"version": "OF_13", "cookie": "0", "table_id": "%s", "match": {"eth_type": "0x0800", '
+				'"ipv4_src": "%s", "ipv4_dst": "%s", "ip_proto": "0x6", "tcp_src": "%d", "tcp_dst": "%d"}, '
+				'"idle_timeout_s": "0", "hard_timeout_s": "0", "flags": [], '
+				'"instructions": {"instruction_goto_table": {"table_id": "0x1"}}, ')
+_FLOW_COUNTERS = '"priority": "%s", "duration_sec": "%d", "duration_nsec": "0", "packet_count": "%d", "byte_count": "%d"}'
+
+
+def _dpid(kind, index):
+	return '00:00:00:00:00:%02x:%02x:%02x' % (kind, index >> 8, index & 0xff)
+
+
+def _host_ip(leaf, host):
+	return '10.%d.%d.%d' % (10 + leaf // 250, leaf % 250 + 1, host + 1)
+
+
+def _uplink_ports(count):
+	# the testbed's 1, 5, 33, 37, 65, 69, continued every 32 ports
+	ports = list(UPLINK_PORTS[:count])
+	base = 97
+	while len(ports) < count:
+		ports.extend([base, base + 4][:count - len(ports)])
+		base += 32
+	return ports
+
+
+def _port_counters():
+	return [0, 0, 0, 0]								# rx_packets, rx_bytes, tx_packets, tx_bytes
+
+
+class _Flow(object):
+	__slots__ = ('src', 'dst', 'tcp_src', 'tcp_dst', 'src_leaf', 'dst_leaf', 'dpid', 'rate', 'byte_count',
+				'packet_count', 'start', 'carry', 'hash', 'prefix', 'path', 'generation')
+
+
+class SyntheticFabric(object):
+	"""Leaf-spine topology with evolving flow and port counters, see the module docstring"""
+
+	def __init__(self, leaves=2, spines=2, hosts_per_leaf=16, flows=100, uplinks_per_spine=3,
+				mean_rate=1e6, volatility=0.3, churn=0.0, seed=None, clock=monotonic, uplink_speeds=(HOST_SPEED,)):
+		self.random = random.Random(seed)
+		self.clock = clock
+		self.mean_rate = mean_rate
+		self.volatility = volatility					# relative rate drift per sqrt(second)
+		self.churn = churn							# fraction of flows replaced per second
+		self.lock = threading.Lock()
+		self.hosts_per_leaf = hosts_per_leaf
+		self.uplinks_per_spine = uplinks_per_spine
+		self.leaves = []
+		self.spines = []
+		self.counters = {}							# dpid -> port -> _port_counters()
+		self.static_entries = {}
+		for i in range(spines):
+			dpid = SPINE_DPIDS[i] if i < len(SPINE_DPIDS) else _dpid(2, i)
+			self.spines.append(dpid)
+			self.counters[dpid] = {}
+			self.static_entries[dpid] = {}
+		self.uplinks = _uplink_ports(spines * uplinks_per_spine)
+		self.uplink_speeds = list(uplink_speeds)	# Mbit/s of the uplinks in turn
+		self.down_links = set()						# (leaf dpid, uplink port) taken down with set_link()
+		self.host_port = {}
+		self.host_leaf = {}
+		self.hosts = []
+		self.assignment = {}						# forwarding key -> {group_id: port}
+		self.generation = 0							# bumped when routing changes, flows recompute their path
+		self._since_drift = 0.0
+		for i in range(leaves):
+			self.add_leaf()
+		self.static_matches = {}					# (dpid, src, dst, tcp_src, tcp_dst) -> entry
+		self.static_idle = {}						# entry name -> time it was first seen without its flow
+		self.now = self.clock()
+		self.flows = [self._new_flow() for i in range(flows)]
+		self.stats = {'requests' : 0, 'bytes_sent' : 0, 'forwarding_posts' : 0, 'static_entries' : 0}
+
+	def switch_dpids(self):
+		return [leaf['dpid'] for leaf in self.leaves] + self.spines
+
+	def _spine_port(self, leaf, index):
+		# spine side of the index-th uplink of a leaf: uplinks go round the spines
+		return leaf * self.uplinks_per_spine + index // max(len(self.spines), 1) + 1
+
+	def add_leaf(self):
+		"""Connect another leaf with hosts_per_leaf hosts to every spine; returns its dpid"""
+		i = len(self.leaves)
+		dpid = LEAF_DPIDS[i] if i < len(LEAF_DPIDS) else _dpid(1, i)
+		host_ports = []
+		port = FIRST_HOST_PORT
+		while len(host_ports) < self.hosts_per_leaf:
+			if port not in self.uplinks:
+				host_ports.append(port)
+			port += 1
+		hosts = [(_host_ip(i, h), host_ports[h]) for h in range(self.hosts_per_leaf)]
+		self.leaves.append({'dpid' : dpid, 'uplinks' : self.uplinks, 'hosts' : hosts})
+		self.counters[dpid] = dict((port, _port_counters()) for port in self.uplinks + host_ports)
+		self.static_entries[dpid] = {}
+		for index in range(len(self.uplinks)):
+			spine = self.spines[index % len(self.spines)] if self.spines else None
+			if spine is not None:
+				self.counters[spine][self._spine_port(i, index)] = _port_counters()
+		for ip, port in hosts:
+			self.host_port[ip] = port
+			self.host_leaf[ip] = i
+		self.hosts = sorted(self.host_port)
+		self.generation += 1
+		return dpid
+
+	def devices_reply(self):
+		"""/wm/device/: every host with its attachment point"""
+		devices = []
+		for i, leaf in enumerate(self.leaves):
+			for h, (ip, port) in enumerate(leaf['hosts']):
+				devices.append({'entityClass' : 'DefaultEntityClass', 'mac' : ['02:00:00:%02x:%02x:%02x' % (i >> 8, i & 0xff, h)],
+								'ipv4' : [ip], 'ipv6' : [], 'vlan' : ['0x0'],
+								'attachmentPoint' : [{'switch' : leaf['dpid'], 'port' : port}],
+								'lastSeen' : int(self.now * 1000)})
+		return {'devices' : devices}
+
+	def set_link(self, dpid, port, up):
+		"""Take the link behind uplink `port` of leaf `dpid` down or bring it back"""
+		if up:
+			self.down_links.discard((dpid, port))
+		else:
+			self.down_links.add((dpid, port))
+		self.generation += 1
+
+	def links_reply(self):
+		"""/wm/topology/links/json: every leaf-spine link that is up"""
+		links = []
+		for i, leaf in enumerate(self.leaves):
+			for index, port in enumerate(leaf['uplinks']):
+				if not self.spines or (leaf['dpid'], port) in self.down_links:
+					continue
+				links.append({'src-switch' : leaf['dpid'], 'src-port' : port,
+							'dst-switch' : self.spines[index % len(self.spines)], 'dst-port' : self._spine_port(i, index),
+							'type' : 'internal', 'direction' : 'bidirectional', 'latency' : 0})
+		return links
+
+	def _new_flow(self):
+		flow = _Flow()
+		flow.src, flow.dst = self.random.sample(self.hosts, 2) if len(self.hosts) > 1 else (self.hosts[0], self.hosts[0])
+		flow.tcp_src = self.random.randint(1024, 65535)
+		flow.tcp_dst = self.random.choice((80, 443, 5001, 8080, 50010))
+		flow.src_leaf = self.host_leaf[flow.src]
+		flow.dst_leaf = self.host_leaf[flow.dst]
+		flow.dpid = self.leaves[flow.src_leaf]['dpid']
+		flow.rate = self.mean_rate * self.random.paretovariate(1.5) / 3.0		# pareto(1.5) has mean 3
+		flow.byte_count = 0
+		flow.packet_count = 0
+		flow.start = self.now
+		flow.carry = 0.0
+		flow.hash = ip_to_int(flow.src) ^ ip_to_int(flow.dst) ^ flow.tcp_src ^ flow.tcp_dst
+		flow.prefix = _FLOW_PREFIX % (SCHEDULER_TABLE, flow.src, flow.dst, flow.tcp_src, flow.tcp_dst)
+		flow.path = None
+		flow.generation = -1
+		return flow
+
+	def _groups_path(self, flow):
+		# assignment by ip tuple (flowsch.py, flowsch-leaf*.py) or by switch (flowsch-entire.py)
+		groups_path = self.assignment.get((flow.src, flow.dst))
+		group_id = flow.tcp_src ^ flow.tcp_dst
+		if groups_path is None:
+			groups_path = self.assignment.get(flow.dpid)
+			group_id = flow.hash
+		if not groups_path:
+			return None
+		return groups_path.get(group_id % len(groups_path))
+
+	def _uplink(self, flow):
+		leaf = self.leaves[flow.src_leaf]
+		entry = self.static_matches.get((flow.dpid, flow.src, flow.dst, flow.tcp_src, flow.tcp_dst))
+		if entry is not None:
+			port = _output_port(entry)
+			if port in leaf['uplinks']:
+				return port
+		port = self._groups_path(flow)
+		if port in leaf['uplinks'] and (flow.dpid, port) not in self.down_links:
+			return port
+		uplinks = [port for port in leaf['uplinks'] if (flow.dpid, port) not in self.down_links] or leaf['uplinks']
+		return uplinks[flow.hash % len(uplinks)]
+
+	def _path(self, flow):
+		# (port counters, offset) of every port the flow crosses: 0 counts rx, 2 counts tx
+		src_leaf = self.leaves[flow.src_leaf]
+		dst_leaf = self.leaves[flow.dst_leaf]
+		hops = [(src_leaf['dpid'], self.host_port[flow.src], 0)]
+		if flow.src_leaf != flow.dst_leaf:
+			uplink = self._uplink(flow)
+			hops.append((src_leaf['dpid'], uplink, 2))
+			if self.spines:
+				index = src_leaf['uplinks'].index(uplink)
+				spine = self.spines[index % len(self.spines)]
+				hops.append((spine, self._spine_port(flow.src_leaf, index), 0))
+				hops.append((spine, self._spine_port(flow.dst_leaf, index), 2))
+				hops.append((dst_leaf['dpid'], dst_leaf['uplinks'][index], 0))
+		hops.append((dst_leaf['dpid'], self.host_port[flow.dst], 2))
+		return [(self.counters[dpid][port], offset) for dpid, port, offset in hops if port in self.counters[dpid]]
+
+	def advance(self, now=None):
+		"""Move every counter forward to `now`"""
+		now = self.clock() if now is None else now
+		dt = now - self.now
+		if dt <= 0:
+			return
+		self.now = now
+		self._since_drift += dt
+		drift = 0.0
+		if self._since_drift >= DRIFT_TICK:
+			drift = self.volatility * math.sqrt(self._since_drift)
+			self._since_drift = 0.0
+		replace = self.churn * dt
+		generation = self.generation
+		for i, flow in enumerate(self.flows):
+			if replace > 0 and self.random.random() < replace:
+				self.flows[i] = self._new_flow()
+				continue
+			if flow.generation != generation:
+				flow.path = self._path(flow)
+				flow.generation = generation
+			moved = flow.rate * dt + flow.carry
+			byte_count = int(moved)
+			flow.carry = moved - byte_count
+			packet_count = (byte_count + PACKET_SIZE - 1) // PACKET_SIZE
+			flow.byte_count += byte_count
+			flow.packet_count += packet_count
+			for counters, offset in flow.path:
+				counters[offset] += packet_count
+				counters[offset + 1] += byte_count
+			if drift > 0:
+				flow.rate = min(max(flow.rate * math.exp(self.random.gauss(0, drift)), 1.0), self.mean_rate * 100)
+
+	def flows_json(self, dpids):
+		"""{dpid: flow reply of that switch as JSON text}, built in one pass over the flows"""
+		fragments = dict((dpid, [_DEFAULT_ENTRY]) for dpid in dpids)
+		matched = set()
+		now = self.now
+		for flow in self.flows:
+			entries = fragments.get(flow.dpid)
+			if entries is None:
+				continue
+			priority = '1'
+			if self.static_matches:
+				entry = self.static_matches.get((flow.dpid, flow.src, flow.dst, flow.tcp_src, flow.tcp_dst))
+				if entry is not None:
+					matched.add(entry['name'])
+					priority = entry.get('priority', '32768')
+			entries.append(flow.prefix + _FLOW_COUNTERS % (priority, now - flow.start, flow.packet_count, flow.byte_count))
+		for dpid in dpids:
+			for name, entry in list(self.static_entries.get(dpid, {}).items()):
+				if name in matched:
+					self.static_idle.pop(name, None)
+					continue
+				idle_timeout = int(entry.get('idle_timeout', 0))
+				if idle_timeout and now - self.static_idle.setdefault(name, now) >= idle_timeout:
+					self.delete_static(name)				# expired on the switch, as after a flow removed message
+					continue
+				fragments[dpid].append(json.dumps({'version' : 'OF_13', 'cookie' : '0', 'table_id' : _table_id(entry),
+					'packet_count' : '0', 'byte_count' : '0', 'priority' : entry.get('priority', '32768'),
+					'match' : dict((field, entry[field]) for field in MATCH_FIELDS if field in entry)}))
+		return dict((dpid, '{"flows": [' + ', '.join(fragments[dpid]) + ']}') for dpid in dpids)
+
+	def ports_reply(self, dpid):
+		ports = []
+		for port in sorted(self.counters[dpid]):
+			rx_packets, rx_bytes, tx_packets, tx_bytes = self.counters[dpid][port]
+			ports.append({'port_number' : str(port), 'receive_packets' : str(rx_packets),
+							'transmit_packets' : str(tx_packets), 'receive_bytes' : str(rx_bytes),
+							'transmit_bytes' : str(tx_bytes), 'receive_dropped' : '0', 'transmit_dropped' : '0',
+							'receive_errors' : '0', 'transmit_errors' : '0', 'collisions' : '0'})
+		ports.append({'port_number' : 'local', 'receive_packets' : '0', 'transmit_packets' : '0',
+						'receive_bytes' : '0', 'transmit_bytes' : '0'})
+		return {'port_reply' : [{'version' : 'OF_13', 'port' : ports}]}
+
+	def ports_json(self, dpids):
+		return dict((dpid, json.dumps(self.ports_reply(dpid))) for dpid in dpids)
+
+	def port_speed(self, dpid, port):
+		"""Mbit/s of a port: its uplink's (or, on a spine, the link's) turn in uplink_speeds, HOST_SPEED otherwise"""
+		if dpid in self.spines:
+			index = (port - 1) % self.uplinks_per_spine * max(len(self.spines), 1) + self.spines.index(dpid)
+		elif port in self.uplinks:
+			index = self.uplinks.index(port)
+		else:
+			return HOST_SPEED
+		return self.uplink_speeds[index % len(self.uplink_speeds)]
+
+	def port_desc_reply(self, dpid):
+		ports = []
+		for port in sorted(self.counters[dpid]):
+			kbps = str(int(self.port_speed(dpid, port) * 1000))
+			ports.append({'portNumber' : str(port), 'hardwareAddress' : '02:00:00:00:%02x:%02x' % (port >> 8, port & 0xff),
+							'name' : 'eth%d' % port, 'config' : '0', 'state' : '0', 'currSpeed' : kbps, 'maxSpeed' : kbps})
+		ports.append({'portNumber' : 'local', 'name' : 'local', 'config' : '0', 'state' : '0', 'currSpeed' : '0', 'maxSpeed' : '0'})
+		return {'portDesc' : ports, 'version' : 'OF_13'}
+
+	def set_assignment(self, assignment):
+		"""Merge a posted path assignment: {str(ip_tuple) or dpid: {group_id: port}}"""
+		for key in assignment:
+			groups_path = dict((int(group_id), int(port)) for group_id, port in assignment[key].items())
+			try:
+				parsed = ast.literal_eval(key)
+			except (ValueError, SyntaxError):
+				parsed = key								# a dpid
+			if isinstance(parsed, tuple):
+				parsed = tuple(str(ip) for ip in parsed)
+			self.assignment.setdefault(parsed, {}).update(groups_path)
+		self.generation += 1
+		self.stats['forwarding_posts'] += 1
+
+	def push_static(self, entry):
+		dpid = entry['switch']
+		if dpid not in self.static_entries:
+			raise KeyError(dpid)
+		self.delete_static(entry['name'])
+		self.static_entries[dpid][entry['name']] = entry
+		if all(field in entry for field in MATCH_FIELDS):
+			key = (dpid, entry['ipv4_src'], entry['ipv4_dst'], int(entry['tcp_src']), int(entry['tcp_dst']))
+			self.static_matches[key] = entry
+			self.generation += 1
+		self.stats['static_entries'] = sum(len(entries) for entries in self.static_entries.values())
+
+	def delete_static(self, name):
+		for dpid in self.static_entries:
+			entry = self.static_entries[dpid].pop(name, None)
+			if entry is not None:
+				if all(field in entry for field in MATCH_FIELDS):
+					key = (dpid, entry['ipv4_src'], entry['ipv4_dst'], int(entry['tcp_src']), int(entry['tcp_dst']))
+					if self.static_matches.get(key) is entry:
+						del self.static_matches[key]
+						self.generation += 1
+				self.stats['static_entries'] -= 1
+				self.static_idle.pop(name, None)
+				return True
+		return False
+
+	def clear_static(self, dpids):
+		for dpid in dpids:
+			for name in list(self.static_entries.get(dpid, {})):
+				self.delete_static(name)
+
+
+def _table_id(entry):
+	return hex(int(entry.get('table', 0)))
+
+
+def _output_port(entry):
+	for action in entry.get('actions', '').split(','):
+		if action.startswith('output='):
+			try:
+				return int(action[len('output='):])
+			except ValueError:
+				return None
+	return None
+
+
+class MockControllerHandler(BaseHTTPRequestHandler):
+	"""Serves the endpoints of the module docstring from self.server.fabric"""
+
+	protocol_version = 'HTTP/1.1'
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):
+		pass
+
+	def _send(self, code, body=None, text=None):
+		if text is None and body is not None:
+			text = json.dumps(body)
+		if text is None:
+			data = b''
+		elif isinstance(text, bytes):					# python 2 str
+			data = text
+		else:
+			data = text.encode('utf-8')
+		self.send_response(code)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+		self.server.fabric.stats['requests'] += 1
+		self.server.fabric.stats['bytes_sent'] += len(data)
+
+	def _body(self):
+		length = int(self.headers.get('Content-Length') or 0)
+		return json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+
+	def _switches(self, dpid):
+		fabric = self.server.fabric
+		if dpid == 'all':
+			return fabric.switch_dpids()
+		if dpid not in fabric.counters:
+			return None
+		return [dpid]
+
+	def do_GET(self):
+		fabric = self.server.fabric
+		parts = self.path.strip('/').split('/')
+		with fabric.lock:
+			if self.path == '/wm/core/controller/switches/json':
+				return self._send(200, [{'switchDPID' : dpid, 'inetAddress' : '/127.0.0.1:6653',
+											'connectedSince' : 0} for dpid in fabric.switch_dpids()])
+			if len(parts) == 6 and parts[:3] == ['wm', 'core', 'switch'] and parts[5] == 'json':
+				dpids = self._switches(parts[3])
+				if dpids is None or parts[4] not in ('flow', 'port', 'port-desc'):
+					return self._send(404, {'error' : 'unknown switch or statistic'})
+				if parts[4] == 'port-desc':
+					replies = dict((dpid, fabric.port_desc_reply(dpid)) for dpid in dpids)
+					return self._send(200, replies if parts[3] == 'all' else replies[dpids[0]])
+				fabric.advance()
+				replies = fabric.flows_json(dpids) if parts[4] == 'flow' else fabric.ports_json(dpids)
+				if parts[3] == 'all':
+					return self._send(200, text='{' + ', '.join('%s: %s' % (json.dumps(dpid), replies[dpid]) for dpid in dpids) + '}')
+				return self._send(200, text=replies[dpids[0]])
+			if parts == ['wm', 'topology', 'links', 'json']:
+				return self._send(200, fabric.links_reply())
+			if parts == ['wm', 'device']:
+				return self._send(200, fabric.devices_reply())
+			if parts == ['wm', 'forwarding', 'json']:
+				return self._send(200, dict((str(key), value) for key, value in fabric.assignment.items()))
+			if len(parts) == 5 and parts[:2] == ['wm', 'staticflowpusher'] and parts[4] == 'json':
+				dpids = self._switches(parts[3])
+				if dpids is None or parts[2] not in ('list', 'clear'):
+					return self._send(404, {'error' : 'unknown switch'})
+				if parts[2] == 'clear':
+					fabric.clear_static(dpids)
+					return self._send(200, {'status' : 'Deleted all flows.'})
+				return self._send(200, dict((dpid, [{name : entry} for name, entry in fabric.static_entries[dpid].items()])
+											for dpid in dpids))
+			if parts == ['mock', 'stats', 'json']:
+				return self._send(200, dict(fabric.stats, flows=len(fabric.flows), switches=len(fabric.counters)))
+		self._send(404, {'error' : 'unknown resource'})
+
+	def do_POST(self):
+		fabric = self.server.fabric
+		try:
+			body = self._body()
+		except ValueError:
+			return self._send(400, {'error' : 'malformed JSON'})
+		with fabric.lock:
+			if self.path == '/wm/forwarding/json':
+				fabric.advance()							# traffic so far went the old way
+				fabric.set_assignment(body)
+				return self._send(204)
+			if self.path == '/wm/staticflowpusher/json':
+				fabric.advance()
+				try:
+					fabric.push_static(body)
+				except KeyError:
+					return self._send(400, {'status' : 'Invalid switch or missing name'})
+				return self._send(200, {'status' : 'Entry pushed'})
+			if self.path == '/mock/leaf/json':
+				fabric.advance()
+				return self._send(200, {'switch' : fabric.add_leaf()})
+			if self.path == '/mock/link/json':
+				if body.get('switch') not in fabric.counters:
+					return self._send(400, {'error' : 'unknown switch'})
+				fabric.advance()
+				fabric.set_link(body['switch'], int(body.get('port', 0)), bool(body.get('up', True)))
+				return self._send(200, {'status' : 'ok'})
+		self._send(404, {'error' : 'unknown resource'})
+
+	def do_DELETE(self):
+		fabric = self.server.fabric
+		try:
+			body = self._body()
+		except ValueError:
+			return self._send(400, {'error' : 'malformed JSON'})
+		with fabric.lock:
+			if self.path == '/wm/staticflowpusher/json':
+				fabric.advance()
+				if fabric.delete_static(body.get('name')):
+					return self._send(200, {'status' : 'Entry %s deleted' % body.get('name')})
+				return self._send(200, {'status' : 'Entry %s not found' % body.get('name')})
+		self._send(404, {'error' : 'unknown resource'})
+
+
+class MockController(ThreadingMixIn, HTTPServer):
+	"""Threaded HTTP server around a SyntheticFabric"""
+
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, address, fabric):
+		HTTPServer.__init__(self, address, MockControllerHandler)
+		self.fabric = fabric
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Mock Floodlight controller')
+	parser.add_argument("--host", action='store', default='127.0.0.1', help='address to listen on')
+	parser.add_argument("--port", action='store', type=int, default=8080, help='REST port to listen on')
+	parser.add_argument("--leaves", action='store', type=int, default=2, help='number of leaf switches')
+	parser.add_argument("--spines", action='store', type=int, default=2, help='number of spine switches')
+	parser.add_argument("--hosts-per-leaf", action='store', type=int, default=16, help='hosts attached to every leaf')
+	parser.add_argument("--uplinks-per-spine", action='store', type=int, default=3, help='links from every leaf to every spine')
+	parser.add_argument("--flows", action='store', type=int, default=100, help='number of concurrent TCP flows')
+	parser.add_argument("--mean-rate", action='store', type=float, default=1e6, help='mean flow rate in bytes/sec')
+	parser.add_argument("--volatility", action='store', type=float, default=0.3, help='relative drift of a flow rate per sqrt(second)')
+	parser.add_argument("--churn", action='store', type=float, default=0.0, help='fraction of the flows replaced by new ones per second')
+	parser.add_argument("--seed", action='store', type=int, default=None, help='random seed of the topology and traffic')
+	parser.add_argument("--uplink-speeds", action='store', default=str(HOST_SPEED), help='comma separated Mbit/s the uplinks of a leaf take in turn, e.g. 40000,10000')
+	args = parser.parse_args(argv)
+
+	fabric = SyntheticFabric(args.leaves, args.spines, args.hosts_per_leaf, args.flows, args.uplinks_per_spine,
+							args.mean_rate, args.volatility, args.churn, args.seed,
+							uplink_speeds=[float(speed) for speed in args.uplink_speeds.split(',')])
+	server = MockController((args.host, args.port), fabric)
+	sys.stderr.write("mock controller on %s:%d: %d switches, %d hosts, %d flows\n" % (
+		args.host, args.port, len(fabric.counters), len(fabric.hosts), len(fabric.flows)))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	server.server_close()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,258 @@
+"""
+Least-loaded port placement on an indexed min-heap.
+
+scheduler() used to rebuild the port congestion map for every ip tuple and
+scan every candidate port for every group. HeapScheduler takes the congestion
+baseline once per cycle, keeps one PortHeap per distinct candidate port list
+and places each group on the least loaded port in O(log P).
+
+With carry_load, the load placed for one ip tuple stays on the ports for the
+tuples scheduled after it in the same cycle; the heaps of every candidate list
+sharing a port are updated through their index. Without it (the default, and
+what scheduler() always did) every tuple starts from the measured baseline.
+
+A solver from flowscheduler.solvers can replace the greedy placement; it is
+given `budget` seconds per cycle, after which the remaining tuples of the
+cycle are placed greedily.
+
+With port capacities (bytes/sec, begin_cycle()'s second argument) ports are
+compared by utilization, load over capacity, so a 40G uplink takes four times
+the bytes of a 10G one before it counts as equally busy: the heap orders ports
+by utilization and a group goes to the port left least utilized with it. A
+candidate port without a capacity counts as the fastest of its candidate
+list. Without capacities, or with equal ones, loads compare as plain bytes.
+
+Example:
+   placement = HeapScheduler()
+   placement.begin_cycle(get_port_usages())
+   for ip_tuple in flow_groups:
+      path_assignment[ip_tuple] = placement.place(flow_groups[ip_tuple], iptuple_port_dict[ip_tuple])
+"""
+
+from flowscheduler.poller import monotonic
+
+
+class PortHeap(object):
+	"""
+	Binary min-heap of [utilization, order, port, load, capacity] entries with
+	a port -> position index. order is the port's position in the candidate
+	list, so ties go to the first listed port like the old linear scan.
+	utilization is load / capacity, the load itself when no port has one.
+	"""
+
+	def __init__(self, ports=(), loads=None, capacity=None):
+		self.heap = []
+		self.index = {}
+		known = [capacity[port] for port in ports if port in capacity] if capacity else []
+		fastest = max(known) if known else 1.0
+		for order, port in enumerate(ports):
+			if port in self.index:
+				continue
+			load = loads.get(port, 0) if loads is not None else 0
+			speed = float(capacity.get(port, fastest)) if known else 1.0
+			self.index[port] = len(self.heap)
+			self.heap.append([load / float(speed), order, port, load, speed])
+		self.uniform = len(set(entry[4] for entry in self.heap)) <= 1
+		for position in reversed(range(len(self.heap) // 2)):
+			self._sift_down(position)
+
+	def __len__(self):
+		return len(self.heap)
+
+	def __contains__(self, port):
+		return port in self.index
+
+	def copy(self):
+		other = PortHeap()
+		other.heap = [list(entry) for entry in self.heap]
+		other.index = dict(self.index)
+		other.uniform = self.uniform
+		return other
+
+	def _swap(self, i, j):
+		heap = self.heap
+		heap[i], heap[j] = heap[j], heap[i]
+		self.index[heap[i][2]] = i
+		self.index[heap[j][2]] = j
+
+	def _sift_up(self, position):
+		heap = self.heap
+		while position > 0:
+			parent = (position - 1) >> 1
+			if heap[position][:2] < heap[parent][:2]:
+				self._swap(position, parent)
+				position = parent
+			else:
+				return
+
+	def _sift_down(self, position):
+		heap = self.heap
+		size = len(heap)
+		while True:
+			smallest = position
+			for child in (2 * position + 1, 2 * position + 2):
+				if child < size and heap[child][:2] < heap[smallest][:2]:
+					smallest = child
+			if smallest == position:
+				return
+			self._swap(position, smallest)
+			position = smallest
+
+	def min_port(self):
+		return self.heap[0][2]
+
+	def best_port(self, size):
+		"""The port least utilized once `size` more bytes go on it; min_port() when capacities are equal"""
+		if self.uniform:
+			return self.heap[0][2]
+		return min(self.heap, key=lambda entry: ((entry[3] + size) / entry[4], entry[1]))[2]
+
+	def load(self, port):
+		return self.heap[self.index[port]][3]
+
+	def add(self, port, delta):
+		"""Add delta to a port's load and restore the heap order, O(log P)"""
+		position = self.index[port]
+		entry = self.heap[position]
+		entry[3] += delta
+		entry[0] = entry[3] / entry[4]
+		if delta < 0:
+			self._sift_up(position)
+		else:
+			self._sift_down(position)
+
+	def loads(self):
+		return dict((entry[2], entry[3]) for entry in self.heap)
+
+	def capacities(self):
+		return dict((entry[2], entry[4]) for entry in self.heap)
+
+
+class HeapScheduler(object):
+	"""Greedy largest-group-first placement of hash groups on ports"""
+
+	def __init__(self, carry_load=False, solver=None, budget=None):
+		self.carry_load = carry_load
+		self.solver = solver						# None places greedily on the heap
+		self.budget = budget						# seconds per cycle for the solver
+		self.deadline = None
+		self.solver_timeouts = 0
+		self.loads = {}
+		self.capacity = None
+		self._heaps = {}
+
+	def begin_cycle(self, baseline, capacity=None):
+		"""
+		Take the port congestion baseline (port -> load) shared by every tuple
+		this cycle, and the ports' capacities (port -> bytes/sec) if known
+		"""
+		self.loads = dict(baseline)
+		self.capacity = capacity
+		self._heaps = {}
+		self.deadline = monotonic() + self.budget if self.budget is not None else None
+
+	def _solve(self, heap, groups, ports):
+		if self.deadline is not None and monotonic() > self.deadline:
+			return None
+		loads = dict((port, heap.load(port)) for port in ports)
+		groups_path = self.solver.solve(groups, ports, loads, self.deadline, heap.capacities() if not heap.uniform else None)
+		if groups_path is None:
+			self.solver_timeouts += 1
+		return groups_path
+
+	def _heap(self, ports):
+		key = tuple(ports)
+		heap = self._heaps.get(key)
+		if heap is None:
+			heap = PortHeap(ports, self.loads, self.capacity)
+			self._heaps[key] = heap
+		return heap
+
+	def _add(self, heap, port, delta):
+		heap.add(port, delta)
+		if not self.carry_load:
+			return
+		self.loads[port] = self.loads.get(port, 0) + delta
+		for other in self._heaps.values():
+			if other is not heap and port in other:
+				other.add(port, delta)
+
+	def port_loads(self, ports):
+		"""Current load of every port in `ports`, including load carried this cycle"""
+		return self._heap(ports).loads()
+
+	def port_capacities(self, ports):
+		"""Capacity every port in `ports` is weighed with, all 1.0 without capacities"""
+		return self._heap(ports).capacities()
+
+	def plan(self, groups, ports):
+		"""
+		Map every group (group_id -> bytes) to a port of `ports`, largest group
+		first onto the port least utilized with it (or through the solver), without
+		counting the result as load. Returns {group_id: port}, port -1 when
+		there is no candidate port.
+		"""
+		groups_path = {}
+		if not ports:
+			for group_id in groups:
+				groups_path[group_id] = -1
+			return groups_path
+		heap = self._heap(ports).copy()
+		if self.solver is not None:
+			groups_path = self._solve(heap, groups, ports)
+			if groups_path is not None:
+				return groups_path
+			groups_path = {}
+		for group_id, byte_count in sorted(groups.items(), key=lambda x: x[1], reverse=True):
+			port = heap.best_port(byte_count)
+			groups_path[group_id] = port
+			heap.add(port, byte_count)
+		return groups_path
+
+	def commit(self, groups, ports, groups_path):
+		"""Count a placement as load on its ports for the rest of the cycle (carry_load only)"""
+		if not self.carry_load or not ports:
+			return
+		heap = self._heap(ports)
+		for group_id in groups_path:
+			if groups_path[group_id] in heap:
+				self._add(heap, groups_path[group_id], groups[group_id])
+
+	def place(self, groups, ports, key=None):
+		"""
+		plan() and commit() the groups of one tuple. key names the tuple across
+		cycles; HeapScheduler plans from scratch every cycle and ignores it.
+		"""
+		groups_path = self.plan(groups, ports)
+		self.commit(groups, ports, groups_path)
+		return groups_path
+
+	def place_all(self, tuples):
+		"""place() every (key, groups, ports) of `tuples`; returns {key: {group_id: port}}"""
+		path_assignment = {}
+		for key, groups, ports in tuples:
+			path_assignment[key] = self.place(groups, ports, key)
+		return path_assignment
+
+	def forget(self, key):
+		pass
+
+	def restore(self, key, groups_path):
+		"""Take the placement a previous process left for `key`; HeapScheduler keeps none"""
+		pass
+
+
+def make_placement(carry_load=False, solver='greedy', budget=None, incremental=False,
+				threshold=0.1, hysteresis=0.05, max_moves=0):
+	"""
+	Build the placement the scripts' options describe: a HeapScheduler using the
+	named solver (budget in seconds per cycle), wrapped in an IncrementalScheduler
+	when incremental is set. Plain keyword arguments, so shard processes can
+	build the same placement.
+	"""
+	from flowscheduler.incremental import IncrementalScheduler
+	from flowscheduler.solvers import make_solver
+	placement = HeapScheduler(carry_load, make_solver(solver) if solver != 'greedy' else None, budget)
+	if incremental:
+		placement = IncrementalScheduler(placement, threshold, hysteresis, max_moves)
+	return placement
@@ -0,0 +1,115 @@
+"""
+Fixed-period (optionally adaptive) poll scheduling on a monotonic clock.
+
+PollScheduler replaces the busy `while True` loop of the flowsch*.py scripts:
+wait() sleeps until the next poll is due and observe() lets an adaptive poller
+shorten its period while link utilization is volatile and stretch it while the
+fabric is quiet. Counter differences are turned into bytes/sec with per_second()
+using the interval measured on the same clock.
+
+Example:
+   poller = PollScheduler(1.0, adaptive=True)
+   while True:
+      now = poller.wait()
+      ...
+      poller.observe(port_rates)
+"""
+
+import time
+
+
+def _monotonic_clock():
+	if hasattr(time, 'monotonic'):
+		return time.monotonic
+	try:											# python 2 on linux
+		import ctypes
+		import ctypes.util
+
+		class timespec(ctypes.Structure):
+			_fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+		librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1', use_errno=True)
+		clock_gettime = librt.clock_gettime
+		clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+		CLOCK_MONOTONIC = 1
+
+		def monotonic():
+			t = timespec()
+			if clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(t)) != 0:
+				raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+			return t.tv_sec + t.tv_nsec * 1e-9
+		monotonic()
+		return monotonic
+	except (OSError, AttributeError):
+		return time.time
+
+monotonic = _monotonic_clock()
+
+
+def per_second(diff, interval):
+	"""Normalize a counter difference taken over `interval` seconds to a rate"""
+	if interval <= 0:
+		return 0.0
+	return diff / float(interval)
+
+
+class PollScheduler(object):
+	"""
+	Paces the control loop to one poll every `period` seconds.
+	When adaptive, the period is divided by `step` (down to min_period) when the
+	observed load moved by more than `volatile` (relative) since the previous
+	cycle, and multiplied by `step` (up to max_period) when it moved by less
+	than `quiet`.
+	"""
+
+	def __init__(self, period=1.0, adaptive=False, min_period=None, max_period=None,
+				volatile=0.25, quiet=0.05, step=1.5):
+		self.base_period = period
+		self.period = period
+		self.adaptive = adaptive
+		self.min_period = min_period if min_period is not None else period / 4.0
+		self.max_period = max_period if max_period is not None else period * 4.0
+		self.volatile = volatile
+		self.quiet = quiet
+		self.step = step
+		self.deadline = None
+		self.last_poll = None
+		self.interval = 0.0
+		self.overruns = 0
+		self._last_load = None
+
+	def wait(self):
+		"""Sleep until the next poll is due and return the poll time"""
+		now = monotonic()
+		if self.deadline is not None and now < self.deadline:
+			time.sleep(self.deadline - now)
+			now = monotonic()
+		elif self.deadline is not None and self.period > 0:
+			# cycle overran its period: start the next one right away, but
+			# do not try to catch up on the polls that were missed
+			self.overruns += 1
+		if self.last_poll is not None:
+			self.interval = now - self.last_poll
+		self.last_poll = now
+		self.deadline = now + self.period
+		return now
+
+	def observe(self, loads):
+		"""Feed this cycle's load values (e.g. uplink tx rates) to the adaptive period"""
+		loads = list(loads)
+		last_load, self._last_load = self._last_load, loads
+		if not self.adaptive or last_load is None or len(last_load) != len(loads):
+			return self.period
+		total = sum(last_load)
+		change = sum(abs(new - old) for new, old in zip(loads, last_load))
+		if total <= 0:
+			change = 1.0 if change > 0 else 0.0
+		else:
+			change = change / float(total)
+		if change > self.volatile:
+			self.period = max(self.min_period, self.period / self.step)
+		elif change < self.quiet:
+			self.period = min(self.max_period, self.period * self.step)
+		if self.last_poll is not None:
+			self.deadline = self.last_poll + self.period
+		return self.period
@@ -0,0 +1,106 @@
+"""
+Delta-only push of the path assignment to the controller.
+
+DeltaPusher remembers the group->port map the controller last acknowledged
+for every key (ip tuple or dpid) and only sends the entries that changed since
+then; when nothing changed the REST call is skipped altogether. It keeps
+running totals of calls and bytes sent and saved compared to pushing the full
+assignment every time, and of reassignments: acknowledged groups that were
+pushed again with another port.
+
+Example:
+   delta_pusher = DeltaPusher(Forwarding(client), convert_to_json)
+   sent = delta_pusher.push(path_assignment)
+"""
+
+import json
+
+
+class DeltaPusher(object):
+	"""Wraps a Forwarding pusher so that only changed assignments are sent"""
+
+	def __init__(self, forwarding, encode, full_every=0):
+		self.forwarding = forwarding
+		self.encode = encode
+		self.full_every = full_every		# resend everything every N pushes (0 = never)
+		self.acked = {}
+		self.calls = 0
+		self.calls_skipped = 0
+		self.calls_failed = 0
+		self.bytes_sent = 0
+		self.bytes_saved = 0
+		self.reassigned = 0
+		self._pushes = 0
+		self._entry_bytes = {}
+		self._full_bytes = 0
+
+	def resync(self):
+		"""Forget what the controller acknowledged, the next push sends everything"""
+		self.acked = {}
+
+	def forget(self, key):
+		"""Drop a key that left the assignment, so it is sent in full if it comes back"""
+		if key in self.acked:
+			del self.acked[key]
+		if key in self._entry_bytes:
+			self._full_bytes -= self._entry_bytes.pop(key)
+
+	def diff(self, path_assignment):
+		"""Return {key: {group_id: port}} holding only the entries not yet acknowledged"""
+		delta = {}
+		for key in path_assignment:
+			groups_path = path_assignment[key]
+			acked = self.acked.get(key)
+			if acked is None:
+				delta[key] = dict(groups_path)
+				continue
+			changed = {}
+			for group_id in groups_path:
+				if acked.get(group_id) != groups_path[group_id]:
+					changed[group_id] = groups_path[group_id]
+			if changed:
+				delta[key] = changed
+		return delta
+
+	def _track_full_size(self, path_assignment, delta):
+		# size of the full payload, maintained from the entries that changed
+		for key in delta:
+			size = len(json.dumps(str(key))) + len(json.dumps(path_assignment[key])) + 2
+			self._full_bytes += size - self._entry_bytes.get(key, 0)
+			self._entry_bytes[key] = size
+
+	def push(self, path_assignment):
+		"""
+		Send the changed part of path_assignment.
+		Returns the payload that was sent, or None when the call was skipped.
+		"""
+		self._pushes += 1
+		if self.full_every and self._pushes % self.full_every == 0:
+			self.resync()
+		delta = self.diff(path_assignment)
+		self._track_full_size(path_assignment, delta)
+		if not delta:
+			self.calls_skipped += 1
+			self.bytes_saved += self._full_bytes
+			return None
+		payload = self.encode(delta)
+		self.calls += 1
+		self.bytes_sent += len(payload)
+		self.bytes_saved += max(self._full_bytes - len(payload), 0)
+		if not self.forwarding.set(payload):
+			self.calls_failed += 1
+			return payload
+		for key in delta:
+			if key in self.acked:
+				acked = self.acked[key]
+				for group_id in delta[key]:
+					if group_id in acked:
+						self.reassigned += 1
+				acked.update(delta[key])
+			else:
+				self.acked[key] = delta[key]
+		return payload
+
+	def summary(self):
+		return "%d calls, %d skipped, %d failed, %d bytes sent, %d bytes saved" % (
+			self.calls, self.calls_skipped, self.calls_failed, self.bytes_sent, self.bytes_saved)
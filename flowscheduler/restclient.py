@@ -0,0 +1,180 @@
+"""
+Keep-alive HTTP client for the Floodlight REST API.
+
+A single ControllerClient is shared by everything that talks to the controller
+(switch discovery, flow/port statistics and the forwarding push). Connections
+are kept open between calls and handed out from a small pool, so a poll cycle
+no longer pays for a curl fork+exec and a fresh TCP handshake per request.
+
+An optional observer is called once per completed request with
+(action, path, status, bytes_sent, bytes_received, seconds), e.g.
+SchedulerMetrics.observe_request.
+
+Example:
+   client = ControllerClient('128.110.152.148:8080')
+   switches = client.switches()
+   flows = client.flows(switches[0]['switchDPID'])
+"""
+
+import contextlib
+import json
+import socket
+import threading
+
+try:
+	import httplib
+except ImportError:
+	import http.client as httplib
+
+from flowscheduler.poller import monotonic
+
+JSON_HEADERS = {
+	'Content-type': 'application/json',
+	'Accept': 'application/json',
+	}
+
+IDEMPOTENT = ('GET', 'HEAD')				# replayed when a reused connection drops before the reply
+REQUEST_ERRORS = (httplib.HTTPException, socket.error)
+
+
+class _CountingReader(object):
+	"""A response whose read() counts the bytes handed out"""
+
+	def __init__(self, response):
+		self.response = response
+		self.count = 0
+
+	def read(self, *args):
+		data = self.response.read(*args)
+		self.count += len(data)
+		return data
+
+	def __getattr__(self, name):
+		return getattr(self.response, name)
+
+
+class ControllerClient(object):
+	"""Pooled, keep-alive REST client for one controller (IP:RESTport)"""
+
+	def __init__(self, controllerRestIP, pool_size=8, timeout=5.0, observer=None):
+		if ':' in controllerRestIP:
+			host, port = controllerRestIP.split(":")
+		else:
+			host, port = controllerRestIP, 8080
+		self.host = host
+		self.port = int(port)
+		self.pool_size = pool_size
+		self.timeout = timeout
+		self.observer = observer
+		self._idle = []
+		self._lock = threading.Lock()
+
+	def _acquire(self):
+		with self._lock:
+			if self._idle:
+				return self._idle.pop(), True
+		conn = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+		conn.connect()
+		# headers and body go out in separate writes; without this Nagle holds
+		# the body back for a delayed ACK on every kept-alive request
+		conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		return conn, False
+
+	def _release(self, conn):
+		with self._lock:
+			if len(self._idle) < self.pool_size:
+				self._idle.append(conn)
+				return
+		conn.close()
+
+	def _open(self, action, path, body, headers):
+		# a pooled connection the controller has dropped since its last use
+		# is retried on a fresh connection, when the request did not go out or
+		# is safe to repeat: a POST or DELETE whose reply was lost may have been
+		# applied, and the caller has to find out
+		if headers is None:
+			headers = JSON_HEADERS
+		while True:
+			conn, reused = self._acquire()
+			sent = False
+			try:
+				conn.request(action, path, body, headers)
+				sent = True
+				return conn, conn.getresponse()
+			except REQUEST_ERRORS:
+				conn.close()
+				if not reused or (sent and action not in IDEMPOTENT):
+					raise
+
+	def _done(self, conn, response):
+		if response.will_close:
+			conn.close()
+		else:
+			self._release(conn)
+
+	def request(self, action, path, body=None, headers=None):
+		"""
+		Issue one request and return (status, reason, body), the same tuple
+		Forwarding.rest_call has always returned.
+		"""
+		start = monotonic()
+		conn, response = self._open(action, path, body, headers)
+		try:
+			ret = (response.status, response.reason, response.read())
+		except REQUEST_ERRORS:
+			conn.close()
+			raise
+		self._done(conn, response)
+		if self.observer is not None:
+			self.observer(action, path, ret[0], len(body) if body else 0, len(ret[2]), monotonic() - start)
+		return ret
+
+	@contextlib.contextmanager
+	def stream(self, path):
+		"""
+		GET path and yield the response as a file-like object, so a large reply
+		can be decoded while it is read off the socket. The observer's time
+		includes the decoding done inside the with block.
+		"""
+		start = monotonic()
+		conn, response = self._open('GET', path, None, None)
+		reader = _CountingReader(response) if self.observer is not None else response
+		try:
+			yield reader
+			reader.read()						# drain so the connection can be reused
+		except BaseException:
+			conn.close()
+			raise
+		self._done(conn, response)
+		if self.observer is not None:
+			self.observer('GET', path, response.status, 0, reader.count, monotonic() - start)
+
+	def get(self, path):
+		return self.request('GET', path)[2]
+
+	def get_json(self, path):
+		return json.loads(self.get(path))
+
+	def post_json(self, path, data):
+		return self.request('POST', path, json.dumps(data))
+
+	def switches(self):
+		return self.get_json('/wm/core/controller/switches/json')
+
+	def flows(self, dpid='all'):
+		return self.get('/wm/core/switch/%s/flow/json' % dpid)
+
+	def ports(self, dpid='all'):
+		return self.get('/wm/core/switch/%s/port/json' % dpid)
+
+	def stream_flows(self, dpid='all'):
+		return self.stream('/wm/core/switch/%s/flow/json' % dpid)
+
+	def stream_ports(self, dpid='all'):
+		return self.stream('/wm/core/switch/%s/port/json' % dpid)
+
+	def close(self):
+		with self._lock:
+			idle, self._idle = self._idle, []
+		for conn in idle:
+			conn.close()
@@ -0,0 +1,144 @@
+"""
+Multi-process sharded scheduling across ip tuples.
+
+ShardedScheduler spreads the ip tuples of a cycle over `shards` worker
+processes. A tuple always goes to the same shard (crc32 of its key), so a
+shard's IncrementalScheduler sees the same tuples every cycle. Every shard
+plans its tuples against the same port congestion baseline and port
+capacities, taken once per cycle by begin_cycle(), and place_all() merges the shard results into one
+path assignment. With carry_load, load is carried between the tuples of one
+shard only.
+
+With an incremental placement and max_moves, the budget is one for all
+shards: every cycle each shard gets max_moves // shards moves, and the
+remainder goes to the next shards in turn, so --max-moves caps the moves of
+the whole cycle however many shards there are.
+
+The workers are long lived and talk to the parent over a pipe each:
+   ('cycle', baseline, capacity, tuples, moves)   -> ('ok', {key: {group_id: port}})
+   ('forget', keys)
+   ('restore', [(key, groups_path)])
+   ('stop',)
+
+Example:
+   placement = ShardedScheduler(4, {'solver' : 'lpt-ls', 'incremental' : True})
+   placement.begin_cycle(get_port_usages())
+   path_assignment.update(placement.place_all(tuples))
+"""
+
+import multiprocessing
+import traceback
+import zlib
+
+from flowscheduler.placement import make_placement
+
+
+def shard_of(key, shards):
+	"""Stable shard number of a tuple key, the same in every process and cycle"""
+	return (zlib.crc32(str(key).encode('utf-8')) & 0xffffffff) % shards
+
+
+def _worker(conn, options):
+	placement = make_placement(**options)
+	while True:
+		message = conn.recv()
+		if message[0] == 'stop':
+			break
+		if message[0] == 'forget':
+			for key in message[1]:
+				placement.forget(key)
+			continue
+		if message[0] == 'restore':
+			for key, groups_path in message[1]:
+				placement.restore(key, groups_path)
+			continue
+		try:
+			if message[4] is None:
+				placement.begin_cycle(message[1], message[2])
+			else:
+				placement.begin_cycle(message[1], message[2], message[4])
+			conn.send(('ok', placement.place_all(message[3])))
+		except Exception:
+			conn.send(('error', traceback.format_exc()))
+	conn.close()
+
+
+class ShardedScheduler(object):
+	"""Places the tuples of a cycle in `shards` worker processes, see the module docstring"""
+
+	def __init__(self, shards, options=None):
+		self.shards = shards
+		self.options = dict(options or {})
+		self.baseline = {}
+		self.capacity = None
+		self.max_moves = self.options.get('max_moves', 0) if self.options.get('incremental') else 0
+		self.cycles = 0
+		self._forgotten = [[] for i in range(shards)]
+		self._restored = [[] for i in range(shards)]
+		self._conns = []
+		self._workers = []
+		for i in range(shards):
+			parent_conn, child_conn = multiprocessing.Pipe()
+			worker = multiprocessing.Process(target=_worker, args=(child_conn, self.options))
+			worker.daemon = True
+			worker.start()
+			child_conn.close()
+			self._conns.append(parent_conn)
+			self._workers.append(worker)
+
+	def begin_cycle(self, baseline, capacity=None):
+		self.baseline = dict(baseline)
+		self.capacity = capacity
+
+	def _moves(self):
+		# each shard's part of the cycle's move budget, None without one
+		if not self.max_moves:
+			return [None] * self.shards
+		share, remainder = divmod(self.max_moves, self.shards)
+		return [share + (1 if (i - self.cycles) % self.shards < remainder else 0) for i in range(self.shards)]
+
+	def forget(self, key):
+		self._forgotten[shard_of(key, self.shards)].append(key)
+
+	def restore(self, key, groups_path):
+		self._restored[shard_of(key, self.shards)].append((key, groups_path))
+
+	def place_all(self, tuples):
+		"""Place every (key, groups, ports) of `tuples`; returns {key: {group_id: port}}"""
+		shard_tuples = [[] for i in range(self.shards)]
+		for key, groups, ports in tuples:
+			shard_tuples[shard_of(key, self.shards)].append((key, groups, ports))
+		for conn, keys in zip(self._conns, self._forgotten):
+			if keys:
+				conn.send(('forget', keys))
+		self._forgotten = [[] for i in range(self.shards)]
+		for conn, items in zip(self._conns, self._restored):
+			if items:
+				conn.send(('restore', items))
+		self._restored = [[] for i in range(self.shards)]
+		for conn, part, moves in zip(self._conns, shard_tuples, self._moves()):
+			conn.send(('cycle', self.baseline, self.capacity, part, moves))
+		self.cycles += 1
+		path_assignment = {}
+		errors = []
+		for conn in self._conns:
+			status, result = conn.recv()
+			if status == 'ok':
+				path_assignment.update(result)
+			else:
+				errors.append(result)
+		if errors:
+			raise RuntimeError("shard failed:\n%s" % errors[0])
+		return path_assignment
+
+	def close(self):
+		for conn in self._conns:
+			try:
+				conn.send(('stop',))
+				conn.close()
+			except (IOError, OSError):
+				pass
+		for worker in self._workers:
+			worker.join(1.0)
+		self._conns = []
+		self._workers = []
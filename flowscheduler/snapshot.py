@@ -0,0 +1,275 @@
+"""
+Warm restart from a snapshot of the engine's state in a memory-mapped file.
+
+Counter baselines and the path assignment used to live in process memory
+only, so after a restart the first cycle had nothing to subtract the counters
+from: every port and flow came out at rate 0 and the scheduler ran a cycle
+blind. With a Snapshot the engine writes, at the end of every cycle,
+
+   ports        counters, rates and poll time of every port of port_stats
+   flows        the counter columns of each leaf's FlowTable (pair, tcp ports,
+                pkt_count, byte_count, byte_rate, time, live, and the integer
+                addresses of the pairs), copied as they are held in memory
+   assignment   {key: {group_id: port}} of path_assignment
+
+and the next process loads it before its first poll, so that poll already
+yields rates (over the time since the last poll of the previous process) and
+an incremental placement keeps the groups where they were.
+
+The file is mapped once and written through the map; it only grows (to the
+next power of two pages), a cycle costs a copy of the columns and a crc32 and
+no write or fsync call. The page cache keeps it across a crash or restart of
+the process, not of the host. It starts with two slot headers, each holding a
+magic, a sequence number, the offset, length and crc32 of its body, and the
+wall clock and monotonic time of the save. A save writes its body where it
+does not overlap the body of the last save, then the header of the other slot,
+so a save cut short leaves the previous snapshot whole. load takes the newest
+slot whose crc matches; one older than max_age seconds is ignored, and poll
+times are moved onto the loading process's monotonic clock by the wall clock
+time that passed in between. Rate estimators start over.
+
+Columns are stored with their typecode and item size, and a snapshot written
+by a build with other sizes or byte order, or with typecodes this python
+lacks (python 2 has no 'q'/'Q'), is ignored like a stale one.
+
+Example:
+   snapshot = Snapshot('/var/lib/flowsch/leaf0.snapshot', max_age=60)
+   state = snapshot.load()
+   snapshot.save(engine.port_stats, engine.flow_stats, engine.path_assignment, 'tuple', 4)
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from flowscheduler.flowtable import int_to_ip, ip_to_int
+from flowscheduler.poller import monotonic
+from flowscheduler.statsparser import text_type
+
+MAGIC = b'FSCH'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIIIIdd')			# magic, version, 0, sequence, body offset, length and crc32, wall and monotonic time
+DATA = 2 * HEADER.size						# bodies start after the two slot headers
+PORT = struct.Struct('<IIQQQQddd')				# dpid index, port, rx/tx packets and bytes, rx/tx rate, time
+TABLE_COLUMNS = ('pair', 'tcp_src', 'tcp_dst', 'pkt_count', 'byte_count', 'byte_rate', 'time', 'live', 'src_ip', 'dst_ip')
+
+
+def _address(value):
+	# the same string type the stats parser yields, so restored ip tuples key (and print) like parsed ones
+	return text_type(int_to_ip(value))
+
+
+def _to_bytes(column):
+	return column.tobytes() if hasattr(column, 'tobytes') else column.tostring()
+
+
+def _from_bytes(typecode, data):
+	column = array(typecode)
+	if hasattr(column, 'frombytes'):
+		column.frombytes(data)
+	else:
+		column.fromstring(data)
+	return column
+
+
+def _slots(mapped):
+	# (sequence, offset, length, crc, wall, monotonic) of the slots with a header of this version, newest first
+	slots = []
+	for slot in range(2):
+		if len(mapped) < (slot + 1) * HEADER.size:
+			break
+		magic, version, unused, sequence, offset, length, crc, wall, saved_monotonic = HEADER.unpack_from(mapped, slot * HEADER.size)
+		if magic == MAGIC and version == VERSION and offset >= DATA and offset + length <= len(mapped):
+			slots.append((sequence, offset, length, crc, wall, saved_monotonic))
+	slots.sort(reverse=True)
+	return slots
+
+
+def encode(port_stats, flow_stats, path_assignment, mode, num_groups):
+	"""The body of a snapshot: a JSON index line, then the packed sections it describes"""
+	dpids = set(port_stats) | set(flow_stats)
+	if mode == 'switch':
+		dpids.update(path_assignment)				# keyed by leaf dpid
+	dpids = sorted(dpids)
+	index = dict((dpid, i) for i, dpid in enumerate(dpids))
+	sections = []
+	ports = []
+	for dpid in port_stats:
+		for port_number, stat in port_stats[dpid].items():
+			ports.append(PORT.pack(index[dpid], port_number, stat['rx_packets'], stat['rx_bytes'], stat['tx_packets'],
+									stat['tx_bytes'], stat['rx_bytes_rate'], stat['tx_bytes_rate'], stat['time']))
+	sections.append(b''.join(ports))
+	tables = []
+	for dpid in sorted(flow_stats):
+		table = flow_stats[dpid]
+		columns = []
+		for name in TABLE_COLUMNS:
+			column = getattr(table, name)
+			data = _to_bytes(column)
+			columns.append([name, column.typecode, column.itemsize, len(data)])
+			sections.append(data)
+		tables.append([dpid, columns])
+	keys = []
+	groups = []
+	for key, groups_path in path_assignment.items():
+		if mode == 'switch':
+			keys.extend((index[key], 0))
+		else:
+			keys.extend((ip_to_int(key[0]), ip_to_int(key[1])))
+		groups.extend(groups_path.get(i, -1) for i in range(num_groups))
+	sections.append(struct.pack('<%dI' % len(keys), *keys))
+	sections.append(struct.pack('<%di' % len(groups), *groups))
+	head = {'mode' : mode, 'num_groups' : num_groups, 'byteorder' : sys.byteorder, 'dpids' : dpids,
+			'ports' : len(ports), 'tables' : tables, 'assigned' : len(path_assignment)}
+	return json.dumps(head).encode('utf-8') + b'\n' + b''.join(sections)
+
+
+def decode(body, shift=0.0):
+	"""
+	{'mode', 'num_groups', 'ports' : {dpid: {port: stat}}, 'flows' : {dpid: [(ipv4_src,
+	ipv4_dst, tcp_src, tcp_dst, pkt_count, byte_count, byte_rate, time)]}, 'assignment'}
+	of a snapshot body, poll times moved by `shift` seconds; None when it was
+	written with other column typecodes, sizes or byte order.
+	"""
+	newline = body.index(b'\n')
+	head = json.loads(body[:newline].decode('utf-8'))
+	if head['byteorder'] != sys.byteorder:
+		return None
+	dpids = [str(dpid) for dpid in head['dpids']]
+	offset = newline + 1
+	ports = {}
+	for i in range(head['ports']):
+		(dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes,
+			rx_bytes_rate, tx_bytes_rate, when) = PORT.unpack_from(body, offset)
+		offset += PORT.size
+		ports.setdefault(dpids[dpid], {})[port_number] = {'rx_packets' : rx_packets, 'rx_bytes' : rx_bytes,
+												'tx_packets' : tx_packets, 'tx_bytes' : tx_bytes,
+												'rx_packets_diff': 0, 'rx_bytes_diff' : 0, 'tx_packets_diff': 0, 'tx_bytes_diff' : 0,
+												'rx_bytes_rate' : rx_bytes_rate, 'tx_bytes_rate' : tx_bytes_rate, 'time' : when + shift}
+	flows = {}
+	for dpid, columns in head['tables']:
+		table = {}
+		for name, typecode, itemsize, size in columns:
+			try:
+				column = array(str(typecode))
+			except ValueError:						# no 'q'/'Q' on python 2
+				return None
+			if column.itemsize != itemsize:
+				return None
+			table[name] = _from_bytes(str(typecode), body[offset:offset + size])
+			offset += size
+		src_ip = table['src_ip']
+		dst_ip = table['dst_ip']
+		pairs = table['pair']
+		rows = []
+		for row in range(len(table['live'])):
+			if table['live'][row]:
+				pair_id = pairs[row]
+				rows.append((_address(src_ip[pair_id]), _address(dst_ip[pair_id]), table['tcp_src'][row], table['tcp_dst'][row],
+							table['pkt_count'][row], table['byte_count'][row], table['byte_rate'][row], table['time'][row] + shift))
+		flows[str(dpid)] = rows
+	count = head['assigned']
+	num_groups = head['num_groups']
+	keys = struct.unpack_from('<%dI' % (2 * count), body, offset)
+	offset += 8 * count
+	groups = struct.unpack_from('<%di' % (num_groups * count), body, offset)
+	assignment = {}
+	for i in range(count):
+		if head['mode'] == 'switch':
+			key = dpids[keys[2 * i]]
+		else:
+			key = (_address(keys[2 * i]), _address(keys[2 * i + 1]))
+		assignment[key] = dict(enumerate(groups[i * num_groups:(i + 1) * num_groups]))
+	return {'mode' : head['mode'], 'num_groups' : num_groups, 'ports' : ports, 'flows' : flows, 'assignment' : assignment}
+
+
+class Snapshot(object):
+	"""The engine state in a memory-mapped file, see the module docstring"""
+
+	def __init__(self, path, max_age=60.0):
+		self.path = path
+		self.max_age = max_age						# seconds, an older snapshot is not loaded
+		self.saves = 0
+		self.size = 0								# bytes of the last save
+		self._file = None
+		self._map = None
+		self._last = None							# (sequence, offset, length) of the body a save must not overwrite
+
+	def _mapped(self, size):
+		# the file mapped with room for `size` bytes
+		if self._map is not None and len(self._map) >= size:
+			return self._map
+		if self._file is None:
+			self._file = open(self.path, 'r+b' if os.path.exists(self.path) else 'w+b')
+		length = max(os.fstat(self._file.fileno()).st_size, mmap.PAGESIZE)
+		while length < size:
+			length *= 2
+		if self._map is not None:
+			self._map.close()
+		self._file.truncate(length)
+		self._map = mmap.mmap(self._file.fileno(), length)
+		if self._last is None:						# keep the previous process's snapshot until this one has saved
+			slots = _slots(self._map)
+			self._last = slots[0][:3] if slots else (0, DATA, 0)
+		return self._map
+
+	def save(self, port_stats, flow_stats, path_assignment, mode, num_groups):
+		"""Write the state next to the previous snapshot and switch over to it; returns the body's bytes"""
+		body = encode(port_stats, flow_stats, path_assignment, mode, num_groups)
+		mapped = self._mapped(DATA)
+		sequence, offset, length = self._last
+		start = DATA if DATA + len(body) <= offset else offset + length
+		mapped = self._mapped(start + len(body))
+		mapped[start:start + len(body)] = body
+		sequence = (sequence + 1) & 0xffffffff
+		slot = (sequence % 2) * HEADER.size
+		mapped[slot:slot + HEADER.size] = HEADER.pack(MAGIC, VERSION, 0, sequence, start, len(body),
+													zlib.crc32(body) & 0xffffffff, time.time(), monotonic())
+		self._last = (sequence, start, len(body))
+		self.saves += 1
+		self.size = len(body)
+		return self.size
+
+	def load(self, now=None):
+		"""The decode()d snapshot with its 'age' in seconds, None when there is none to trust"""
+		if not os.path.exists(self.path) or os.path.getsize(self.path) < DATA:
+			return None
+		body = None
+		with open(self.path, 'rb') as snapshot_file:
+			mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				for sequence, offset, length, crc, saved_wall, saved_monotonic in _slots(mapped):
+					body = mapped[offset:offset + length]
+					if zlib.crc32(body) & 0xffffffff == crc:
+						break
+					body = None						# a save cut short, fall back to the one before
+			finally:
+				mapped.close()
+		if body is None:
+			return None
+		age = time.time() - saved_wall
+		if age < 0 or (self.max_age and age > self.max_age):
+			return None
+		if now is None:
+			now = monotonic()
+		try:
+			state = decode(body, now - age - saved_monotonic)
+		except (ValueError, struct.error):				# a body this build cannot read, start cold
+			return None
+		if state is not None:
+			state['age'] = age
+		return state
+
+	def close(self):
+		if self._map is not None:
+			self._map.flush()
+			self._map.close()
+			self._map = None
+		if self._file is not None:
+			self._file.close()
+			self._file = None
@@ -0,0 +1,178 @@
+"""
+Group -> port partitioning solvers.
+
+Every solver takes the groups of one ip tuple (group_id -> bytes), its
+candidate ports and their current loads, and returns {group_id: port} trying
+to keep the most loaded port as low as possible:
+
+   greedy     largest group first onto the least loaded port (LPT), what
+              scheduler() has always done
+   kk         Karmarkar-Karp multi-way differencing: repeatedly merge the two
+              partial partitions with the largest spread, big side onto small
+   lpt-ls     LPT followed by local search moving and swapping groups off the
+              most loaded port while that lowers it
+
+solve() gets the cycle deadline (on poller.monotonic) and returns None when it
+ran out of time before producing an assignment; HeapScheduler then falls back
+to its greedy placement for that tuple and every tuple after it this cycle.
+
+When the ports differ in capacity (port -> bytes/sec) greedy and lpt-ls keep
+the highest utilization, load over capacity, as low as possible instead. kk
+partitions into equal shares and has no such form; on ports of mixed speeds
+it places like greedy.
+
+Example:
+   solver = make_solver('lpt-ls')
+   groups_path = solver.solve({0: 120, 1: 80, 2: 75}, [1, 5], {1: 300, 5: 100}, deadline)
+"""
+
+import heapq
+
+from flowscheduler.placement import PortHeap
+from flowscheduler.poller import monotonic
+
+
+def _unique(ports):
+	seen = set()
+	unique = []
+	for port in ports:
+		if port not in seen:
+			seen.add(port)
+			unique.append(port)
+	return unique
+
+
+def _sorted_groups(groups):
+	return sorted(groups.items(), key=lambda x: x[1], reverse=True)
+
+
+class GreedySolver(object):
+	"""Largest group first onto the least loaded port"""
+
+	name = 'greedy'
+
+	def solve(self, groups, ports, loads, deadline=None, capacity=None):
+		heap = PortHeap(ports, loads, capacity)
+		groups_path = {}
+		for group_id, byte_count in _sorted_groups(groups):
+			port = heap.best_port(byte_count)
+			groups_path[group_id] = port
+			heap.add(port, byte_count)
+		return groups_path
+
+
+class DifferencingSolver(object):
+	"""
+	Karmarkar-Karp differencing for k = len(ports) ways.
+	A partial partition is k subsets (sum, group ids, port); the port loads are
+	one more partial partition, so every final subset ends up labelled with
+	exactly one port.
+	"""
+
+	name = 'kk'
+
+	def solve(self, groups, ports, loads, deadline=None, capacity=None):
+		ports = _unique(ports)
+		if capacity and len(set(capacity.get(port) for port in ports)) > 1:
+			return GreedySolver().solve(groups, ports, loads, deadline, capacity)
+		k = len(ports)
+		partitions = []
+		counter = 0
+		baseline = [(loads.get(port, 0), [], port) for port in ports]
+		baseline.sort(key=lambda x: x[0], reverse=True)
+		partitions.append((-(baseline[0][0] - baseline[-1][0]), counter, baseline))
+		for group_id, byte_count in _sorted_groups(groups):
+			counter += 1
+			subsets = [(byte_count, [group_id], None)] + [(0, [], None)] * (k - 1)
+			partitions.append((-byte_count, counter, subsets))
+		heapq.heapify(partitions)
+		while len(partitions) > 1:
+			if deadline is not None and monotonic() > deadline:
+				return None
+			first = heapq.heappop(partitions)[2]
+			second = heapq.heappop(partitions)[2]
+			# largest subset of one with the smallest of the other
+			merged = []
+			for (sum_a, groups_a, port_a), (sum_b, groups_b, port_b) in zip(first, reversed(second)):
+				merged.append((sum_a + sum_b, groups_a + groups_b, port_a if port_a is not None else port_b))
+			merged.sort(key=lambda x: x[0], reverse=True)
+			counter += 1
+			heapq.heappush(partitions, (-(merged[0][0] - merged[-1][0]), counter, merged))
+		groups_path = {}
+		for subset_sum, group_ids, port in partitions[0][2]:
+			for group_id in group_ids:
+				groups_path[group_id] = port
+		return groups_path
+
+
+class LocalSearchSolver(object):
+	"""LPT, then move or swap groups off the most loaded port while that lowers it"""
+
+	name = 'lpt-ls'
+
+	def __init__(self, max_rounds=1000):
+		self.max_rounds = max_rounds
+		self.greedy = GreedySolver()
+
+	def solve(self, groups, ports, loads, deadline=None, capacity=None):
+		ports = _unique(ports)
+		groups_path = self.greedy.solve(groups, ports, loads, capacity=capacity)
+		speed = dict((port, float(capacity[port]) if capacity else 1.0) for port in ports)
+		port_load = dict((port, loads.get(port, 0)) for port in ports)
+		members = dict((port, []) for port in ports)
+		for group_id in groups_path:
+			port_load[groups_path[group_id]] += groups[group_id]
+			members[groups_path[group_id]].append(group_id)
+		for i in range(self.max_rounds):
+			if deadline is not None and monotonic() > deadline:
+				break
+			top = max(ports, key=lambda port: port_load[port] / speed[port])
+			top_peak = port_load[top] / speed[top]
+			best = None							# (new pair maximum, group moved off top, group moved back, port)
+			for port in ports:
+				if port == top:
+					continue
+				for group_id in members[top]:
+					size = groups[group_id]
+					if size <= 0:
+						continue
+					# move
+					peak = max((port_load[top] - size) / speed[top], (port_load[port] + size) / speed[port])
+					if peak < top_peak and (best is None or peak < best[0]):
+						best = (peak, group_id, None, port)
+					# swap with a smaller group
+					for other_id in members[port]:
+						delta = size - groups[other_id]
+						if delta <= 0:
+							continue
+						peak = max((port_load[top] - delta) / speed[top], (port_load[port] + delta) / speed[port])
+						if peak < top_peak and (best is None or peak < best[0]):
+							best = (peak, group_id, other_id, port)
+			if best is None:
+				break
+			peak, group_id, other_id, port = best
+			members[top].remove(group_id)
+			members[port].append(group_id)
+			groups_path[group_id] = port
+			port_load[top] -= groups[group_id]
+			port_load[port] += groups[group_id]
+			if other_id is not None:
+				members[port].remove(other_id)
+				members[top].append(other_id)
+				groups_path[other_id] = top
+				port_load[port] -= groups[other_id]
+				port_load[top] += groups[other_id]
+		return groups_path
+
+
+SOLVERS = {
+	GreedySolver.name : GreedySolver,
+	DifferencingSolver.name : DifferencingSolver,
+	LocalSearchSolver.name : LocalSearchSolver,
+	}
+
+
+def make_solver(name):
+	if name not in SOLVERS:
+		raise ValueError("unknown solver %r, expected one of %s" % (name, ', '.join(sorted(SOLVERS))))
+	return SOLVERS[name]()
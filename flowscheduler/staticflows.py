@@ -0,0 +1,361 @@
+"""
+Exact-match rules through the controller's static flow pusher, kept within
+the switches' table budget.
+
+The path assignment only reaches the switches as hash groups; a flow that has
+to go its own way (an elephant, see flowscheduler.heavyhitters) gets an
+exact-match rule in the scheduler's table 200 instead, the entry addflow() in
+modifytable-leaf*.py pushed by hand: ipv4_src, ipv4_dst, tcp_src and tcp_dst
+(or just the ip pair, for a rule per ip tuple), priority 3 so it wins over the
+group entries, output to the chosen port. Every rule has its own name, so
+rules no longer overwrite each other as the single flow-mod-9 did.
+
+RuleCache keeps the rules the controller acknowledged and sync(wanted) makes
+the switches follow {key: port}:
+
+   - wanted rules that are new or moved are posted, the heaviest first
+   - a rule no longer wanted is not deleted right away but retained, so a
+     flow that comes back (e.g. an elephant around its threshold) finds its
+     rule in place; retained rules go when their switch needs room for a
+     wanted one, the least recently wanted first (lru) or the least often
+     wanted (lfu), or once they have not been wanted for idle_timeout seconds
+   - no switch holds more than `budget` rules; wanted rules beyond it are
+     refused and counted. admit() tells ahead of a sync which of a set of
+     keys would get a rule, so the caller can leave the others in their
+     hash group; a key whose post failed sits out the next admit()
+   - rules carry idle_timeout, so a switch drops the rules of flows that
+     ended on its own, even when the scheduler is gone. A delete the
+     controller answers with 404 (the rule is gone already) counts as done;
+     after any other failed delete the installed rules are reconciled with
+     the controller's list, so rules the switches dropped stop counting
+     against the budget and are not deleted again every sync
+   - the deletes of a sync go out first, then the installs. The static flow
+     pusher takes one entry per request, so there is one request per rule,
+     spread over `workers` threads sharing the client's keep-alive
+     connections; at most max_changes rules change per sync (the rest follow
+     next sync)
+   - full_every resends every wanted rule every N syncs
+   - the first sync adopts the flowsch-* rules already on the controller
+     (e.g. left by a scheduler that did not exit cleanly) as retained rules,
+     so they count against the budget and expire like any other
+
+Example:
+   rules = RuleCache(client, budget=500, policy='lfu', idle_timeout=30)
+   rules.sync({('00:65:5c:8a:38:3e:cd:28', '10.10.1.1', '10.10.2.1', 5001, 80) : 5})
+   rules.clear()
+"""
+
+import json
+import threading
+
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+from flowscheduler.poller import monotonic
+
+STATIC_PATH = '/wm/staticflowpusher/json'
+LIST_PATH = '/wm/staticflowpusher/list/all/json'
+NAME_PREFIX = 'flowsch-'
+PRIORITY = '3'
+POLICIES = ('lru', 'lfu')
+
+
+def entry_name(key):
+	"""Static entry name of a (dpid, ipv4_src, ipv4_dst[, tcp_src, tcp_dst]) key, unique across switches"""
+	return NAME_PREFIX + '-'.join([key[0].replace(':', '')] + [str(field) for field in key[1:]])
+
+
+def flow_entry(key, port, priority=PRIORITY, idle_timeout=0):
+	"""Static flow pusher entry sending the traffic of a (dpid, ipv4_src, ipv4_dst[, tcp_src, tcp_dst]) key out of port"""
+	entry = {'switch' : key[0], 'name' : entry_name(key), 'table' : '200', 'cookie' : '0', 'priority' : priority,
+			'eth_type' : '0x0800', 'ipv4_src' : key[1], 'ipv4_dst' : key[2], 'active' : 'true', 'actions' : 'output=%d' % port}
+	if len(key) == 5:
+		entry.update({'ip_proto' : '0x06', 'tcp_src' : str(key[3]), 'tcp_dst' : str(key[4])})
+	if idle_timeout:
+		entry['idle_timeout'] = str(int(idle_timeout))
+	return entry
+
+
+def entry_key(entry):
+	"""The key of a listed static entry, fields at the top or under "match"; None when it has no ip match"""
+	match = entry.get('match', entry)
+	if 'switch' not in entry or 'ipv4_src' not in match or 'ipv4_dst' not in match:
+		return None
+	key = (str(entry['switch']), str(match['ipv4_src']), str(match['ipv4_dst']))
+	if 'tcp_src' in match and 'tcp_dst' in match:
+		key += (int(match['tcp_src']), int(match['tcp_dst']))
+	return key
+
+
+class _RequestPool(object):
+	"""Runs a batch of REST requests on a few threads and waits for all of them"""
+
+	def __init__(self, client, workers):
+		self.client = client
+		self.workers = workers
+		self._jobs = queue.Queue()
+		self._threads = []
+
+	def _work(self):
+		while True:
+			batch, index, action, body = self._jobs.get()
+			try:
+				status = self.client.request(action, STATIC_PATH, body)[0]
+			except Exception:
+				status = None
+			batch.finish(index, status)
+
+	def run(self, requests):
+		"""[(action, body)] -> [status, None for a request that raised], in order"""
+		if self.workers <= 1 or len(requests) <= 1:
+			statuses = []
+			for action, body in requests:
+				try:
+					statuses.append(self.client.request(action, STATIC_PATH, body)[0])
+				except Exception:
+					statuses.append(None)
+			return statuses
+		if not self._threads:
+			for i in range(self.workers):
+				thread = threading.Thread(target=self._work, name='rule-cache-%d' % i)
+				thread.daemon = True
+				thread.start()
+				self._threads.append(thread)
+		batch = _Batch(len(requests))
+		for index, (action, body) in enumerate(requests):
+			self._jobs.put((batch, index, action, body))
+		batch.done.wait()
+		return batch.statuses
+
+
+class _Batch(object):
+
+	def __init__(self, count):
+		self.statuses = [None] * count
+		self.remaining = count
+		self.lock = threading.Lock()
+		self.done = threading.Event()
+
+	def finish(self, index, status):
+		with self.lock:
+			self.statuses[index] = status
+			self.remaining -= 1
+			if self.remaining == 0:
+				self.done.set()
+
+
+class RuleCache(object):
+	"""Exact-match rules within a per switch budget, see the module docstring"""
+
+	def __init__(self, client, budget=0, policy='lru', idle_timeout=0, workers=1, max_changes=0, full_every=0,
+				priority=PRIORITY, clock=monotonic):
+		if policy not in POLICIES:
+			raise ValueError("unknown eviction policy %r, expected one of %s" % (policy, ', '.join(POLICIES)))
+		self.budget = budget						# rules per switch, 0 is unlimited
+		self.policy = policy
+		self.idle_timeout = idle_timeout			# seconds, 0 keeps retained rules until room is needed
+		self.max_changes = max_changes				# rules posted or deleted per sync, 0 is unlimited
+		self.full_every = full_every				# resend every wanted rule every N syncs (0 = never)
+		self.priority = priority
+		self.clock = clock
+		self.pool = _RequestPool(client, workers)
+		self.installed = {}							# key -> port the controller acknowledged
+		self.per_switch = {}						# dpid -> number of installed rules
+		self.last_wanted = {}						# key -> time it was last wanted (lru, idle_timeout)
+		self.hits = {}								# key -> syncs it was wanted in (lfu)
+		self.wanted = set()
+		self.adopted = None							# rules found on the controller by the first sync
+		self.failing = set()						# keys whose post failed in the last sync
+		self.syncs = 0
+		self.pushed = 0
+		self.deleted = 0
+		self.evicted = 0
+		self.expired = 0
+		self.refused = 0
+		self.failed = 0
+		self.vanished = 0
+
+	def __len__(self):
+		return len(self.installed)
+
+	def _listed(self):
+		# keys of the flowsch-* rules the controller holds, None when it cannot list them
+		try:
+			listing = self.pool.client.get_json(LIST_PATH)
+		except Exception:							# an older controller without the list
+			return None
+		keys = set()
+		for dpid, entries in listing.items():
+			for named in entries:
+				for name, entry in named.items():
+					entry = dict(entry, switch=entry.get('switch', dpid))
+					key = entry_key(entry) if name.startswith(NAME_PREFIX) else None
+					if key is not None and entry_name(key) == name:
+						keys.add(key)
+		return keys
+
+	def adopt(self):
+		"""Take over the flowsch-* rules the controller already holds; returns how many"""
+		self.adopted = 0
+		listed = self._listed()
+		if listed is None:							# start empty
+			return 0
+		now = self.clock()
+		for key in listed:
+			if key in self.installed:
+				continue
+			self.installed[key] = None				# port unknown, posted again if wanted
+			self.per_switch[key[0]] = self.per_switch.get(key[0], 0) + 1
+			self.last_wanted[key] = now
+			self.adopted += 1
+		return self.adopted
+
+	def reconcile(self):
+		"""Forget the installed rules the controller no longer holds (e.g. expired on their switch); returns how many"""
+		listed = self._listed()
+		if listed is None:
+			return 0
+		gone = [key for key in self.installed if key not in listed]
+		for key in gone:
+			self._drop(key)
+		self.vanished += len(gone)
+		return len(gone)
+
+	def admit(self, keys, weights=None):
+		"""
+		The keys of `keys` the next sync would keep or give a rule if they were
+		all wanted, heaviest first by weights {key: rate}: the installed ones
+		and the new ones within the budget and max_changes, except those whose
+		post failed in the last sync. The others are counted as refused.
+		"""
+		keys = [key for key in keys if key not in self.failing]
+		ports = dict((key, self.installed[key] if key in self.installed else -1) for key in keys)
+		deletes, installs, expired, evicted, refused = self._plan(ports, weights, set(keys))
+		self.refused += refused
+		installs = set(installs)
+		return set(key for key in keys if key in self.installed or key in installs)
+
+	def _victims(self, dpid, leaving, wanted):
+		# retained rules of a switch in eviction order, last first so they can be pop()ed
+		retained = [key for key in self.installed if key[0] == dpid and key not in wanted and key not in leaving]
+		if self.policy == 'lfu':
+			retained.sort(key=lambda key: (self.hits.get(key, 0), self.last_wanted.get(key, 0.0)), reverse=True)
+		else:
+			retained.sort(key=lambda key: self.last_wanted.get(key, 0.0), reverse=True)
+		return retained
+
+	def _drop(self, key):
+		del self.installed[key]
+		self.per_switch[key[0]] -= 1
+		self.last_wanted.pop(key, None)
+		self.hits.pop(key, None)
+
+	def _plan(self, ports, weights, wanted):
+		# (deletes, installs, expired, evicted, refused) of a sync, deletes and installs lists of keys
+		now = self.clock()
+		changes = self.max_changes
+		deletes = []
+		if self.idle_timeout:
+			deletes = [key for key in self.installed if key not in wanted
+						and now - self.last_wanted.get(key, now) >= self.idle_timeout]
+			if changes:
+				deletes = deletes[:changes]
+		expired = len(deletes)
+		evicted = 0
+		refused = 0
+		order = sorted(ports, key=lambda key: weights.get(key, 0.0), reverse=True) if weights else list(ports)
+		installs = []
+		leaving = set(deletes)
+		room = {}									# dpid -> free rules after this sync's deletes
+		victims = {}								# dpid -> retained rules left to evict
+		for key in order:
+			if changes and len(deletes) + len(installs) >= changes:
+				break
+			if self.installed.get(key) == ports[key]:
+				continue
+			dpid = key[0]
+			if self.budget and key not in self.installed:
+				if dpid not in room:
+					room[dpid] = self.budget - self.per_switch.get(dpid, 0) + sum(1 for old in leaving if old[0] == dpid)
+				if room[dpid] <= 0:
+					if dpid not in victims:
+						victims[dpid] = self._victims(dpid, leaving, wanted)
+					if not victims[dpid]:
+						refused += 1
+						continue
+					victim = victims[dpid].pop()
+					deletes.append(victim)
+					leaving.add(victim)
+					evicted += 1
+					room[dpid] += 1
+				room[dpid] -= 1
+			installs.append(key)
+		return deletes, installs, expired, evicted, refused
+
+	def sync(self, ports, weights=None):
+		"""
+		Make the switches follow {key: port}; weights {key: rate} orders the
+		installs when not all of them fit. Returns the number of REST calls.
+		"""
+		if self.adopted is None:
+			self.adopt()
+		now = self.clock()
+		self.syncs += 1
+		if self.full_every and self.syncs % self.full_every == 0:
+			for key in ports:
+				if key in self.installed:
+					self.installed[key] = None		# posted again below
+		self.wanted = set(ports)
+		for key in ports:
+			self.last_wanted[key] = now
+			self.hits[key] = self.hits.get(key, 0) + 1
+		deletes, installs, expired, evicted, refused = self._plan(ports, weights, self.wanted)
+		self.expired += expired
+		self.evicted += evicted
+		self.refused += refused
+		if self._delete(deletes):
+			self.reconcile()
+		statuses = self.pool.run([('POST', json.dumps(flow_entry(key, ports[key], self.priority, self.idle_timeout)))
+									for key in installs])
+		self.failing = set()
+		for key, status in zip(installs, statuses):
+			if status != 200:
+				self.failed += 1
+				self.failing.add(key)
+				continue
+			if key not in self.installed:
+				self.per_switch[key[0]] = self.per_switch.get(key[0], 0) + 1
+			self.installed[key] = ports[key]
+			self.pushed += 1
+		# wanted keys without a rule do not need their history
+		for key in ports:
+			if key not in self.installed:
+				self.last_wanted.pop(key, None)
+				self.hits.pop(key, None)
+		return len(deletes) + len(installs)
+
+	def _delete(self, keys):
+		# delete the rules of keys, a 404 means the rule is gone already; returns the number that failed
+		failed = 0
+		statuses = self.pool.run([('DELETE', json.dumps({'name' : entry_name(key)})) for key in keys])
+		for key, status in zip(keys, statuses):
+			if status not in (200, 404):
+				self.failed += 1
+				failed += 1
+				continue
+			self._drop(key)
+			self.deleted += 1
+		return failed
+
+	def clear(self):
+		"""Remove every installed rule"""
+		self.wanted = set()
+		keys = list(self.installed)
+		self._delete(keys)
+		return len(keys)
+
+	def summary(self):
+		return "%d rules, %d pushed, %d deleted, %d evicted, %d expired, %d vanished, %d refused, %d failed" % (
+			len(self.installed), self.pushed, self.deleted, self.evicted, self.expired, self.vanished, self.refused, self.failed)
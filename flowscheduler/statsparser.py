@@ -0,0 +1,181 @@
+"""
+Streaming, field-projecting decoders for the controller's flow and port dumps.
+
+json.loads on a /wm/core/switch/all/flow/json reply builds the whole object
+tree (every flow entry of every table with all its fields) before the first
+entry can be looked at. iter_flows() instead walks the reply one flow entry at
+a time, drops everything outside table 200 right away and yields only the
+fields the scheduler uses, so peak memory stays at one entry plus the read
+buffer however big the flow tables grow. Both take either the reply text or a
+file-like object (e.g. ControllerClient.stream_flows()), and both the single
+switch ({"flows": [...]}) and the all switches ({dpid: {"flows": [...]}})
+shapes of the reply.
+
+Example:
+   for (dpid, ipv4_src, ipv4_dst, tcp_src, tcp_dst, packet_count, byte_count) in iter_flows(flows):
+      ...
+"""
+
+import codecs
+import json
+
+try:
+	text_type = unicode
+except NameError:
+	text_type = str
+
+SCHEDULER_TABLE = "0xc8"			# table id = 200
+MATCH_FIELDS = ('ipv4_src', 'ipv4_dst', 'tcp_src', 'tcp_dst')
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class _Reader(object):
+	"""Just enough of a JSON tokenizer to walk objects and arrays by hand"""
+
+	def __init__(self, source, chunk_size=1 << 16):
+		if isinstance(source, (bytes, text_type)):
+			self.buf = source.decode('utf-8') if isinstance(source, bytes) and bytes is not str else source
+			self.file = None
+		else:
+			self.buf = ''
+			self.file = source
+		self.decoder = codecs.getincrementaldecoder('utf-8')()	# a character may be split across reads
+		self.pos = 0
+		self.chunk_size = chunk_size
+
+	def _fill(self):
+		if self.file is None:
+			return False
+		data = self.file.read(self.chunk_size)
+		if not data:
+			self.file = None
+			return False
+		if isinstance(data, bytes) and bytes is not str:
+			data = self.decoder.decode(data)
+		self.buf = self.buf[self.pos:] + data
+		self.pos = 0
+		return True
+
+	def peek(self):
+		while True:
+			while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+				self.pos += 1
+			if self.pos < len(self.buf):
+				return self.buf[self.pos]
+			if not self._fill():
+				return ''
+
+	def next(self):
+		c = self.peek()
+		if not c:
+			raise ValueError("unexpected end of controller reply")
+		self.pos += 1
+		return c
+
+	def expect(self, char):
+		c = self.next()
+		if c != char:
+			raise ValueError("expected %r in controller reply, found %r" % (char, c))
+
+	def value(self):
+		"""Decode the next complete value"""
+		self.peek()
+		while True:
+			try:
+				value, end = _decoder.raw_decode(self.buf, self.pos)
+			except ValueError:
+				if self._fill():
+					continue
+				raise
+			# a number running into the end of the buffer may continue in the next chunk
+			if end == len(self.buf) and self.file is not None and self._fill():
+				continue
+			self.pos = end
+			return value
+
+	def members(self):
+		"""Yield the keys of the object being read; the caller consumes each value"""
+		self.expect('{')
+		if self.peek() == '}':
+			self.pos += 1
+			return
+		while True:
+			key = self.value()
+			self.expect(':')
+			yield key
+			if self.next() == '}':
+				return
+
+	def items(self):
+		"""Yield the elements of the array being read, one decoded value at a time"""
+		self.expect('[')
+		if self.peek() == ']':
+			self.pos += 1
+			return
+		while True:
+			yield self.value()
+			if self.next() == ']':
+				return
+
+
+def _project_flows(reader, dpid, table_id):
+	for item in reader.items():
+		if item.get('table_id') != table_id:
+			continue
+		match = item.get('match')
+		if not match or 'ipv4_src' not in match or 'ipv4_dst' not in match or 'tcp_src' not in match or 'tcp_dst' not in match:
+			continue
+		yield (dpid, match['ipv4_src'], match['ipv4_dst'], match['tcp_src'], match['tcp_dst'],
+				int(item['packet_count']), int(item['byte_count']))
+
+
+def iter_flows(source, table_id=SCHEDULER_TABLE):
+	"""
+	Yield (dpid, ipv4_src, ipv4_dst, tcp_src, tcp_dst, packet_count, byte_count)
+	for every TCP/IP entry of table `table_id`.
+	dpid is None for a single switch reply.
+	"""
+	reader = _Reader(source)
+	for key in reader.members():
+		if key == 'flows':
+			for flow in _project_flows(reader, None, table_id):
+				yield flow
+			continue
+		for inner_key in reader.members():			# key is a dpid
+			if inner_key == 'flows':
+				for flow in _project_flows(reader, key, table_id):
+					yield flow
+			else:
+				reader.value()
+
+
+def _project_ports(port_reply, dpid):
+	for reply in port_reply:
+		for item in reply.get('port', []):
+			try:
+				port_number = int(item['port_number'])
+			except ValueError:						# "local" and the like
+				continue
+			yield (dpid, port_number, int(item['receive_packets']), int(item['receive_bytes']),
+					int(item['transmit_packets']), int(item['transmit_bytes']))
+
+
+def iter_ports(source):
+	"""
+	Yield (dpid, port_number, rx_packets, rx_bytes, tx_packets, tx_bytes) for
+	every numbered port. dpid is None for a single switch reply.
+	"""
+	reader = _Reader(source)
+	for key in reader.members():
+		if key == 'port_reply':
+			for port in _project_ports(reader.value(), None):
+				yield port
+			continue
+		for inner_key in reader.members():			# key is a dpid
+			if inner_key == 'port_reply':
+				for port in _project_ports(reader.value(), key):
+					yield port
+			else:
+				reader.value()
@@ -0,0 +1,241 @@
+"""
+Leaf-spine topology the scheduler works on.
+
+A Topology lists the leaf switches with their uplink ports and attached hosts,
+and the spines. It replaces the rack_attachments, spine_ports and
+switch_ports tables that used to be hard coded in every flowsch*.py, and is
+read from a JSON file:
+
+   {
+      "leaves": [
+         {"name": "leaf0", "dpid": "00:65:5c:8a:38:3e:cd:28",
+          "uplinks": [1, 5, 33, 37, 65, 69],
+          "speeds": [[1, 40000], [5, 10000]],
+          "hosts": [["10.10.1.1", 9], ["10.10.1.2", 10]]}
+      ],
+      "spines": [{"name": "spine0", "dpid": "00:65:bc:ea:fa:b3:5e:32"}],
+      "links": [["00:65:5c:8a:38:3e:cd:28", 1, "00:65:bc:ea:fa:b3:5e:32", 1]]
+   }
+
+"links" (switch, port, switch, port) is optional; flowscheduler.discovery
+fills it in from the controller. So is "speeds", [port, Mbit/s] of the ports
+whose link speed is known (configured, or learned from the controller's port
+descriptions by discovery); the scheduler weighs the load of those ports by
+their capacity() and treats the others as --link-speed ports. paths(leaf, dst_leaf) is the cached index of
+egress ports towards another leaf: the leaf's ports linked to a spine that
+also links to dst_leaf, or all of its uplinks when no links are known. A
+Topology built with `previous` reuses the index entries of every pair of
+leaves whose spine links did not change.
+
+Candidate ports are looked up in two levels instead of a table per host pair:
+rack(ip) finds a host's leaf in a RackIndex, sorted runs of consecutive
+integer IPs on the same leaf (one run per rack when a rack's hosts are
+numbered in a block, as on the testbed), and ports(src_ip, dst_ip) answers
+with the destination's host port within a rack or paths(src leaf, dst leaf)
+between racks. Memory is linear in hosts, where the per pair table of
+create_iptuple_outputport_comb() grew with hosts squared. tuple_ports(leaf)
+still builds that table for inspection.
+
+Example:
+   topology = Topology.load('topologies/testbed.json')
+   ports = topology.ports('10.10.1.1', '10.10.2.5')			# [1, 5, 33, 37, 65, 69]
+   iptuple_port_dict = topology.tuple_ports(topology.leaf('leaf0'))
+"""
+
+import bisect
+import json
+
+from flowscheduler.flowtable import ip_to_int
+
+
+def link_key(dpid_a, port_a, dpid_b, port_b):
+	"""A link as (dpid, port, dpid, port) with the lower dpid first, the same whichever way it was reported"""
+	if (dpid_b, port_b) < (dpid_a, port_a):
+		return (dpid_b, port_b, dpid_a, port_a)
+	return (dpid_a, port_a, dpid_b, port_b)
+
+
+class Leaf(object):
+	"""A leaf switch: dpid, uplink ports, {host ip: port} and {port: Mbit/s}"""
+
+	def __init__(self, name, dpid, uplinks, hosts, speeds=None):
+		self.name = name
+		self.dpid = dpid
+		self.uplinks = list(uplinks)
+		self.hosts = dict(hosts)
+		self.speeds = dict(speeds or {})
+
+	def capacity(self, port, default=None):
+		"""Bytes/sec a port can send, `default` when its speed is not known"""
+		speed = self.speeds.get(port)
+		return speed * 1e6 / 8 if speed else default
+
+	def ports(self):
+		"""Every port the scheduler sends on: uplinks, then host ports"""
+		return self.uplinks + sorted(self.hosts.values())
+
+	def to_dict(self):
+		data = {'name' : self.name, 'dpid' : self.dpid, 'uplinks' : self.uplinks,
+				'hosts' : sorted(([ip, port] for ip, port in self.hosts.items()), key=lambda host: (host[1], host[0]))}
+		if self.speeds:
+			data['speeds'] = [[port, self.speeds[port]] for port in sorted(self.speeds)]
+		return data
+
+
+class RackIndex(object):
+	"""host ip -> leaf as sorted ranges of consecutive integer IPs, see the module docstring"""
+
+	def __init__(self, leaves=()):
+		hosts = sorted((ip_to_int(ip), i) for i, leaf in enumerate(leaves) for ip in leaf.hosts)
+		self.leaves = list(leaves)
+		self.starts = []							# first ip of each range
+		self.ends = []								# last ip of each range
+		self.racks = []								# index into leaves of each range
+		for ip, i in hosts:
+			if self.ends and ip == self.ends[-1] + 1 and i == self.racks[-1]:
+				self.ends[-1] = ip
+			else:
+				self.starts.append(ip)
+				self.ends.append(ip)
+				self.racks.append(i)
+
+	def __len__(self):
+		return len(self.starts)
+
+	def rack(self, ip):
+		"""The leaf of a host ip (dotted string or int), None for a host outside every range"""
+		if not isinstance(ip, int):
+			ip = ip_to_int(ip)
+		i = bisect.bisect_right(self.starts, ip) - 1
+		if i < 0 or ip > self.ends[i]:
+			return None
+		return self.leaves[self.racks[i]]
+
+
+class Topology(object):
+	"""Leaves and spines of the fabric, see the module docstring"""
+
+	def __init__(self, leaves=(), spines=(), links=(), previous=None):
+		self.leaves = list(leaves)
+		self.spines = list(spines)					# [(name, dpid)]
+		self.links = sorted(set(links))				# [(dpid, port, dpid, port)], lower dpid first
+		self.reindex(previous)
+
+	def reindex(self, previous=None):
+		"""Rebuild the lookup tables after the leaves or links changed"""
+		self.by_name = dict((leaf.name, leaf) for leaf in self.leaves)
+		self.by_dpid = dict((leaf.dpid, leaf) for leaf in self.leaves)
+		self.racks = RackIndex(self.leaves)
+		spine_dpids = set(dpid for name, dpid in self.spines)
+		self.spine_ports = {}						# leaf dpid -> {spine dpid: [leaf port]}
+		for dpid_a, port_a, dpid_b, port_b in self.links:
+			for leaf_dpid, leaf_port, spine_dpid in ((dpid_a, port_a, dpid_b), (dpid_b, port_b, dpid_a)):
+				if leaf_dpid in self.by_dpid and spine_dpid in spine_dpids:
+					self.spine_ports.setdefault(leaf_dpid, {}).setdefault(spine_dpid, []).append(leaf_port)
+		self._paths = {}
+		if previous is not None:
+			# keep the index entries between leaves whose spine links are unchanged
+			unchanged = set(dpid for dpid in self.by_dpid if dpid in previous.by_dpid
+							and self.spine_ports.get(dpid) == previous.spine_ports.get(dpid)
+							and self.by_dpid[dpid].uplinks == previous.by_dpid[dpid].uplinks)
+			for (dpid, dst_dpid), ports in dict(previous._paths).items():		# copied in one step, paths() may be filling it
+				if dpid in unchanged and dst_dpid in unchanged:
+					self._paths[(dpid, dst_dpid)] = ports
+
+	def paths(self, leaf, dst_leaf):
+		"""Egress ports of `leaf` towards `dst_leaf`, see the module docstring"""
+		key = (leaf.dpid, dst_leaf.dpid)
+		ports = self._paths.get(key)
+		if ports is None:
+			spines = self.spine_ports.get(leaf.dpid)
+			dst_spines = self.spine_ports.get(dst_leaf.dpid)
+			if not spines or not dst_spines:
+				ports = leaf.uplinks
+			else:
+				ports = sorted(port for spine in spines if spine in dst_spines for port in spines[spine])
+			self._paths[key] = ports
+		return ports
+
+	def rack(self, ip):
+		"""The leaf a host ip is attached to, None for an unknown host"""
+		try:
+			return self.racks.rack(ip)
+		except ValueError:						# not a dotted quad
+			return None
+
+	def ports(self, src_ip, dst_ip, leaf=None):
+		"""
+		Egress ports on the source host's leaf (or on `leaf`, when given) for a
+		src-dst ip tuple, None when either host is unknown
+		"""
+		if leaf is None:
+			leaf = self.rack(src_ip)
+		dst_leaf = self.rack(dst_ip)
+		if leaf is None or dst_leaf is None or src_ip == dst_ip:
+			return None
+		if dst_leaf is leaf:
+			return [leaf.hosts[dst_ip]]
+		return self.paths(leaf, dst_leaf)
+
+	def leaf(self, name_or_dpid):
+		leaf = self.by_name.get(name_or_dpid) or self.by_dpid.get(name_or_dpid)
+		if leaf is None:
+			raise KeyError("no leaf %r in the topology" % (name_or_dpid,))
+		return leaf
+
+	def tuple_ports(self, leaf):
+		"""{(src ip, dst ip): [port]} for every pair of known hosts sourced on `leaf`, O(hosts^2)"""
+		iptuple_port_dict = {}
+		for src_ip in leaf.hosts:
+			for dst_leaf in self.leaves:
+				for dst_ip in dst_leaf.hosts:
+					if src_ip != dst_ip:
+						iptuple_port_dict[(src_ip, dst_ip)] = self.ports(src_ip, dst_ip, leaf)
+		return iptuple_port_dict
+
+	@classmethod
+	def from_dict(cls, data):
+		leaves = []
+		for i, entry in enumerate(data.get('leaves', [])):
+			hosts = [(str(ip), int(port)) for ip, port in entry.get('hosts', [])]
+			speeds = [(int(port), speed) for port, speed in entry.get('speeds', [])]
+			leaves.append(Leaf(str(entry.get('name', 'leaf%d' % i)), str(entry['dpid']),
+								[int(port) for port in entry.get('uplinks', [])], hosts, speeds))
+		spines = [(str(entry.get('name', 'spine%d' % i)), str(entry['dpid']))
+					for i, entry in enumerate(data.get('spines', []))]
+		links = [link_key(str(a), int(port_a), str(b), int(port_b)) for a, port_a, b, port_b in data.get('links', [])]
+		return cls(leaves, spines, links)
+
+	def to_dict(self):
+		data = {'leaves' : [leaf.to_dict() for leaf in self.leaves],
+				'spines' : [{'name' : name, 'dpid' : dpid} for name, dpid in self.spines]}
+		if self.links:
+			data['links'] = [list(link) for link in self.links]
+		return data
+
+	@classmethod
+	def load(cls, path):
+		with open(path) as f:
+			return cls.from_dict(json.load(f))
+
+	def dumps(self):
+		# one leaf header and one host per line, json.dumps(indent=...) would spread every pair over four
+		data = self.to_dict()
+		leaves = []
+		for leaf in data['leaves']:
+			hosts = ',\n'.join('    %s' % json.dumps(host) for host in leaf['hosts'])
+			speeds = ''
+			if 'speeds' in leaf:
+				speeds = '\n   "speeds": %s,' % json.dumps(leaf['speeds'])
+			leaves.append('  {"name": %s, "dpid": %s, "uplinks": %s,%s\n   "hosts": [\n%s\n   ]}' % (
+				json.dumps(leaf['name']), json.dumps(leaf['dpid']), json.dumps(leaf['uplinks']), speeds, hosts))
+		spines = ',\n'.join('  {"name": %s, "dpid": %s}' % (json.dumps(spine['name']), json.dumps(spine['dpid']))
+							for spine in data['spines'])
+		links = ''
+		if self.links:
+			links = ',\n "links": [\n%s\n ]' % ',\n'.join('  %s' % json.dumps(link) for link in data['links'])
+		return '{\n "leaves": [\n%s\n ],\n "spines": [\n%s\n ]%s\n}\n' % (',\n'.join(leaves), spines, links)
+
+	def save(self, path):
+		with open(path, 'w') as f:
+			f.write(self.dumps())
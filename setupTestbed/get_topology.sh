@@ -4,7 +4,10 @@
 # From the setupTestbed/
 #./get_topology.sh
 
-# run this file, get list of all flows and find output ports for each ip address from there
+# run this file so the controller's device manager sees every host, then write the
+# attachments it learned to a topology file (from the top level directory):
+#   python -m flowscheduler.discovery <controller IP>:8080 --seed topologies/testbed.json --save topologies/testbed.json
+# flowsch*.py --discover also picks up hosts and racks added later on its own
 
 ssh mkunal@128.104.222.247 "sudo screen -d -m iperf -c 10.10.1.1 -n 1k"
 ssh mkunal@128.104.222.248 "sudo screen -d -m iperf -c 10.10.1.1 -n 1k"
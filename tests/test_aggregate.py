@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from flowscheduler import aggregate
+from flowscheduler.aggregate import _group_usage_python, active_groups, group_usage
+from flowscheduler.flowtable import FlowTable, ip_to_int
+
+requires_numpy = pytest.mark.skipif(aggregate.numpy is None, reason='numpy is not installed')
+SHAPES = [(num_groups, with_addresses, by_pair) for num_groups in (2, 4, 10)
+			for with_addresses in (False, True) for by_pair in (True, False)]
+
+
+def make_table(flows=300, seed=1):
+	rand = random.Random(seed)
+	table = FlowTable()
+	for i in range(flows):
+		src = '10.10.1.%d' % rand.randint(1, 16)
+		dst = '10.10.%d.%d' % (rand.randint(2, 4), rand.randint(1, 16))
+		tcp_src = rand.randint(1024, 65535)
+		table.update(src, dst, tcp_src, 80, 1, 1000, 0.0)
+		table.update(src, dst, tcp_src, 80, 2, 1000 + rand.randint(0, 10 ** 6), 1.0)
+	for row in list(table.rows.values())[::7]:		# free rows and released pairs in between
+		table.evict(row)
+	return table
+
+
+def reference(table, num_groups, with_addresses, by_pair):
+	usage = [0.0] * (len(table.pairs) * num_groups if by_pair else num_groups)
+	for row in table.rows.values():
+		src, dst, tcp_src, tcp_dst = table.flow(row)
+		group_id = tcp_src ^ tcp_dst
+		if with_addresses:
+			group_id ^= ip_to_int(src) ^ ip_to_int(dst)
+		group_id %= num_groups
+		usage[table.pair[row] * num_groups + group_id if by_pair else group_id] += table.byte_rate[row]
+	return usage
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_python(shape):
+	table = make_table()
+	assert _group_usage_python(table, *shape) == pytest.approx(reference(table, *shape))
+
+
+@requires_numpy
+@pytest.mark.parametrize('shape', SHAPES)
+def test_numpy_matches_python(shape):
+	table = make_table()
+	vectorized = aggregate._group_usage_numpy(table, *shape)
+	looped = _group_usage_python(table, *shape)
+	assert list(vectorized) == pytest.approx(looped)
+	assert active_groups(vectorized) == active_groups(looped)
+
+
+def test_empty_table():
+	assert list(group_usage(FlowTable(), 4)) == []
+	assert list(group_usage(FlowTable(), 4, by_pair=False)) == [0.0] * 4
+
+
+def test_active_groups():
+	assert active_groups([0.0, 1.5, 0.0, 3.0]) == 2
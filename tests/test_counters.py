@@ -0,0 +1,61 @@
+from flowscheduler.counters import WRAP32, WRAP64, counter_delta, is_reconnect
+from flowscheduler.flowtable import FlowTable
+
+
+def test_ok():
+	assert counter_delta(1500, 1000) == (500, 'ok')
+	assert counter_delta(1500, 1000, 1000) == (500, 'ok')
+
+
+def test_wrap32():
+	assert counter_delta(1000, WRAP32 - 4000) == (5000, 'wrap')
+	assert counter_delta(1000, WRAP32 - 4000, 10000) == (5000, 'wrap')
+
+
+def test_wrap32_beyond_limit():
+	assert counter_delta(1000, WRAP32 - 4000, 2000) == (None, 'reset')
+
+
+def test_wrap64():
+	assert counter_delta(1000, WRAP64 - 4000) == (5000, 'wrap')
+	assert counter_delta(1000, WRAP64 - 4000, 10000) == (5000, 'wrap')
+
+
+def test_reset_low_counter():
+	# a drop from the lower half of the range is a restart, however large the limit
+	assert counter_delta(5000, 1000000000, 40e9 / 8 * 1.5) == (None, 'reset')
+	assert counter_delta(0, 2e8, 10e9 / 8 * 4 * 1.5) == (None, 'reset')
+	assert counter_delta(5000, 1000000000) == (None, 'reset')
+
+
+def test_reset_large_delta():
+	assert counter_delta(WRAP32 - 1, WRAP32 - 2) == (1, 'ok')
+	assert counter_delta(WRAP32 // 2, WRAP32 // 2 + 10) == (None, 'reset')
+
+
+def test_reset_64bit_only():
+	assert counter_delta(1000, WRAP32 - 4000, widths=(WRAP64,)) == (None, 'reset')
+	assert counter_delta(1000, WRAP64 - 4000, widths=(WRAP64,)) == (5000, 'wrap')
+
+
+def test_jump():
+	assert counter_delta(10 ** 12, 1000, 10 ** 9) == (None, 'jump')
+	assert counter_delta(10 ** 12, 1000) == (10 ** 12 - 1000, 'ok')
+
+
+def test_reconnect():
+	assert is_reconnect(3, 4)
+	assert is_reconnect(2, 4)
+	assert not is_reconnect(1, 4)
+	assert not is_reconnect(0, 0)
+
+
+def test_flow_counters_never_wrap_at_32_bits():
+	table = FlowTable(max_rate=10e9 / 8)
+	row = table.update('10.10.1.1', '10.10.2.1', 5001, 80, 10, WRAP32 - 4000, 0.0)
+	table.byte_rate[row] = 1000.0
+	table.update('10.10.1.1', '10.10.2.1', 5001, 80, 20, 1000, 1.0)
+	assert table.anomalies['reset'] == 1
+	assert table.anomalies['wrap'] == 0
+	assert table.byte_rate[row] == 1000.0
+	assert table.byte_count[row] == 1000
@@ -0,0 +1,151 @@
+from flowscheduler.discovery import (DEVICE_PATH, PORT_DESC_PATH, HostCache, TopologyWatcher, build_topology, classify,
+									parse_devices, parse_links, parse_port_speeds, switch_dpids)
+from flowscheduler.topology import Leaf, Topology
+
+LEAF1 = '00:00:00:00:00:00:00:01'
+LEAF2 = '00:00:00:00:00:00:00:02'
+SPINE1 = '00:00:00:00:00:00:00:11'
+SPINE2 = '00:00:00:00:00:00:00:12'
+
+SWITCHES = [{'switchDPID' : SPINE2}, {'switchDPID' : LEAF1}, {'dpid' : LEAF2}, {'switchDPID' : SPINE1}]
+
+
+def link(src, src_port, dst, dst_port):
+	return {'src-switch' : src, 'src-port' : src_port, 'dst-switch' : dst, 'dst-port' : dst_port, 'type' : 'internal'}
+
+
+# every leaf port 1 to spine 1 and port 2 to spine 2, reported from both ends
+LINKS = [link(LEAF1, 1, SPINE1, 1), link(SPINE1, 1, LEAF1, 1), link(LEAF1, 2, SPINE2, 1), link(SPINE2, 1, LEAF1, 2),
+		link(LEAF2, 1, SPINE1, 2), link(SPINE1, 2, LEAF2, 1), link(SPINE2, 2, LEAF2, 2), link(LEAF2, 2, SPINE2, 2)]
+
+
+def device(ips, dpid=None, port=None):
+	return {'ipv4' : ips, 'attachmentPoint' : [{'switch' : dpid, 'port' : port}] if dpid else []}
+
+
+DEVICES = [device(['10.0.1.1'], LEAF1, 10), device(['10.0.1.2', '10.0.1.3'], LEAF1, 11), device(['10.0.2.1'], LEAF2, '10'),
+			device(['10.0.9.9'], SPINE1, 1),						# a host seen through a leaf's uplink
+			device([], LEAF2, 12), device(['10.0.2.9']), device(['10.0.2.8'], LEAF2, 'local')]
+
+
+def test_switches_and_links():
+	assert switch_dpids(SWITCHES) == [LEAF1, LEAF2, SPINE1, SPINE2]
+	assert parse_links(LINKS) == set([(LEAF1, 1, SPINE1, 1), (LEAF1, 2, SPINE2, 1), (LEAF2, 1, SPINE1, 2), (LEAF2, 2, SPINE2, 2)])
+
+
+def test_parse_devices():
+	expected = {'10.0.1.1' : (LEAF1, 10), '10.0.1.2' : (LEAF1, 11), '10.0.1.3' : (LEAF1, 11), '10.0.2.1' : (LEAF2, 10),
+				'10.0.9.9' : (SPINE1, 1)}
+	assert parse_devices(DEVICES) == expected
+	assert parse_devices({'devices' : DEVICES}) == expected
+	assert parse_devices({}) == {}
+
+
+def test_parse_port_speeds():
+	reply = {LEAF1 : {'portDesc' : [{'portNumber' : '1', 'currSpeed' : '40000000'}, {'portNumber' : '2', 'currSpeed' : '2500'},
+									{'portNumber' : 'local', 'currSpeed' : '0'}, {'portNumber' : '3', 'currSpeed' : '0'}]},
+			LEAF2 : {'port_desc' : [{'port_number' : 1, 'curr_speed' : 10000000}]}, 'version' : 'OF_13'}
+	assert parse_port_speeds(reply) == {LEAF1 : {1 : 40000, 2 : 2.5}, LEAF2 : {1 : 10000}}
+
+
+def test_classify():
+	dpids = switch_dpids(SWITCHES)
+	links = parse_links(LINKS)
+	# a tie between the sides, the lowest dpid's side are the leaves
+	assert classify(dpids, links) == (set([LEAF1, LEAF2]), set([SPINE1, SPINE2]))
+	# hosts on the other side turn it around, as does a seed naming a spine
+	assert classify(dpids, links, host_switches=[SPINE2]) == (set([SPINE1, SPINE2]), set([LEAF1, LEAF2]))
+	seed = Topology([], [('spine0', LEAF2)])
+	assert classify(dpids, links, seed) == (set([SPINE1, SPINE2]), set([LEAF1, LEAF2]))
+	# a switch without links is a leaf unless the seed says otherwise
+	lone = '00:00:00:00:00:00:00:99'
+	assert classify(dpids + [lone], links) == (set([LEAF1, LEAF2, lone]), set([SPINE1, SPINE2]))
+	assert classify([lone], [], Topology([], [('spine9', lone)])) == (set(), set([lone]))
+
+
+def test_classify_larger_side():
+	# three leaves on two spines, the leaves hold the higher dpids this time
+	leaves = ['00:00:00:00:00:00:00:2%d' % i for i in range(3)]
+	links = set()
+	for i, leaf in enumerate(leaves):
+		links.add((SPINE1, 1 + i, leaf, 1))
+		links.add((SPINE2, 1 + i, leaf, 2))
+	assert classify([SPINE1, SPINE2] + leaves, links) == (set(leaves), set([SPINE1, SPINE2]))
+
+
+def test_host_cache():
+	hosts = HostCache()
+	assert hosts.update(parse_devices(DEVICES)) == set([LEAF1, LEAF2, SPINE1])
+	assert hosts.by_switch[LEAF1] == {'10.0.1.1' : 10, '10.0.1.2' : 11, '10.0.1.3' : 11}
+	assert hosts.update(parse_devices(DEVICES)) == set()
+	moved = dict(hosts.attachments)
+	moved['10.0.1.3'] = (LEAF2, 11)
+	assert hosts.update(moved) == set([LEAF1, LEAF2])
+	assert hosts.by_switch[LEAF2] == {'10.0.2.1' : 10, '10.0.1.3' : 11}
+	del moved['10.0.9.9']
+	assert hosts.update(moved) == set([SPINE1])
+	assert SPINE1 not in hosts.by_switch
+	assert hosts.update({}) == set([LEAF1, LEAF2])
+	assert hosts.attachments == {}
+	assert hosts.by_switch == {}
+
+
+def test_build_topology():
+	hosts = HostCache()
+	hosts.update(parse_devices(DEVICES))
+	topology = build_topology(switch_dpids(SWITCHES), parse_links(LINKS), hosts=hosts, speeds={LEAF1 : {1 : 40000}})
+	assert [(leaf.name, leaf.uplinks, leaf.hosts) for leaf in topology.leaves] == [
+		(LEAF1, [1, 2], {'10.0.1.1' : 10, '10.0.1.2' : 11, '10.0.1.3' : 11}), (LEAF2, [1, 2], {'10.0.2.1' : 10})]
+	assert topology.spines == [(SPINE1, SPINE1), (SPINE2, SPINE2)]
+	assert topology.leaf(LEAF1).speeds == {1 : 40000}
+	assert topology.ports('10.0.1.1', '10.0.2.1') == [1, 2]
+	assert topology.ports('10.0.1.1', '10.0.1.2') == [11]
+	assert topology.rack('10.0.9.9') is None
+
+
+def test_build_topology_from_seed():
+	seed = Topology([Leaf('leaf0', LEAF1, [1, 2], [('10.0.1.1', 9), ('10.0.1.7', 17)], [(2, 10000)]),
+					Leaf('leaf1', LEAF2, [1, 2, 3], [('10.0.2.7', 17)])], [('spine0', SPINE1)])
+	hosts = HostCache()
+	hosts.update(parse_devices(DEVICES))
+	links = parse_links(LINKS[:6])						# leaf2 lost its link to spine 2
+	topology = build_topology(switch_dpids(SWITCHES), links, seed, hosts=hosts, speeds={LEAF1 : {1 : 40000, 2 : 40000}})
+	leaf0 = topology.leaf('leaf0')
+	leaf1 = topology.leaf('leaf1')
+	assert topology.spines == [('spine0', SPINE1), (SPINE2, SPINE2)]
+	assert leaf0.hosts == {'10.0.1.1' : 10, '10.0.1.2' : 11, '10.0.1.3' : 11, '10.0.1.7' : 17}		# 10.0.1.1 moved
+	assert leaf0.speeds == {1 : 40000, 2 : 10000}
+	assert leaf1.uplinks == [1]
+	assert leaf1.hosts == {'10.0.2.1' : 10, '10.0.2.7' : 17}
+	assert topology.ports('10.0.1.1', '10.0.2.1') == [1]
+	assert topology.ports('10.0.2.1', '10.0.1.1') == [1]
+
+
+class FakeClient(object):
+
+	def __init__(self, devices):
+		self.devices = devices
+
+	def switches(self):
+		return SWITCHES
+
+	def get_json(self, path):
+		if path == DEVICE_PATH:
+			return {'devices' : self.devices}
+		if path == PORT_DESC_PATH:
+			raise IOError('404 Not Found')
+		return LINKS
+
+
+def test_watcher_refresh():
+	client = FakeClient(DEVICES)
+	watcher = TopologyWatcher(client)
+	assert watcher.refresh()
+	topology = watcher.topology
+	assert [leaf.dpid for leaf in topology.leaves] == [LEAF1, LEAF2]
+	assert not watcher.refresh()
+	assert watcher.topology is topology
+	client.devices = DEVICES + [device(['10.0.2.2'], LEAF2, 11)]
+	assert watcher.refresh()
+	assert watcher.topology.rack('10.0.2.2') is watcher.topology.leaf(LEAF2)
+	assert (watcher.version, watcher.refreshes) == (2, 3)
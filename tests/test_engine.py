@@ -0,0 +1,35 @@
+import json
+
+from flowscheduler.engine import Forwarding, build_parser, convert_to_json, parse_args
+
+
+def test_leaf_defaults():
+	args = parse_args(build_parser(), ['localhost:8080', '4'], topology='testbed.json', leaves=['leaf0'])
+	assert args.leaves == ['leaf0']
+	assert args.topology == 'testbed.json'
+	args = parse_args(build_parser(), ['localhost:8080', '4', '--leaf', 'leaf1'], leaves=['leaf0'])
+	assert args.leaves == ['leaf1']
+	args = parse_args(build_parser(), ['localhost:8080', '4', '--leaf', 'leaf1', '--leaf', 'leaf0'], leaves=['leaf0'])
+	assert args.leaves == ['leaf1', 'leaf0']
+	assert parse_args(build_parser(), ['localhost:8080', '4']).leaves is None
+
+
+class RecordingClient(object):
+
+	def __init__(self):
+		self.requests = []
+
+	def request(self, action, path, body=None, headers=None):
+		self.requests.append((action, path, body))
+		return (204, 'No Content', '{}')
+
+
+def test_forwarding_body_is_encoded_once():
+	client = RecordingClient()
+	assignment = {('10.10.1.1', '10.10.2.1') : {0 : 3, 1 : 5}}
+	assert Forwarding(client).set(convert_to_json(assignment))
+	action, path, body = client.requests[0]
+	assert (action, path) == ('POST', '/wm/forwarding/json')
+	assert json.loads(body) == {"('10.10.1.1', '10.10.2.1')" : {'0' : 3, '1' : 5}}
+	Forwarding(client).set({'00:00:00:00:00:00:00:01' : {0 : 1}})
+	assert json.loads(client.requests[1][2]) == {'00:00:00:00:00:00:00:01' : {'0' : 1}}
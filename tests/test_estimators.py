@@ -0,0 +1,76 @@
+import math
+
+import pytest
+
+from flowscheduler.estimators import EwmaEstimator, KeyedEstimator, PeakHoldEstimator, WindowEstimator, make_estimator
+
+
+def feed(estimator, samples, slot=0):
+	return [estimator.update(slot, sample, now) for now, sample in samples]
+
+
+def test_ewma():
+	estimates = feed(EwmaEstimator(tau=2.0), [(0.0, 100.0), (2.0, 0.0), (4.0, 0.0), (6.0, 200.0)])
+	expected = [100.0, 100.0 / math.e, 100.0 / math.e ** 2]
+	expected.append(expected[-1] + (1 - 1 / math.e) * (200.0 - expected[-1]))
+	assert estimates == pytest.approx(expected)
+
+
+def test_ewma_weighs_by_elapsed_time():
+	regular = feed(EwmaEstimator(tau=3.0), [(0.0, 0.0), (1.0, 90.0), (2.0, 90.0)])
+	irregular = feed(EwmaEstimator(tau=3.0), [(0.0, 0.0), (2.0, 90.0)])
+	assert regular[-1] == pytest.approx(irregular[-1])
+
+
+def test_ewma_without_tau_is_raw():
+	assert feed(EwmaEstimator(tau=0), [(0.0, 5.0), (1.0, 7.0), (2.0, 1.0)]) == [5.0, 7.0, 1.0]
+
+
+def test_window():
+	estimates = feed(WindowEstimator(window=3), [(0.0, 50.0), (1.0, 10.0), (2.0, 20.0), (4.0, 60.0), (5.0, 0.0)])
+	# time weighted mean of the last 3 samples after the first
+	assert estimates == pytest.approx([50.0, 10.0, 15.0, (10 + 20 + 120) / 4.0, (20 + 120 + 0) / 4.0])
+
+
+def test_window_keeps_slots_apart():
+	estimator = WindowEstimator(window=2)
+	feed(estimator, [(0.0, 1.0), (1.0, 3.0)], slot=2)
+	feed(estimator, [(0.0, 100.0), (1.0, 300.0)], slot=0)
+	assert estimator.estimate(2) == 3.0
+	assert estimator.estimate(0) == 300.0
+	assert estimator.estimate(1) == 0.0
+
+
+def test_peak_hold():
+	estimates = feed(PeakHoldEstimator(tau=1.0), [(0.0, 100.0), (1.0, 20.0), (2.0, 50.0), (3.0, 10.0)])
+	assert estimates == pytest.approx([100.0, 100.0 / math.e, 50.0, 50.0 / math.e])
+
+
+def test_reset_starts_over():
+	for estimator in (EwmaEstimator(), WindowEstimator(), PeakHoldEstimator()):
+		feed(estimator, [(0.0, 1000.0), (1.0, 1000.0)])
+		estimator.reset(0)
+		assert estimator.estimate(0) == 0.0
+		assert estimator.update(0, 7.0, 2.0) == 7.0
+
+
+def test_keyed():
+	rates = KeyedEstimator(PeakHoldEstimator(tau=1.0))
+	assert rates.update(('s1', 1), 100.0, 0.0) == 100.0
+	assert rates.update(('s1', 2), 10.0, 0.0) == 10.0
+	assert rates.update(('s1', 1), 0.0, 1.0) == pytest.approx(100.0 / math.e)
+	assert rates.estimate(('s1', 3)) == 0.0
+	rates.forget(('s1', 1))
+	assert len(rates) == 1
+	assert rates.estimate(('s1', 1)) == 0.0
+	assert rates.update(('s1', 3), 5.0, 2.0) == 5.0		# reuses the freed slot, without its history
+	assert rates.estimate(('s1', 2)) == 10.0
+	rates.forget(('s1', 4))
+
+
+def test_make_estimator():
+	assert make_estimator('raw') is None
+	assert make_estimator('window', window=7).window == 7
+	assert make_estimator('ewma', tau=2.5).tau == 2.5
+	with pytest.raises(ValueError):
+		make_estimator('median')
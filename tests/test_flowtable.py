@@ -0,0 +1,164 @@
+from flowscheduler.counters import WRAP32, WRAP64
+from flowscheduler.flowtable import FlowTable, int_to_ip, ip_to_int
+
+SRC = '10.10.1.1'
+DST = '10.10.2.1'
+
+
+class RecordingEstimator(object):
+	"""Doubles every rate and records the rows it was reset for"""
+
+	def __init__(self):
+		self.resets = []
+
+	def update(self, row, rate, now):
+		return rate * 2
+
+	def reset(self, row):
+		self.resets.append(row)
+
+
+def test_addresses():
+	assert ip_to_int('10.10.1.1') == 0x0a0a0101
+	assert int_to_ip(0x0a0a0101) == '10.10.1.1'
+
+
+def test_columns():
+	table = FlowTable()
+	row = table.update(SRC, DST, '5001', '80', 10, 15000, 1.0)
+	assert table.stat(row) == {'pkt_count' : 10, 'pkt_diff' : 0, 'byte_count' : 15000, 'byte_diff' : 0, 'byte_rate' : 0.0, 'time' : 1.0}
+	assert table.update(SRC, DST, 5001, 80, 30, 45000, 3.0) == row
+	assert table.stat(row) == {'pkt_count' : 30, 'pkt_diff' : 20, 'byte_count' : 45000, 'byte_diff' : 30000, 'byte_rate' : 15000.0, 'time' : 3.0}
+	assert table.flow(row) == (SRC, DST, 5001, 80)
+	assert table.ip_tuple(row) == (SRC, DST)
+	other = table.update(SRC, DST, 5002, 80, 1, 1500, 3.0)
+	assert other != row
+	assert table.pair[other] == table.pair[row]
+	assert len(table) == 2
+	assert table.gauges()['ip_tuples'] == 1
+
+
+def test_large_counters():
+	table = FlowTable()
+	row = table.update(SRC, DST, 5001, 80, 1, WRAP32 + 1000, 0.0)
+	table.update(SRC, DST, 5001, 80, 2, WRAP32 + 3000, 1.0)
+	assert table.byte_count[row] == WRAP32 + 3000
+	assert table.byte_rate[row] == 2000.0
+
+
+def test_reinsert_reuses_the_row():
+	estimator = RecordingEstimator()
+	table = FlowTable(estimator)
+	row = table.update(SRC, DST, 5001, 80, 10, 15000, 0.0)
+	table.update(SRC, DST, 5001, 80, 20, 30000, 1.0)
+	assert table.byte_rate[row] == 30000.0
+	assert table.evict(row) == (SRC, DST)
+	assert len(table) == 0
+	assert table.pairs[0] is None
+	again = table.update('10.10.1.2', DST, 6000, 443, 5, 500, 2.0)
+	assert again == row
+	assert estimator.resets == [row, row]
+	assert table.flow(again) == ('10.10.1.2', DST, 6000, 443)
+	assert table.stat(again)['byte_diff'] == 0
+	assert table.byte_rate[again] == 0.0
+	table.update('10.10.1.2', DST, 6000, 443, 6, 1500, 3.0)
+	assert table.byte_rate[again] == 2000.0
+
+
+def test_restore():
+	table = FlowTable()
+	row = table.restore(SRC, DST, 5001, 80, 10, 15000, 1234.0, 5.0)
+	assert table.byte_rate[row] == 1234.0
+	table.update(SRC, DST, 5001, 80, 20, 25000, 7.0)
+	assert table.byte_diff[row] == 10000
+	assert table.byte_rate[row] == 5000.0
+
+
+def test_reset_keeps_the_rate():
+	table = FlowTable()
+	row = table.update(SRC, DST, 5001, 80, 10, 15000, 0.0)
+	table.update(SRC, DST, 5001, 80, 20, 25000, 1.0)
+	table.update(SRC, DST, 5001, 80, 1, 500, 2.0)
+	assert table.anomalies['reset'] == 1
+	assert table.byte_rate[row] == 10000.0
+	assert table.byte_count[row] == 500
+	table.update(SRC, DST, 5001, 80, 2, 1500, 3.0)
+	assert table.byte_rate[row] == 1000.0
+
+
+def test_jump_keeps_the_rate():
+	table = FlowTable(max_rate=1e6)
+	row = table.update(SRC, DST, 5001, 80, 10, 15000, 0.0)
+	table.update(SRC, DST, 5001, 80, 20, 25000, 1.0)
+	table.update(SRC, DST, 5001, 80, 30, 10 ** 12, 2.0)
+	assert table.anomalies['jump'] == 1
+	assert table.byte_rate[row] == 10000.0
+
+
+def test_wrap64_is_repaired():
+	table = FlowTable(max_rate=1e6)
+	row = table.update(SRC, DST, 5001, 80, 10, WRAP64 - 1000, 0.0)
+	table.update(SRC, DST, 5001, 80, 20, 3000, 1.0)
+	assert table.anomalies['wrap'] == 1
+	assert table.byte_rate[row] == 4000.0
+
+
+def test_idle_flows_are_evicted():
+	table = FlowTable()
+	busy = table.update(SRC, DST, 5001, 80, 1, 1000, 0.0)
+	idle = table.update(SRC, DST, 5002, 80, 1, 1000, 0.0)
+	assert table.end_cycle(max_idle=3) == []
+	for cycle in range(1, 4):
+		table.update(SRC, DST, 5001, 80, 1 + cycle, 1000 * (cycle + 1), float(cycle))
+		table.update(SRC, DST, 5002, 80, 1, 1000, float(cycle))
+		dead = table.end_cycle(max_idle=3)
+		assert dead == []							# the pair keeps a flow
+	assert table.live[busy] == 1
+	assert table.live[idle] == 0
+	assert table.evicted == 1
+	assert len(table) == 1
+
+
+def test_evicted_pair_is_returned():
+	table = FlowTable()
+	table.update(SRC, DST, 5001, 80, 1, 1000, 0.0)
+	dead = []
+	for cycle in range(4):
+		dead += table.end_cycle(max_idle=2)
+	assert dead == [(SRC, DST)]
+	assert len(table) == 0
+	assert table.gauges()['ip_tuples'] == 0
+
+
+def test_evict_then_reinsert():
+	table = FlowTable()
+	row = table.update(SRC, DST, 5001, 80, 1, 1000, 0.0)
+	for cycle in range(3):
+		table.end_cycle(max_idle=2)
+	assert len(table) == 0
+	again = table.update(SRC, DST, 5001, 80, 5, 5000, 10.0)
+	assert again == row
+	assert table.byte_diff[again] == 0
+	table.update(SRC, DST, 5001, 80, 6, 6000, 11.0)
+	assert table.byte_rate[again] == 1000.0
+	for cycle in range(2):
+		assert table.end_cycle(max_idle=2) == []	# the old wheel entry does not evict the new flow
+	assert table.live[again] == 1
+
+
+def test_missing_flow_drops_to_zero():
+	table = FlowTable()
+	row = table.update(SRC, DST, 5001, 80, 1, 1000, 0.0)
+	table.update(SRC, DST, 5001, 80, 2, 3000, 1.0)
+	table.end_cycle()
+	table.end_cycle()								# not in this cycle's dump
+	assert table.byte_rate[row] == 0.0
+	assert table.live[row] == 1
+
+
+def test_no_eviction_without_max_idle():
+	table = FlowTable()
+	table.update(SRC, DST, 5001, 80, 1, 1000, 0.0)
+	for cycle in range(100):
+		table.end_cycle(0)
+	assert len(table) == 1
@@ -0,0 +1,51 @@
+from flowscheduler.incremental import IncrementalScheduler
+from flowscheduler.placement import HeapScheduler
+
+
+class CountingScheduler(HeapScheduler):
+
+	def __init__(self):
+		HeapScheduler.__init__(self)
+		self.plans = 0
+
+	def plan(self, groups, ports):
+		self.plans += 1
+		return HeapScheduler.plan(self, groups, ports)
+
+
+def run(placement, cycles, ports=(1, 2)):
+	plans = []
+	for groups in cycles:
+		placement.begin_cycle(dict((port, 0) for port in ports))
+		before = placement.placement.plans
+		placement.place(groups, list(ports), ('10.10.1.1', '10.10.2.1'))
+		plans.append(placement.placement.plans - before)
+	return plans
+
+
+def test_steady_traffic_is_not_planned_again():
+	placement = IncrementalScheduler(CountingScheduler(), threshold=0.1, hysteresis=0.05)
+	groups = {0 : 100, 1 : 300, 2 : 200, 3 : 400}
+	plans = run(placement, [groups] * 5)
+	assert plans[1:] == [0, 0, 0, 0]
+
+
+def test_kept_placement_becomes_the_reference():
+	placement = IncrementalScheduler(CountingScheduler(), threshold=0.1, hysteresis=0.05)
+	first = {0 : 100, 1 : 100, 2 : 100, 3 : 100}
+	second = {0 : 100, 1 : 110, 2 : 100, 3 : 150}		# moved, but a new plan is no better
+	plans = run(placement, [first, second, second, second])
+	assert plans[1] == 1
+	assert plans[2:] == [0, 0]
+	assert placement.kept == 1
+
+
+def test_idle_first_sample_is_no_reference():
+	placement = IncrementalScheduler(CountingScheduler(), threshold=0.1, hysteresis=0.05)
+	idle = {0 : 0, 1 : 0, 2 : 0, 3 : 0}
+	busy = {0 : 100, 1 : 300, 2 : 200, 3 : 400}
+	plans = run(placement, [idle, idle, busy, busy, busy])
+	assert placement.planned[('10.10.1.1', '10.10.2.1')] == busy
+	assert plans[1] == 0
+	assert plans[2] == 1
+	assert plans[3:] == [0, 0]
@@ -0,0 +1,79 @@
+import random
+
+from flowscheduler.placement import HeapScheduler, PortHeap
+
+
+def linear_scan(groups, ports, baseline):
+	# scheduler() of the flowsch scripts before the heap: largest group first onto the first least loaded port
+	port_congestion = dict(baseline)
+	groups_path = {}
+	for group_id, byte_count in sorted(groups.items(), key=lambda x: x[1], reverse=True):
+		min_value = 99999999999999999999
+		min_port = -1
+		for port in ports:
+			if port not in port_congestion:
+				port_congestion[port] = 0
+			if port_congestion[port] < min_value:
+				min_value = port_congestion[port]
+				min_port = port
+		groups_path[group_id] = min_port
+		port_congestion[min_port] += byte_count
+	return groups_path
+
+
+def cases(count=300, seed=1):
+	rand = random.Random(seed)
+	for i in range(count):
+		ports = rand.sample(range(1, 13), rand.randint(1, 6))
+		baseline = dict((port, rand.choice([0, 0, 10, 50, 100])) for port in range(1, 13) if rand.random() < 0.8)
+		groups = dict((group_id, rand.choice([0, 5, 10, 10, 40, 100])) for group_id in range(rand.randint(1, 10)))
+		yield groups, ports, baseline
+
+
+def test_same_port_as_the_linear_scan():
+	for groups, ports, baseline in cases():
+		placement = HeapScheduler()
+		placement.begin_cycle(baseline)
+		assert placement.place(groups, ports) == linear_scan(groups, ports, baseline)
+
+
+def test_every_tuple_starts_from_the_baseline():
+	placement = HeapScheduler()
+	placement.begin_cycle({1 : 0, 2 : 0})
+	assert placement.place({0 : 100}, [1, 2]) == {0 : 1}
+	assert placement.place({0 : 100}, [1, 2]) == {0 : 1}
+
+
+def test_carry_load():
+	placement = HeapScheduler(carry_load=True)
+	placement.begin_cycle({1 : 0, 2 : 0, 3 : 0})
+	assert placement.place({0 : 100}, [1, 2]) == {0 : 1}
+	assert placement.place({0 : 100}, [1, 2]) == {0 : 2}
+	assert placement.place({0 : 10}, [1, 3]) == {0 : 3}
+	assert placement.port_loads([1, 2, 3]) == {1 : 100, 2 : 100, 3 : 10}
+
+
+def test_no_candidate_ports():
+	placement = HeapScheduler()
+	placement.begin_cycle({})
+	assert placement.place({0 : 10, 1 : 20}, []) == {0 : -1, 1 : -1}
+
+
+def test_heap_order():
+	heap = PortHeap([3, 1, 2], {1 : 50, 2 : 50, 3 : 80})
+	assert heap.min_port() == 1						# ties go to the first listed port
+	heap.add(1, 10)
+	assert heap.min_port() == 2
+	heap.add(3, -70)
+	assert heap.min_port() == 3
+	assert heap.loads() == {1 : 60, 2 : 50, 3 : 10}
+
+
+def test_capacities():
+	heap = PortHeap([1, 2], {1 : 300, 2 : 100}, {1 : 4000.0, 2 : 1000.0})
+	assert not heap.uniform
+	assert heap.best_port(100) == 1					# 400/4000 beats 200/1000
+	placement = HeapScheduler()
+	placement.begin_cycle({1 : 0, 2 : 0}, {1 : 4000.0, 2 : 1000.0})
+	path = placement.place(dict((group_id, 100) for group_id in range(5)), [1, 2])
+	assert sorted(path.values()) == [1, 1, 1, 1, 2]
@@ -0,0 +1,86 @@
+import socket
+
+import pytest
+
+from flowscheduler.engine import Forwarding
+from flowscheduler.restclient import ControllerClient, httplib
+
+
+class Response(object):
+	status = 200
+	reason = 'OK'
+	will_close = True
+
+	def read(self):
+		return b'[]'
+
+
+class Connection(object):
+	"""A connection that fails while sending ('request') or waiting for the reply ('response')"""
+
+	def __init__(self, sent, fail=None):
+		self.sent = sent
+		self.fail = fail
+		self.closed = False
+
+	def request(self, action, path, body, headers):
+		if self.fail == 'request':
+			raise socket.error(32, 'Broken pipe')
+		self.sent.append(action)
+
+	def getresponse(self):
+		if self.fail == 'response':
+			raise httplib.BadStatusLine("''")
+		return Response()
+
+	def close(self):
+		self.closed = True
+
+
+def client_over(*connections):
+	# each connection with whether it comes from the pool
+	client = ControllerClient('localhost:8080')
+	pending = list(connections)
+	client._acquire = lambda: pending.pop(0)
+	return client
+
+
+@pytest.mark.parametrize('action', ['GET', 'POST', 'DELETE'])
+def test_unsent_request_is_retried(action):
+	sent = []
+	stale = Connection(sent, 'request')
+	client = client_over((stale, True), (Connection(sent), False))
+	assert client.request(action, '/wm/staticflowpusher/json', '{}')[0] == 200
+	assert sent == [action]
+	assert stale.closed
+
+
+def test_lost_reply_is_retried_for_get():
+	sent = []
+	client = client_over((Connection(sent, 'response'), True), (Connection(sent), False))
+	assert client.request('GET', '/wm/core/controller/switches/json')[0] == 200
+	assert sent == ['GET', 'GET']
+
+
+@pytest.mark.parametrize('action', ['POST', 'DELETE'])
+def test_lost_reply_is_not_replayed(action):
+	sent = []
+	client = client_over((Connection(sent, 'response'), True), (Connection(sent), False))
+	with pytest.raises(httplib.HTTPException):
+		client.request(action, '/wm/staticflowpusher/json', '{}')
+	assert sent == [action]
+
+
+def test_fresh_connection_is_not_retried():
+	sent = []
+	client = client_over((Connection(sent, 'request'), False), (Connection(sent), False))
+	with pytest.raises(socket.error):
+		client.request('GET', '/wm/core/controller/switches/json')
+	assert sent == []
+
+
+def test_forwarding_push_fails_without_a_reply():
+	sent = []
+	client = client_over((Connection(sent, 'response'), True), (Connection(sent), False))
+	assert not Forwarding(client).set('{}')
+	assert sent == ['POST']
@@ -0,0 +1,52 @@
+from flowscheduler.placement import make_placement
+from flowscheduler.sharding import ShardedScheduler
+
+PORTS = [1, 2, 3]
+
+
+def tuples(cycle):
+	# every tuple's loads change shape between cycles, so each one wants a new plan
+	result = []
+	for i in range(20):
+		if cycle % 2 == 0:
+			groups = {0 : 1000.0 + i, 1 : 10.0, 2 : 10.0, 3 : 10.0}
+		else:
+			groups = {0 : 10.0, 1 : 10.0, 2 : 1000.0 + i, 3 : 1000.0 + i}
+		result.append((('10.10.1.%d' % i, '10.10.2.1'), groups, PORTS))
+	return result
+
+
+def moves(placement, cycles=4):
+	counts = []
+	previous = None
+	for cycle in range(cycles):
+		placement.begin_cycle(dict((port, 0.0) for port in PORTS))
+		assignment = placement.place_all(tuples(cycle))
+		if previous is not None:
+			counts.append(sum(1 for key in assignment for group_id in assignment[key]
+							if previous[key][group_id] != assignment[key][group_id]))
+		previous = assignment
+	return counts
+
+
+def test_move_budget_is_shared_by_the_shards():
+	options = {'incremental' : True, 'max_moves' : 3, 'threshold' : 0.1, 'hysteresis' : 0.0}
+	for shards in (2, 3, 4):
+		placement = ShardedScheduler(shards, options)
+		try:
+			counts = moves(placement)
+		finally:
+			placement.close()
+		assert max(counts) <= 3
+		assert sum(counts) > 0
+
+
+def test_unlimited_without_a_budget():
+	options = {'incremental' : True, 'threshold' : 0.1, 'hysteresis' : 0.0}
+	placement = ShardedScheduler(2, options)
+	try:
+		sharded = moves(placement)
+	finally:
+		placement.close()
+	assert sharded == moves(make_placement(**options))
+	assert max(sharded) > 3
@@ -0,0 +1,146 @@
+import json
+import struct
+import time
+
+from flowscheduler.flowtable import FlowTable
+from flowscheduler.snapshot import DATA, HEADER, Snapshot, decode, encode
+
+LEAF = '00:00:00:00:00:00:00:01'
+
+
+def port(rx_bytes, tx_bytes, when):
+	return {'rx_packets' : rx_bytes // 1000, 'rx_bytes' : rx_bytes, 'tx_packets' : tx_bytes // 1000, 'tx_bytes' : tx_bytes,
+			'rx_bytes_rate' : 1000.0, 'tx_bytes_rate' : 2000.0, 'time' : when}
+
+
+def state(scale=1):
+	table = FlowTable()
+	table.update('10.10.1.1', '10.10.2.1', 5001, 80, 10, 15000 * scale, 1.0)
+	table.update('10.10.1.1', '10.10.2.1', 5001, 80, 20, 30000 * scale, 2.0)
+	gone = table.update('10.10.1.2', '10.10.2.1', 5002, 80, 1, 100, 2.0)
+	table.update('10.10.1.3', '10.10.2.2', 5003, 443, 5, 7000, 2.0)
+	table.evict(gone)
+	port_stats = {LEAF : {1 : port(10 ** 6 * scale, 2 * 10 ** 6, 2.0), 2 : port(5, 2 ** 40, 2.0)}}
+	assignment = {('10.10.1.1', '10.10.2.1') : {0 : 3, 1 : 4}, ('10.10.1.3', '10.10.2.2') : {0 : 4, 1 : -1}}
+	return port_stats, {LEAF : table}, assignment
+
+
+def test_round_trip():
+	port_stats, flow_stats, assignment = state()
+	restored = decode(encode(port_stats, flow_stats, assignment, 'tuple', 2), shift=10.0)
+	assert restored['mode'] == 'tuple'
+	assert restored['num_groups'] == 2
+	assert restored['assignment'] == assignment
+	assert sorted(restored['ports'][LEAF]) == [1, 2]
+	stat = restored['ports'][LEAF][2]
+	assert (stat['rx_bytes'], stat['tx_bytes'], stat['tx_bytes_rate'], stat['time']) == (5, 2 ** 40, 2000.0, 12.0)
+	assert stat['rx_bytes_diff'] == 0
+	assert sorted(restored['flows'][LEAF]) == [('10.10.1.1', '10.10.2.1', 5001, 80, 20, 30000, 15000.0, 12.0),
+											('10.10.1.3', '10.10.2.2', 5003, 443, 5, 7000, 0.0, 12.0)]
+
+
+def test_round_trip_switch_mode():
+	assignment = {LEAF : {0 : 1, 1 : 2, 2 : 1}}
+	restored = decode(encode({}, {}, assignment, 'switch', 3))
+	assert restored['assignment'] == assignment
+	assert restored['flows'] == {}
+
+
+def rewrite_head(body, change):
+	newline = body.index(b'\n')
+	head = json.loads(body[:newline].decode('utf-8'))
+	change(head)
+	return json.dumps(head).encode('utf-8') + body[newline:]
+
+
+def test_unreadable_columns():
+	port_stats, flow_stats, assignment = state()
+	body = encode(port_stats, flow_stats, assignment, 'tuple', 2)
+
+	def typecode(head):
+		head['tables'][0][1][0][1] = 'Z'
+
+	def itemsize(head):
+		head['tables'][0][1][0][2] *= 2
+
+	def byteorder(head):
+		head['byteorder'] = 'middle'
+
+	for change in (typecode, itemsize, byteorder):
+		assert decode(rewrite_head(body, change)) is None
+
+
+def test_save_and_load(tmpdir):
+	path = str(tmpdir.join('leaf0.snapshot'))
+	assert Snapshot(path).load() is None
+	snapshot = Snapshot(path)
+	port_stats, flow_stats, assignment = state()
+	snapshot.save(port_stats, flow_stats, assignment, 'tuple', 2)
+	snapshot.close()
+	restored = Snapshot(path).load()
+	assert restored['assignment'] == assignment
+	assert 0 <= restored['age'] < 5
+
+
+def bodies(path):
+	with open(path, 'rb') as snapshot_file:
+		data = snapshot_file.read()
+	slots = []
+	for slot in range(2):
+		magic, version, unused, sequence, offset, length, crc, wall, saved_monotonic = HEADER.unpack_from(data, slot * HEADER.size)
+		if magic == b'FSCH':
+			slots.append((sequence, offset, length))
+	return sorted(slots)
+
+
+def test_save_keeps_the_previous_body(tmpdir):
+	path = str(tmpdir.join('leaf0.snapshot'))
+	snapshot = Snapshot(path)
+	snapshot.save(*state(1) + ('tuple', 2))
+	for scale in (2, 1000, 3, 4):					# bodies that grow and shrink
+		snapshot.save(*state(scale) + ('tuple', 2))
+		(older, start, length), (newer, other, other_length) = bodies(path)
+		assert newer == older + 1
+		assert min(start, other) >= DATA
+		assert start + length <= other or other + other_length <= start
+	snapshot.close()
+
+
+def corrupt(path, sequence):
+	for number, offset, length in bodies(path):
+		if number == sequence:
+			with open(path, 'r+b') as snapshot_file:
+				snapshot_file.seek(offset + length - 1)
+				last = snapshot_file.read(1)
+				snapshot_file.seek(offset + length - 1)
+				snapshot_file.write(struct.pack('B', (ord(last) + 1) % 256))
+
+
+def test_cut_short_save_falls_back(tmpdir):
+	path = str(tmpdir.join('leaf0.snapshot'))
+	snapshot = Snapshot(path)
+	older = state(1)
+	snapshot.save(*older + ('tuple', 2))
+	snapshot.close()
+	snapshot = Snapshot(path)						# a new process keeps the old body while it saves
+	newer = state(2)
+	newer[2][('10.10.1.1', '10.10.2.1')] = {0 : 5, 1 : 6}
+	snapshot.save(*newer + ('tuple', 2))
+	assert Snapshot(path).load()['assignment'] == newer[2]
+	corrupt(path, 2)
+	assert Snapshot(path).load()['assignment'] == older[2]
+	corrupt(path, 1)
+	assert Snapshot(path).load() is None
+	snapshot.close()
+
+
+def test_too_old(tmpdir, monkeypatch):
+	path = str(tmpdir.join('leaf0.snapshot'))
+	snapshot = Snapshot(path)
+	snapshot.save(*state() + ('tuple', 2))
+	snapshot.close()
+	saved = time.time()
+	monkeypatch.setattr(time, 'time', lambda: saved + 30.0)
+	assert 29 < Snapshot(path, max_age=60.0).load()['age'] < 31
+	assert Snapshot(path, max_age=10.0).load() is None
+	assert Snapshot(path, max_age=0).load() is not None
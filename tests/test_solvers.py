@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from flowscheduler.solvers import SOLVERS, GreedySolver, make_solver
+
+
+def peak(groups, groups_path, loads, capacity=None):
+	port_load = dict(loads)
+	for group_id, port in groups_path.items():
+		port_load[port] = port_load.get(port, 0) + groups[group_id]
+	return max(port_load[port] / (capacity[port] if capacity else 1.0) for port in port_load)
+
+
+def cases(count=200, seed=1):
+	rand = random.Random(seed)
+	for i in range(count):
+		ports = [rand.randint(1, 8) for j in range(rand.randint(1, 5))]		# duplicates included
+		loads = dict((port, rand.choice([0, 0, 100, 1000])) for port in ports)
+		groups = dict((group_id, rand.choice([0, 1, 7, 50, 300, 1000])) for group_id in range(rand.randint(1, 12)))
+		yield groups, ports, loads
+
+
+@pytest.mark.parametrize('name', sorted(SOLVERS))
+def test_full_valid_assignment(name):
+	solver = make_solver(name)
+	for groups, ports, loads in cases():
+		groups_path = solver.solve(groups, ports, loads)
+		assert sorted(groups_path) == sorted(groups)
+		assert set(groups_path.values()) <= set(ports)
+
+
+@pytest.mark.parametrize('name', sorted(SOLVERS))
+def test_full_valid_assignment_with_capacities(name):
+	solver = make_solver(name)
+	for groups, ports, loads in cases(seed=2):
+		capacity = dict((port, 1000.0 * (port % 3 + 1)) for port in ports)
+		groups_path = solver.solve(groups, ports, loads, capacity=capacity)
+		assert sorted(groups_path) == sorted(groups)
+		assert set(groups_path.values()) <= set(ports)
+
+
+def test_local_search_never_worse_than_greedy():
+	greedy = make_solver('greedy')
+	local = make_solver('lpt-ls')
+	for groups, ports, loads in cases(seed=3):
+		assert peak(groups, local.solve(groups, ports, loads), loads) <= peak(groups, greedy.solve(groups, ports, loads), loads)
+
+
+def test_kk_beats_greedy_on_a_known_case():
+	groups = dict(enumerate([8, 7, 6, 5, 4]))
+	assert peak(groups, make_solver('greedy').solve(groups, [1, 2], {}), {}) == 17
+	assert peak(groups, make_solver('kk').solve(groups, [1, 2], {}), {}) == 16
+
+
+def test_kk_falls_back_to_greedy_on_mixed_speeds():
+	kk = make_solver('kk')
+	greedy = GreedySolver()
+	for groups, ports, loads in cases(seed=4):
+		capacity = dict((port, 1250.0 if port % 2 else 5000.0) for port in ports)
+		if len(set(capacity.values())) < 2:
+			continue
+		assert kk.solve(groups, ports, loads, capacity=capacity) == greedy.solve(groups, ports, loads, capacity=capacity)
+
+
+def test_kk_uses_differencing_on_equal_speeds():
+	groups = dict(enumerate([8, 7, 6, 5, 4]))
+	capacity = {1 : 1250.0, 2 : 1250.0}
+	assert peak(groups, make_solver('kk').solve(groups, [1, 2], {}, capacity=capacity), {}) == 16
+
+
+def test_kk_deadline():
+	assert make_solver('kk').solve(dict(enumerate([8, 7, 6])), [1, 2], {}, deadline=0.0) is None
+
+
+def test_unknown_solver():
+	with pytest.raises(ValueError):
+		make_solver('nope')
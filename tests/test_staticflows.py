@@ -0,0 +1,84 @@
+import json
+
+from flowscheduler.staticflows import RuleCache, entry_name, flow_entry
+
+DPID = '00:00:00:00:00:00:00:01'
+
+
+def key(i):
+	return (DPID, '10.10.1.1', '10.10.2.1', 5000 + i, 80)
+
+
+class FakeClient(object):
+	"""Static flow pusher holding entries by name; statuses {(action, name): status} overrides replies"""
+
+	def __init__(self):
+		self.entries = {}
+		self.statuses = {}
+		self.requests = []
+
+	def request(self, action, path, body=None, headers=None):
+		name = json.loads(body)['name']
+		self.requests.append((action, name))
+		status = self.statuses.get((action, name))
+		if status is not None:
+			return status, '', ''
+		if action == 'POST':
+			self.entries[name] = json.loads(body)
+			return 200, 'OK', ''
+		if self.entries.pop(name, None) is None:
+			return 404, 'Not Found', ''
+		return 200, 'OK', ''
+
+	def get_json(self, path):
+		return {DPID : [{name : entry} for name, entry in self.entries.items()]}
+
+
+def test_delete_of_a_rule_gone_already():
+	client = FakeClient()
+	rules = RuleCache(client, budget=1)
+	rules.sync({key(0) : 1})
+	del client.entries[entry_name(key(0))]			# expired on the switch
+	rules.sync({key(1) : 1})
+	assert list(rules.installed) == [key(1)]
+	assert rules.per_switch[DPID] == 1
+	assert rules.failed == 0
+
+
+def test_failed_delete_reconciles():
+	client = FakeClient()
+	rules = RuleCache(client, budget=1)
+	rules.sync({key(0) : 1})
+	del client.entries[entry_name(key(0))]
+	client.statuses[('DELETE', entry_name(key(0)))] = 500
+	rules.sync({key(1) : 1})
+	assert rules.vanished == 1
+	assert key(0) not in rules.installed
+	rules.sync({key(1) : 1})
+	assert client.requests.count(('DELETE', entry_name(key(0)))) == 1
+
+
+def test_admit_within_budget():
+	client = FakeClient()
+	rules = RuleCache(client, budget=2)
+	rules.sync({key(0) : 1})
+	admitted = rules.admit([key(0), key(1), key(2)], {key(0) : 1.0, key(1) : 3.0, key(2) : 2.0})
+	assert admitted == set([key(0), key(1)])
+	assert rules.refused == 1
+
+
+def test_failed_post_sits_out_one_admit():
+	client = FakeClient()
+	client.statuses[('POST', entry_name(key(0)))] = 500
+	rules = RuleCache(client)
+	rules.sync({key(0) : 1})
+	assert rules.admit([key(0)]) == set()
+	rules.sync({})
+	assert rules.admit([key(0)]) == set([key(0)])
+
+
+def test_flow_entry():
+	entry = flow_entry(key(0), 3, idle_timeout=30)
+	assert entry['eth_type'] == '0x0800'
+	assert entry['actions'] == 'output=3'
+	assert entry['idle_timeout'] == '30'
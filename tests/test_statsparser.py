@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+import pytest
+
+from flowscheduler.statsparser import SCHEDULER_TABLE, iter_flows, iter_ports
+
+DPIDS = ['00:00:00:00:00:00:00:01', u'00:00:00:00:00:00:00:02']
+
+
+def flow_entry(i, table_id=SCHEDULER_TABLE):
+	return {'version' : 'OF_13', 'table_id' : table_id, 'packet_count' : str(i * 10), 'byte_count' : str(i * 15000 + 2 ** 40),
+			'match' : {'eth_type' : '0x0800', 'ipv4_src' : '10.10.1.%d' % (i % 16 + 1), 'ipv4_dst' : '10.10.2.%d' % (i % 7 + 1),
+						'ip_proto' : '0x6', 'tcp_src' : str(5000 + i), 'tcp_dst' : '80'},
+			'note' : u'café ☃ \U0001f418 "quoted" \\ back', 'flags' : [], 'priority' : -1.5e3}
+
+
+def flows_reply():
+	reply = {}
+	for d, dpid in enumerate(DPIDS):
+		flows = [flow_entry(i + 100 * d) for i in range(20)]
+		flows += [flow_entry(1, '0x0'), {'table_id' : SCHEDULER_TABLE, 'match' : {}, 'packet_count' : '0', 'byte_count' : '0'}]
+		reply[dpid] = {'flows' : flows, u'descripción' : {'nested' : [1, 2, {'x' : None}]}}
+	return json.dumps(reply, ensure_ascii=False).encode('utf-8')
+
+
+def ports_reply():
+	reply = {}
+	for dpid in DPIDS:
+		ports = [{'port_number' : str(port), 'receive_packets' : str(port * 3), 'receive_bytes' : str(port * 4500),
+				'transmit_packets' : str(port * 2), 'transmit_bytes' : str(port * 3000 + 2 ** 33)} for port in range(1, 9)]
+		ports.append({'port_number' : 'local', 'receive_packets' : '0', 'receive_bytes' : '0',
+					'transmit_packets' : '0', 'transmit_bytes' : '0'})
+		reply[dpid] = {'port_reply' : [{'version' : 'OF_13', 'port' : ports}]}
+	return json.dumps(reply, ensure_ascii=False).encode('utf-8')
+
+
+def expected_flows(body):
+	result = []
+	for dpid, reply in json.loads(body.decode('utf-8')).items():
+		for item in reply['flows']:
+			match = item.get('match', {})
+			if item.get('table_id') == SCHEDULER_TABLE and all(field in match for field in ('ipv4_src', 'ipv4_dst', 'tcp_src', 'tcp_dst')):
+				result.append((dpid, match['ipv4_src'], match['ipv4_dst'], match['tcp_src'], match['tcp_dst'],
+								int(item['packet_count']), int(item['byte_count'])))
+	return sorted(result)
+
+
+def expected_ports(body):
+	result = []
+	for dpid, reply in json.loads(body.decode('utf-8')).items():
+		for item in reply['port_reply'][0]['port']:
+			if item['port_number'].isdigit():
+				result.append((dpid, int(item['port_number']), int(item['receive_packets']), int(item['receive_bytes']),
+								int(item['transmit_packets']), int(item['transmit_bytes'])))
+	return sorted(result)
+
+
+class Chunked(object):
+	"""A file object handing out at most `size` bytes per read, like a socket"""
+
+	def __init__(self, body, size):
+		self.stream = io.BytesIO(body)
+		self.size = size
+
+	def read(self, n=-1):
+		return self.stream.read(self.size if n < 0 else min(n, self.size))
+
+
+@pytest.mark.parametrize('size', [1, 3, 64, None])
+def test_flows_match_json_loads(size):
+	body = flows_reply()
+	source = body if size is None else Chunked(body, size)
+	flows = sorted(iter_flows(source))
+	assert flows == expected_flows(body)
+	assert len(flows) == 40
+
+
+@pytest.mark.parametrize('size', [1, 3, 64, None])
+def test_ports_match_json_loads(size):
+	body = ports_reply()
+	source = body if size is None else Chunked(body, size)
+	ports = sorted(iter_ports(source))
+	assert ports == expected_ports(body)
+	assert len(ports) == 16
+
+
+def test_text_body():
+	body = flows_reply()
+	assert sorted(iter_flows(body.decode('utf-8'))) == expected_flows(body)
+
+
+def test_single_switch_reply():
+	body = json.dumps({'flows' : [flow_entry(3)]}).encode('utf-8')
+	assert list(iter_flows(Chunked(body, 5))) == [(None, '10.10.1.4', '10.10.2.4', '5003', '80', 30, 45000 + 2 ** 40)]
+
+
+@pytest.mark.parametrize('size', [1, 64, None])
+def test_truncated_body(size):
+	body = flows_reply()
+	body = body[:len(body) // 2]
+	with pytest.raises(ValueError):
+		list(iter_flows(body if size is None else Chunked(body, size)))
+	body = ports_reply()[:-3]
+	with pytest.raises(ValueError):
+		list(iter_ports(body if size is None else Chunked(body, size)))
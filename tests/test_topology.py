@@ -0,0 +1,45 @@
+import pytest
+
+from flowscheduler.flowtable import ip_to_int
+from flowscheduler.topology import Leaf, RackIndex, Topology
+
+LEAF0 = Leaf('leaf0', '00:00:00:00:00:00:00:01', [1, 2],
+			[('10.10.1.1', 11), ('10.10.1.2', 12), ('10.10.1.3', 13), ('10.10.1.4', 14), ('10.10.1.6', 16)])
+LEAF1 = Leaf('leaf1', '00:00:00:00:00:00:00:02', [1, 2],
+			[('10.10.1.5', 15), ('10.10.2.1', 21), ('10.10.2.2', 22), ('10.10.2.3', 23)])
+
+
+def test_ranges():
+	racks = RackIndex([LEAF0, LEAF1])
+	assert len(racks) == 4					# 1.1-1.4, 1.5, 1.6 and 2.1-2.3
+	assert racks.starts == [ip_to_int(ip) for ip in ('10.10.1.1', '10.10.1.5', '10.10.1.6', '10.10.2.1')]
+	assert racks.ends == [ip_to_int(ip) for ip in ('10.10.1.4', '10.10.1.5', '10.10.1.6', '10.10.2.3')]
+
+
+def test_lookup():
+	racks = RackIndex([LEAF0, LEAF1])
+	for leaf in (LEAF0, LEAF1):
+		for ip in leaf.hosts:
+			assert racks.rack(ip) is leaf
+			assert racks.rack(ip_to_int(ip)) is leaf
+	for ip in ('10.10.0.255', '10.10.1.0', '10.10.1.7', '10.10.2.0', '10.10.2.4', '255.255.255.255', '0.0.0.0'):
+		assert racks.rack(ip) is None
+	assert RackIndex().rack('10.10.1.1') is None
+
+
+@pytest.mark.parametrize('ip', ['10.10.1', '10.10.1.1.1', '10.10.1.256', '10.10.-1.1', 'leaf0', ''])
+def test_malformed_address(ip):
+	with pytest.raises(ValueError):
+		ip_to_int(ip)
+	topology = Topology([LEAF0, LEAF1])
+	assert topology.rack(ip) is None
+	assert topology.ports('10.10.1.1', ip) is None
+	assert topology.ports(ip, '10.10.1.1') is None
+
+
+def test_ports():
+	topology = Topology([LEAF0, LEAF1])
+	assert topology.ports('10.10.1.1', '10.10.1.6') == [16]
+	assert topology.ports('10.10.1.1', '10.10.1.5') == [1, 2]
+	assert topology.ports('10.10.1.1', '10.10.1.1') is None
+	assert topology.ports('10.10.1.1', '10.10.3.1') is None